@@ -2,11 +2,25 @@
 Cache Management API Endpoints
 """
 
+import os
+from typing import Optional
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from app.api.visibility import weather_service
+from app.services.admission import admission
+from app.services.cache_jobs import clear_jobs
+from app.services.circuit_breaker import upstream_breakers
+from app.services.precomputed import precomputed_results
+from app.services.redis_async import async_cache
 from app.services.redis_cache import cache
+from app.services.refresh_scheduler import refresh_scheduler
+from app.services.single_flight import single_flight
 
 router = APIRouter(prefix="/cache", tags=["cache"])
 
+# Clears run as background jobs by default once the database holds more keys than this
+CACHE_CLEAR_BACKGROUND_THRESHOLD = int(os.getenv("CACHE_CLEAR_BACKGROUND_THRESHOLD", 10000))
+
 
 @router.get("/stats")
 def get_cache_stats():
@@ -15,29 +29,57 @@ def get_cache_stats():
     
     Returns:
     - Cache status and performance metrics
+    - Separate hit ratios for the in-process L1 and Redis L2 tiers
+    - Counts of cache-miss fetches and requests coalesced onto them
+    - Hot keys tracked and proactively refreshed before they go stale
+    - Async Redis pool state and disconnect/reconnect counts
+    - Upstream circuit breaker state and adaptive timeout per endpoint
+    - Weather providers, hedged/failed-over lookups and provider win rates
+    - The precomputed results file being served and its hit counts
+    - Admission control: slots, queue depth and shed counts per class
+    - Estimated keys, entries and memory per key prefix, from a random
+      sample, with bytes per key and per entry to compare storage layouts
+      (CACHE_LAYOUT=keys against hash)
+    - The TTLs actually configured: soft (stale after) and hard (evicted
+      after) per data type, and L1 TTLs per prefix
     """
     stats = cache.get_stats()
     return {
         "cache_stats": stats,
         "ttl_config": {
-            "cloud_cover": "1 hour",
-            "astronomy": "24 hours"
-        }
+            **weather_service.ttl_config(),
+            "l1_seconds": {**cache.l1_ttls, "default": cache.l1_default_ttl}
+        },
+        "async_redis": async_cache.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "refresh_scheduler": refresh_scheduler.get_stats(),
+        "upstream": upstream_breakers.get_stats(),
+        "providers": weather_service.provider_stats(),
+        "precomputed": precomputed_results.get_stats(),
+        "admission": admission.get_stats()
     }
 
 
 @router.post("/clear")
-def clear_cache(pattern: str = "*"):
+def clear_cache(pattern: str = "*", background: Optional[bool] = None, batch_size: Optional[int] = None):
     """
     Clear cache entries matching a pattern
     
+    Matching entries are also dropped from every worker's in-process cache.
+    Keys are deleted with UNLINK in batches, so large clears don't block Redis.
+    
     Parameters:
     - pattern: Redis key pattern (default: "*" clears all)
+    - background: Run as a background job and return 202 with a job_id to
+      poll at /cache/clear/{job_id}. Defaults to true when the database
+      holds more than CACHE_CLEAR_BACKGROUND_THRESHOLD keys
+    - batch_size: Keys per SCAN/UNLINK round trip (default CACHE_CLEAR_BATCH_SIZE)
     
     Examples:
     - "*" - Clear all cache
-    - "cloud_cover:*" - Clear only cloud cover cache
+    - "hourly:*" - Clear only hourly forecast (cloud cover) cache
     - "astronomy:*" - Clear only astronomy cache
+    - "response:*" - Clear only cached /visibility responses
     """
     if not cache.enabled:
         raise HTTPException(
@@ -45,8 +87,16 @@ def clear_cache(pattern: str = "*"):
             detail="Cache is not enabled"
         )
     
+    if batch_size is not None and batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+    
+    if background is None:
+        background = cache.total_keys() > CACHE_CLEAR_BACKGROUND_THRESHOLD
+    if background:
+        return JSONResponse(status_code=202, content=clear_jobs.start(pattern, batch_size))
+    
     try:
-        deleted = cache.clear_pattern(pattern)
+        deleted = cache.clear_pattern(pattern, batch_size)
         return {
             "success": True,
             "deleted_keys": deleted,
@@ -59,11 +109,29 @@ def clear_cache(pattern: str = "*"):
         )
 
 
+@router.get("/clear/{job_id}")
+def get_clear_job(job_id: str):
+    """
+    Progress of a background clear
+    
+    Returns:
+    - status: running, done or failed
+    - scanned / deleted: Keys processed so far
+    - started_at / finished_at: Unix timestamps
+    """
+    job = clear_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Clear job '{job_id}' not found")
+    return job
+
+
 @router.delete("/key/{key}")
 def delete_cache_key(key: str):
     """
     Delete a specific cache key
     
+    The key is also dropped from every worker's in-process cache.
+    
     Parameters:
     - key: The exact cache key to delete
     """
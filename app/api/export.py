@@ -0,0 +1,264 @@
+"""
+Streaming Export Endpoint
+"""
+
+import asyncio
+import codecs
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, IO, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.api.visibility import batch_visibility_inputs, build_visibility_response, validate_coordinates
+from app.services.admission import admission
+from app.services.light_pollution import light_pollution
+from app.services.metrics import EXPORT_ROWS
+
+router = APIRouter(tags=["export"], dependencies=[Depends(admission.check_quota)])
+
+# Site-nights scored per batched lookup, and how many batches may be
+# scored ahead of the client; together they bound an export's memory
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 200))
+EXPORT_PREFETCH_CHUNKS = int(os.getenv("EXPORT_PREFETCH_CHUNKS", 2))
+
+# Longest date range swept per site
+EXPORT_MAX_DAYS = int(os.getenv("EXPORT_MAX_DAYS", 366))
+
+# Uploaded site lists larger than this are spooled to a temporary file
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", 1 << 20))
+
+# (index, lat, lon, iso_date, error); error is set for rows that can't be scored
+ExportItem = Tuple[int, Optional[float], Optional[float], Optional[str], Optional[str]]
+
+
+def parse_date(value: str) -> str:
+    """YYYY-MM-DD for a YYYY-MM-DD or MM/DD/YYYY date, ValueError otherwise"""
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise ValueError(f"invalid date {value!r}, expected YYYY-MM-DD or MM/DD/YYYY")
+
+def sweep_items(sites: IO[str], dates: List[str]) -> Iterator[ExportItem]:
+    """
+    Export items for a CSV site list, in upload order: a lat,lon row is an
+    item per date of the range, a lat,lon,date row a single item. The
+    index numbers items in this order, so the same upload and range
+    always number them the same way. Blank and # lines are skipped, as is
+    a header row.
+    """
+    index = 0
+    for line, row in enumerate(csv.reader(sites), start=1):
+        if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+            continue
+        try:
+            lat, lon = float(row[0]), float(row[1])
+        except (ValueError, IndexError):
+            if line == 1:
+                continue
+            yield index, None, None, None, f"line {line}: expected lat,lon[,date]"
+            index += 1
+            continue
+
+        row_dates = dates
+        if len(row) > 2 and row[2].strip():
+            try:
+                row_dates = [parse_date(row[2].strip())]
+            except ValueError as e:
+                yield index, None, None, None, f"line {line}: {e}"
+                index += 1
+                continue
+
+        for iso_date in row_dates:
+            yield index, lat, lon, iso_date, None
+            index += 1
+
+def _ndjson(row: Dict) -> bytes:
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+async def score_chunk(chunk: List[ExportItem]) -> Tuple[List[bytes], Dict]:
+    """
+    NDJSON lines for a chunk of items, in order, and stats: the lookup
+    stats plus the number of error rows
+
+    Valid items go through the same batched cache/upstream path and
+    scoring as /visibility/batch; invalid ones become error rows.
+    """
+    lines: List[Optional[bytes]] = [None] * len(chunk)
+    errors = 0
+    valid = []
+    for position, (index, lat, lon, iso_date, error) in enumerate(chunk):
+        status = 400
+        if error is None:
+            try:
+                validate_coordinates(lat, lon)
+                valid.append(position)
+                continue
+            except HTTPException as e:
+                status, error = e.status_code, e.detail
+        lines[position] = _ndjson({"index": index, "status": status, "error": error})
+        EXPORT_ROWS.labels(str(status)).inc()
+        errors += 1
+
+    if not valid:
+        return lines, {"errors": errors}
+
+    queries = [chunk[position][1:4] for position in valid]
+    inputs, stats = await batch_visibility_inputs(queries)
+    pollution = light_pollution.values([lat for lat, _, _ in queries], [lon for _, lon, _ in queries]).tolist()
+
+    for position, (lat, lon, iso_date), item_inputs, value in zip(valid, queries, inputs, pollution):
+        index = chunk[position][0]
+        try:
+            if isinstance(item_inputs, Exception):
+                raise item_inputs
+            row = {
+                "index": index,
+                "status": 200,
+                "result": build_visibility_response(lat, lon, iso_date, *item_inputs, value)
+            }
+        except Exception as e:
+            row = {"index": index, "status": 500, "error": f"Error calculating visibility: {str(e)}"}
+            errors += 1
+        lines[position] = _ndjson(row)
+        EXPORT_ROWS.labels(str(row["status"])).inc()
+    return lines, {**stats, "errors": errors}
+
+async def export_stream(items: Iterator[ExportItem], cursor: int = 0,
+                        sites: Optional[IO] = None) -> AsyncIterator[bytes]:
+    """
+    Score items from cursor on and yield them as NDJSON, one chunk of
+    rows at a time, in index order
+
+    A producer task cuts the items into chunks and starts scoring up to
+    EXPORT_PREFETCH_CHUNKS of them ahead; it waits for a free slot, and a
+    slot frees up only once the client has taken a chunk, so a slow
+    reader slows the sweep (and upstream traffic) down rather than
+    buffering results. Ends with a summary line holding the cursor to
+    resume from. Closes sites, the spooled upload, when done.
+    """
+    slots = asyncio.Semaphore(EXPORT_PREFETCH_CHUNKS)
+    scored: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            chunk: List[ExportItem] = []
+            for item in items:
+                if item[0] < cursor:
+                    continue
+                chunk.append(item)
+                if len(chunk) == EXPORT_CHUNK_SIZE:
+                    await slots.acquire()
+                    scored.put_nowait((chunk[-1][0] + 1, asyncio.ensure_future(score_chunk(chunk))))
+                    chunk = []
+            if chunk:
+                await slots.acquire()
+                scored.put_nowait((chunk[-1][0] + 1, asyncio.ensure_future(score_chunk(chunk))))
+        finally:
+            scored.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    totals = {"rows": 0, "errors": 0, "unique_keys": 0, "cache_hits": 0, "upstream_fetches": 0}
+    next_cursor = cursor
+    try:
+        while True:
+            entry = await scored.get()
+            if entry is None:
+                break
+            chunk_cursor, task = entry
+            lines, stats = await task
+            # Counters such as fallbacks only appear once something needed them
+            for name, value in stats.items():
+                totals[name] = totals.get(name, 0) + value
+            totals["rows"] += len(lines)
+            next_cursor = chunk_cursor
+            yield b"".join(lines)
+            slots.release()
+
+        if producer.done() and not producer.cancelled() and producer.exception() is not None:
+            # Rows up to the cursor were sent; the client can retry from there
+            yield _ndjson({"done": False, "cursor": next_cursor, "error": f"Error reading sites: {producer.exception()}", "stats": totals})
+        else:
+            yield _ndjson({"done": True, "cursor": next_cursor, "stats": totals})
+    finally:
+        # Client gone or stream finished: stop reading and scoring
+        producer.cancel()
+        while not scored.empty():
+            entry = scored.get_nowait()
+            if entry is not None:
+                entry[1].cancel()
+        if sites is not None:
+            sites.close()
+
+@router.post("/visibility/export")
+async def export_visibility(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                            lat: Optional[float] = None, lon: Optional[float] = None, cursor: int = 0):
+    """
+    Stream visibility scores for a sweep of sites and dates as NDJSON.
+
+    The body is a CSV site list (lat,lon or lat,lon,date per line, e.g.
+    uploaded with curl --data-binary @sites.csv); rows without a date are
+    swept over start..end. Without a body, give lat and lon to sweep one
+    site over the range. Rows are scored in chunks through the batched
+    cache/upstream path of /visibility/batch and written as they are
+    ready, in input order, so the first rows arrive long before the sweep
+    finishes and memory stays flat however large it is.
+
+    Parameters:
+    - start, end: Date range (YYYY-MM-DD or MM/DD/YYYY, inclusive, at most
+      EXPORT_MAX_DAYS days); start defaults to today, end to start
+    - lat, lon: A single site instead of an uploaded list
+    - cursor: Resume an interrupted export: resend the same request with
+      the index of the last row received plus one
+
+    Returns (application/x-ndjson), one line per item:
+    - {"index", "status": 200, "result": the /visibility response}
+    - {"index", "status": 400 or 500, "error"} for rows that can't be scored
+    and a last line {"done": true, "cursor", "stats"}; a stream that ends
+    without it was cut off and can be resumed from the last index + 1.
+    """
+    if cursor < 0:
+        raise HTTPException(status_code=400, detail="cursor must not be negative")
+    try:
+        first = parse_date(start) if start else datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        last = parse_date(end) if end else first
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    first_day = datetime.strptime(first, "%Y-%m-%d")
+    days = (datetime.strptime(last, "%Y-%m-%d") - first_day).days + 1
+    if not 1 <= days <= EXPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"end must be on or after start, at most {EXPORT_MAX_DAYS} days")
+    dates = [(first_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+    # Spool the upload (to disk past EXPORT_SPOOL_BYTES) so the sweep can
+    # read it row by row while the response streams
+    sites = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES, mode="w+", newline="")
+    try:
+        if lat is not None or lon is not None:
+            if lat is None or lon is None:
+                raise HTTPException(status_code=400, detail="lat and lon must be given together")
+            sites.write(f"{lat},{lon}\n")
+        else:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            async for data in request.stream():
+                sites.write(decoder.decode(data))
+            sites.write(decoder.decode(b"", final=True))
+    except UnicodeDecodeError:
+        sites.close()
+        raise HTTPException(status_code=400, detail="site list must be UTF-8 CSV")
+    except HTTPException:
+        sites.close()
+        raise
+    sites.seek(0)
+
+    return StreamingResponse(
+        export_stream(sweep_items(sites, dates), cursor, sites),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store"}
+    )
@@ -0,0 +1,32 @@
+"""
+Health Probe Endpoints
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.lifecycle import lifecycle
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/livez")
+async def livez():
+    """
+    Liveness: the worker's event loop is running and answering
+    Never depends on Redis or upstream, so a dependency outage doesn't
+    get healthy workers restarted
+    """
+    return {"status": "alive"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness: 200 once startup warm-up (Redis pools, upstream
+    connections) has finished, 503 while starting or draining
+    
+    Returns the worker's state, how long it took to become ready and
+    each warm-up step's outcome and duration.
+    """
+    stats = lifecycle.get_stats()
+    return JSONResponse(status_code=200 if stats["ready"] else 503, content=stats)
@@ -0,0 +1,24 @@
+"""
+Metrics API Endpoint
+"""
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from app.services.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Prometheus metrics
+    
+    - http_request_duration_seconds: Total request time per route and status
+    - stage_duration_seconds: Redis get/set, upstream calls per endpoint,
+      ephemeris and scoring
+    - cache_lookups_total: L1/L2 hits and misses per key namespace
+    - cache_stale_served_total: Stale entries served while refreshing
+    - upstream_errors_total: Upstream failures per endpoint, timeouts included
+    """
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
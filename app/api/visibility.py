@@ -1,18 +1,67 @@
-from fastapi import APIRouter, HTTPException
-from datetime import datetime
-from app.services.visibility_logic import calculate_darkness_window
-from app.services.visibility_score import calculate_visibility_score
-from app.services.weather_astronomy_service import WeatherAstronomyServiceSync
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from pydantic import BaseModel, Field
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import math
+import os
+import numpy as np
+from app.services.admission import Shed, admission
+from app.services.ephemeris import astronomy_for_many
+from app.services.light_pollution import light_pollution
+from app.services.log import get_logger, log_event
+from app.services.metrics import timed
+from app.services.precomputed import precomputed_results
+from app.services.raster import encode_base64, encode_png
+from app.services.redis_cache import cache
+from app.services.response_cache import response_cache
+from app.services.visibility_logic import (
+    TIMELINE_RESOLUTIONS, calculate_darkness_window, calculate_visibility_timeline
+)
+from app.services.visibility_score import calculate_visibility_score, calculate_visibility_scores
+from app.services.weather_astronomy_service import WeatherAstronomyService
 
-router = APIRouter()
+logger = get_logger(__name__)
+
+router = APIRouter(dependencies=[Depends(admission.check_quota)])
 
 # Initialize the weather/astronomy service
-weather_service = WeatherAstronomyServiceSync()
+weather_service = WeatherAstronomyService()
+
+# Largest number of (lat, lon, date) items accepted by /visibility/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+
+# Longest range accepted by /visibility/forecast (weatherapi serves up to 14 days)
+FORECAST_MAX_DAYS = int(os.getenv("FORECAST_MAX_DAYS", 14))
+
+# /visibility/grid limits: raster size, upstream requests per raster and
+# the spacing (degrees) astronomy is evaluated at before being spread over cells
+GRID_MAX_CELLS = int(os.getenv("GRID_MAX_CELLS", 65536))
+GRID_MAX_UPSTREAM_FETCHES = int(os.getenv("GRID_MAX_UPSTREAM_FETCHES", 50))
+GRID_ASTRONOMY_STEP = float(os.getenv("GRID_ASTRONOMY_STEP", 0.5))
+
+# Raster value of cells without a score (no cloud cover for them)
+GRID_NODATA = 255
+
+
+class VisibilityQuery(BaseModel):
+    lat: float
+    lon: float
+    date: str
+
+
+class BatchVisibilityRequest(BaseModel):
+    items: List[VisibilityQuery] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
 
 def calculate_darkness_hours(darkness_window: dict) -> float:
     """
     Calculate total darkness hours from the darkness window
     """
+    if "darkness_hours" in darkness_window:
+        return darkness_window["darkness_hours"]
+    
     try:
         start_time = datetime.strptime(darkness_window['dark_start'], "%H:%M")
         end_time = datetime.strptime(darkness_window['dark_end'], "%H:%M")
@@ -30,81 +79,484 @@ def calculate_darkness_hours(darkness_window: dict) -> float:
     except Exception:
         return 10.0
 
-@router.get("/visibility")
-def get_visibility(lat: float, lon: float, date: str):
+def validate_coordinates(lat: float, lon: float) -> None:
+    """Raise a 400 for coordinates outside the valid range"""
+    if not -90 <= lat <= 90:
+        raise HTTPException(status_code=400, detail="Latitude must be between -90 and 90")
+    if not -180 <= lon <= 180:
+        raise HTTPException(status_code=400, detail="Longitude must be between -180 and 180")
+
+def build_visibility_response(lat: float, lon: float, date: str, astronomy_data: dict, cloud_cover: int,
+                              degraded: Optional[List[str]] = None, pollution: Optional[float] = None) -> dict:
+    """
+    Score one location/date from its inputs and build the /visibility response
+    
+    degraded lists the inputs that came from a fallback (upstream down or
+    failing); the response then says so instead of claiming real data.
+    pollution is looked up from the light-pollution raster unless given
+    (batch callers pass values from one bulk lookup).
+    """
+    if pollution is None:
+        pollution = light_pollution.value(lat, lon)
+    
+    # Calculate darkness window from the local sun ephemeris
+    darkness_window = calculate_darkness_window(date, lat, lon)
+    
+    # Calculate darkness hours
+    darkness_hours = calculate_darkness_hours(darkness_window)
+    
+    # Get moon illumination (0-1) from real API data
+    moon_illumination = astronomy_data["moon_illumination"]
+    
+    # Calculate visibility score using real data
+    with timed("scoring"):
+        score_result = calculate_visibility_score(
+            cloud_cover=cloud_cover,
+            moon_illumination=moon_illumination * 100,
+            darkness_hours=darkness_hours,
+            light_pollution=pollution
+        )
+    
+    response = {
+        "location": {
+            "latitude": lat,
+            "longitude": lon
+        },
+        "date": date,
+        "visibility_score": score_result["visibility_score"],
+        "best_time": (
+            f"{darkness_window['dark_start']} - {darkness_window['dark_end']}"
+            if darkness_window["dark_start"] else "No darkness"
+        ),
+        "explanation": score_result["explanation"],
+        "details": {
+            "cloud_cover_percent": cloud_cover,
+            "moon_illumination_percent": int(moon_illumination * 100),
+            "moon_phase": astronomy_data["moon_phase"],
+            "darkness_hours": darkness_hours,
+            "darkness_level": darkness_window["darkness_level"],
+            "light_pollution_percent": round(pollution, 1),
+            "sunrise": astronomy_data["sunrise"],
+            "sunset": astronomy_data["sunset"],
+            "moonrise": astronomy_data["moonrise"],
+            "moonset": astronomy_data["moonset"]
+        },
+        # Indicates whether real data is being used
+        "data_source": "degraded" if degraded else "real_api"
+    }
+    if degraded:
+        response["degraded_inputs"] = degraded
+    return response
+
+def shed_visibility_response(lat: float, lon: float, date: str) -> dict:
+    """
+    The /visibility response from fallback inputs alone (local astronomy,
+    default cloud cover), for requests shed before reaching upstream
+    """
+    astronomy_data = weather_service._astronomy_fallback(lat, lon, date)
+    return build_visibility_response(
+        lat, lon, date, astronomy_data,
+        weather_service.night_cloud_cover(None, astronomy_data),
+        weather_service.degraded_inputs(astronomy_data, None)
+    )
+
+async def compute_visibility_or_500(lat: float, lon: float, date: str, resolution: str) -> dict:
+    """compute_visibility, with any failure raised as a 500"""
+    try:
+        return await compute_visibility(lat, lon, date, resolution)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Error calculating visibility: {str(e)}"
+        )
+
+async def compute_visibility(lat: float, lon: float, date: str, resolution: str) -> dict:
+    """Fetch the inputs and build the /visibility response (without caching)"""
+    if resolution == "night":
+        # Fetch real astronomy data (moon phase, illumination, etc.)
+        # and cloud cover concurrently
+        astronomy_data, cloud_cover, degraded = await weather_service.get_visibility_inputs(lat, lon, date)
+        return build_visibility_response(lat, lon, date, astronomy_data, cloud_cover, degraded)
+    
+    # The night runs into the next day, so both days' hourly records are needed
+    astronomy_data, (tonight, tomorrow) = await asyncio.gather(
+        weather_service.get_astronomy_data(lat, lon, date),
+        weather_service.get_night_hourly(lat, lon, date)
+    )
+    pollution = light_pollution.value(lat, lon)
+    response = build_visibility_response(
+        lat, lon, date, astronomy_data,
+        weather_service.night_cloud_cover(tonight, astronomy_data),
+        weather_service.degraded_inputs(astronomy_data, tonight, tomorrow),
+        pollution
+    )
+    with timed("timeline"):
+        timeline = calculate_visibility_timeline(
+            weather_service._format_date(date), lat, lon, resolution, tonight, tomorrow, pollution
+        )
+    if timeline["best_window"] is not None:
+        response["best_time"] = f"{timeline['best_window']['start']} - {timeline['best_window']['end']}"
+    response["timeline"] = timeline
+    return response
+
+async def batch_visibility_inputs(queries: List[Tuple[float, float, str]]) -> Tuple[list, dict]:
+    """
+    weather_service.get_visibility_inputs_many, failing per item rather
+    than per batch
+
+    If the batched lookup raises, every query is looked up on its own
+    (batch_concurrency at a time), so an error only costs the items it
+    affects; their entries in the returned inputs are the exception.
+    """
+    try:
+        return await weather_service.get_visibility_inputs_many(queries)
+    except Exception as e:
+        log_event(logger, logging.WARNING, "batched lookup failed, looking items up one by one", items=len(queries), error=str(e))
+    
+    semaphore = asyncio.Semaphore(weather_service.batch_concurrency)
+    
+    async def lookup(lat: float, lon: float, date: str):
+        async with semaphore:
+            return await weather_service.get_visibility_inputs(lat, lon, date)
+    
+    inputs = await asyncio.gather(*(lookup(*query) for query in queries), return_exceptions=True)
+    return list(inputs), {"unique_keys": 0, "cache_hits": 0, "upstream_fetches": 0, "single_lookups": len(queries)}
+
+@router.get("/visibility", dependencies=[Depends(admission.set_deadline)])
+async def get_visibility(lat: float, lon: float, date: str, resolution: str = "night",
+                         if_none_match: Optional[str] = Header(None)):
     """
     Get sky visibility score and details for a specific location and date.
     
-    Uses real weather and astronomy APIs for accurate data.
+    Uses real weather data and a local sun/moon ephemeris for accurate results.
+    
+    Responses are cached per location cell (the hourly forecast's
+    quantization), ISO date and resolution, computed for the cell center,
+    until the first of their inputs goes stale. They carry an ETag and a
+    Cache-Control max-age for that remaining lifetime; a matching
+    If-None-Match is answered with 304 without recomputing.
+    
+    Registered sites are answered first from the precomputed results file
+    (see app.precompute), when one is configured and covers the night.
+    
+    Admission control (see app.services.admission) keeps separate limits
+    for requests answerable from cache and those needing an upstream
+    fetch; under overload the latter get a degraded response from
+    fallback inputs or a 503 with Retry-After.
     
     Parameters:
     - lat: Latitude (-90 to 90)
     - lon: Longitude (-180 to 180)
     - date: Date in YYYY-MM-DD or MM/DD/YYYY format
+    - resolution: "night" (default) for one score for the night, or
+      "hourly" / "15min" to also score each slot from sunset to sunrise
     
     Returns:
     - location: Coordinates
     - date: Requested date
     - visibility_score: Score from 0-100
-    - best_time: Optimal viewing window
+    - best_time: Optimal viewing window; with a timeline, the best
+      contiguous run of slots rather than the whole darkness window
     - explanation: Detailed breakdown of factors
     - details: Individual factor contributions including real moon phase
+    - timeline: Per-slot scores and the best window (timeline resolutions only)
     """
     
-    # Validate coordinates
-    if not -90 <= lat <= 90:
-        raise HTTPException(status_code=400, detail="Latitude must be between -90 and 90")
-    if not -180 <= lon <= 180:
-        raise HTTPException(status_code=400, detail="Longitude must be between -180 and 180")
+    validate_coordinates(lat, lon)
+    if resolution != "night" and resolution not in TIMELINE_RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"resolution must be one of: night, {', '.join(TIMELINE_RESOLUTIONS)}"
+        )
+    
+    iso_date = weather_service._format_date(date)
+    cell_id, cell_lat, cell_lon = cache.location_cell("hourly", lat, lon)
+    cache_key = response_cache.key(cell_id, iso_date, resolution)
+    
+    dates = [iso_date] if resolution == "night" else [
+        iso_date, (datetime.strptime(iso_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    ]
+    response = None
+    shed = None
+    # A cache slot covers the lookups and, when the inputs are cached
+    # (even if stale), computing from them; an upstream-bound request lets
+    # it go and holds only an upstream slot, so each class counts its own work
+    async with admission.slot("cache"):
+        cached = precomputed_results.lookup(cell_id, iso_date) if resolution == "night" else None
+        if cached is None:
+            cached = await response_cache.get(cache_key)
+        if cached is None and await weather_service.inputs_soft_expiry(cell_lat, cell_lon, dates) > 0:
+            response = await compute_visibility_or_500(cell_lat, cell_lon, iso_date, resolution)
+    
+    if cached is None and response is None:
+        try:
+            async with admission.slot("upstream"):
+                response = await compute_visibility_or_500(cell_lat, cell_lon, iso_date, resolution)
+        except Shed as e:
+            if admission.shed_mode != "degrade" or resolution != "night":
+                raise
+            shed = e
+            admission.stats["degraded_responses"] += 1
+            response = shed_visibility_response(cell_lat, cell_lon, iso_date)
+    
+    if cached is not None:
+        body, expires_at = cached
+    else:
+        body = response_cache.serialize(response)
+        expires_at = 0.0
+        if response["data_source"] != "degraded":
+            expires_at = await weather_service.inputs_soft_expiry(cell_lat, cell_lon, dates)
+            await response_cache.set(cache_key, body, expires_at)
+    
+    content = response_cache.assemble({"latitude": lat, "longitude": lon}, date, body)
+    etag = response_cache.etag(content)
+    headers = {"ETag": etag, "Cache-Control": response_cache.cache_control(expires_at)}
+    if shed is not None:
+        headers["X-Load-Shed"] = f"{shed.admission_class}:{shed.reason}"
+    if response_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+@router.post("/visibility/batch")
+async def get_visibility_batch(request: BatchVisibilityRequest):
+    """
+    Get visibility scores for many (lat, lon, date) items in one call.
+    
+    Items that fall in the same cache cell and date share one lookup; all
+    cache keys are read in a single pipelined round trip and misses are
+    fetched from upstream concurrently.
+    
+    Body:
+    - items: List of {lat, lon, date}, up to BATCH_MAX_ITEMS
+    
+    Returns:
+    - results: One entry per item, in request order, each with a status and
+      either the /visibility response as "result" or an "error"
+    - stats: Unique cache keys, cache hits and upstream fetches for the batch,
+      plus fallbacks used where upstream was down or failing (or
+      single_lookups, if the batched lookup failed and items were looked
+      up one by one)
+    """
+    results: List[dict] = [{} for _ in request.items]
+    
+    # Validate per item so one bad entry doesn't fail the whole batch
+    valid = []
+    for index, item in enumerate(request.items):
+        try:
+            validate_coordinates(item.lat, item.lon)
+            valid.append(index)
+        except HTTPException as e:
+            results[index] = {"index": index, "status": e.status_code, "error": e.detail}
+    
+    queries = [(request.items[i].lat, request.items[i].lon, request.items[i].date) for i in valid]
+    inputs, stats = await batch_visibility_inputs(queries)
+    pollution = light_pollution.values([lat for lat, _, _ in queries], [lon for _, lon, _ in queries]).tolist()
+    
+    for index, (lat, lon, date), item_inputs, item_pollution in zip(valid, queries, inputs, pollution):
+        if isinstance(item_inputs, Exception):
+            results[index] = {
+                "index": index,
+                "status": 500,
+                "error": f"Error fetching visibility inputs: {str(item_inputs)}"
+            }
+            continue
+        astronomy_data, cloud_cover, degraded = item_inputs
+        try:
+            results[index] = {
+                "index": index,
+                "status": 200,
+                "result": build_visibility_response(
+                    lat, lon, date, astronomy_data, cloud_cover, degraded, item_pollution
+                )
+            }
+        except Exception as e:
+            results[index] = {
+                "index": index,
+                "status": 500,
+                "error": f"Error calculating visibility: {str(e)}"
+            }
+    
+    return {
+        "count": len(results),
+        "results": results,
+        "stats": stats
+    }
+
+@router.get("/visibility/forecast")
+async def get_visibility_forecast(lat: float, lon: float, days: int = 7):
+    """
+    Score the next few nights for a location and rank them best first.
+    
+    Cloud cover for every night comes from one multi-day forecast request
+    (or straight from the cache), and is stored per day so later
+    /visibility calls for those dates are cache hits.
+    
+    Parameters:
+    - lat: Latitude (-90 to 90)
+    - lon: Longitude (-180 to 180)
+    - days: Number of nights starting today (1 to FORECAST_MAX_DAYS)
+    
+    Returns:
+    - best_night: Date with the highest visibility score
+    - nights: /visibility responses with a rank, best first
+    - stats: Cache hits and upstream requests used
+    """
+    validate_coordinates(lat, lon)
+    if not 1 <= days <= FORECAST_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {FORECAST_MAX_DAYS}")
     
     try:
-        # Fetch real astronomy data (moon phase, illumination, etc.)
-        astronomy_data = weather_service.get_astronomy_data(lat, lon, date)
-        
-        # Fetch real cloud cover data
-        cloud_cover = weather_service.get_cloud_cover(lat, lon, date)
-        
-        # Calculate darkness window (using real sunset/sunrise would be better)
-        darkness_window = calculate_darkness_window(date)
-        
-        # Calculate darkness hours
-        darkness_hours = calculate_darkness_hours(darkness_window)
-        
-        # Get moon illumination from real API data
-        moon_illumination = astronomy_data["moon_illumination"]
-        
-        # Calculate visibility score using real data
-        score_result = calculate_visibility_score(
-            cloud_cover=cloud_cover,
-            moon_illumination=moon_illumination,
-            darkness_hours=darkness_hours,
-            light_pollution=0.5
+        nights, stats = await weather_service.get_hourly_forecast_days(lat, lon, days)
+        astronomy = await asyncio.gather(
+            *(weather_service.get_astronomy_data(lat, lon, date) for date, _ in nights)
         )
-        
-        return {
-            "location": {
-                "latitude": lat,
-                "longitude": lon
-            },
-            "date": date,
-            "visibility_score": score_result["visibility_score"],
-            "best_time": f"{darkness_window['dark_start']} - {darkness_window['dark_end']}",
-            "explanation": score_result["explanation"],
-            "details": {
-                "cloud_cover_percent": cloud_cover,
-                "moon_illumination_percent": int(moon_illumination * 100),
-                "moon_phase": astronomy_data["moon_phase"],
-                "darkness_hours": darkness_hours,
-                "sunrise": astronomy_data["sunrise"],
-                "sunset": astronomy_data["sunset"],
-                "moonrise": astronomy_data["moonrise"],
-                "moonset": astronomy_data["moonset"]
-            },
-            "data_source": "real_api"  # Indicates real data is being used
-        }
+        pollution = light_pollution.value(lat, lon)
+        results = [
+            build_visibility_response(
+                lat, lon, date, astronomy_data,
+                weather_service.night_cloud_cover(record, astronomy_data),
+                weather_service.degraded_inputs(astronomy_data, record),
+                pollution
+            )
+            for (date, record), astronomy_data in zip(nights, astronomy)
+        ]
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error calculating visibility forecast: {str(e)}"
+        )
+    
+    # Stable sort keeps earlier nights first on ties
+    ranked = sorted(results, key=lambda night: night["visibility_score"], reverse=True)
+    
+    return {
+        "location": {
+            "latitude": lat,
+            "longitude": lon
+        },
+        "days": days,
+        "best_night": ranked[0]["date"],
+        "nights": [{"rank": rank, **night} for rank, night in enumerate(ranked, start=1)],
+        "stats": stats
+    }
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """Parse and validate a "min_lon,min_lat,max_lon,max_lat" bounding box"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    
+    validate_coordinates(min_lat, min_lon)
+    validate_coordinates(max_lat, max_lon)
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=400, detail="bbox minimums must be below its maximums")
+    return min_lon, min_lat, max_lon, max_lat
+
+def grid_astronomy(lats: np.ndarray, lons: np.ndarray, date: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Moon illumination and darkness hours for every cell, evaluated once per
+    GRID_ASTRONOMY_STEP block of the grid and spread to the cells in it
+    """
+    step = GRID_ASTRONOMY_STEP
+    blocks = np.stack([np.floor(lats / step), np.floor(lons / step)], axis=1)
+    unique_blocks, inverse = np.unique(blocks, axis=0, return_inverse=True)
+    centers = (unique_blocks + 0.5) * step
     
+    eph = astronomy_for_many(centers[:, 0], centers[:, 1], [date] * len(centers))
+    inverse = inverse.ravel()
+    return eph["moon_illumination"][inverse], eph["darkness_hours"][inverse]
+
+@router.get("/visibility/grid")
+async def get_visibility_grid(bbox: str, resolution: float, date: str, format: str = "base64"):
+    """
+    Get a raster of visibility scores over a bounding box.
+    
+    Cloud cover comes from the cache (one pipelined read per distinct cache
+    cell) with at most GRID_MAX_UPSTREAM_FETCHES upstream requests. Cells
+    with no cloud cover, beyond that budget or with upstream failing, are
+    GRID_NODATA (255) rather than scored from a made-up default, and
+    counted in stats.missing_cells; a client can ask again for them.
+    
+    Parameters:
+    - bbox: min_lon,min_lat,max_lon,max_lat
+    - resolution: Cell size in degrees
+    - date: Date in YYYY-MM-DD or MM/DD/YYYY format
+    - format: "base64" (JSON with a row-major uint8 array) or "png" (grayscale tile)
+    
+    Returns:
+    - Scores 0-100 as uint8, row 0 at the north edge, column 0 at the west edge,
+      and nodata (255) for missing cells; transparent in the PNG, whose
+      X-Grid-Nodata and X-Grid-Missing headers give the value and count
+    """
+    if format not in ("base64", "png"):
+        raise HTTPException(status_code=400, detail="format must be 'base64' or 'png'")
+    if resolution <= 0:
+        raise HTTPException(status_code=400, detail="resolution must be positive")
+    
+    min_lon, min_lat, max_lon, max_lat = parse_bbox(bbox)
+    width = math.ceil((max_lon - min_lon) / resolution - 1e-9)
+    height = math.ceil((max_lat - min_lat) / resolution - 1e-9)
+    if width * height > GRID_MAX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Grid of {width}x{height} cells exceeds the {GRID_MAX_CELLS} cell limit"
+        )
+    
+    # Cell centers, north to south and west to east
+    lats = max_lat - (np.arange(height) + 0.5) * resolution
+    lons = min_lon + (np.arange(width) + 0.5) * resolution
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing="ij")
+    cell_lats, cell_lons = lat_grid.ravel(), lon_grid.ravel()
+    iso_date = weather_service._format_date(date)
+    
+    try:
+        cloud_cover, stats = await weather_service.get_cloud_cover_many(
+            [(lat, lon, iso_date) for lat, lon in zip(cell_lats.tolist(), cell_lons.tolist())],
+            max_fetches=GRID_MAX_UPSTREAM_FETCHES
+        )
+        with timed("ephemeris"):
+            moon_illumination, darkness_hours = grid_astronomy(cell_lats, cell_lons, iso_date)
+        
+        cloud_cover = np.asarray(cloud_cover, dtype=float)  # None -> NaN
+        missing = np.isnan(cloud_cover)
+        with timed("scoring"):
+            scores = calculate_visibility_scores(
+                cloud_cover=np.where(missing, 0.0, cloud_cover),
+                moon_illumination=moon_illumination * 100,
+                darkness_hours=darkness_hours,
+                light_pollution=light_pollution.values(cell_lats, cell_lons)
+            )["visibility_score"]
     except Exception as e:
         raise HTTPException(
-            status_code=500, 
-            detail=f"Error calculating visibility: {str(e)}"
-        )
\ No newline at end of file
+            status_code=500,
+            detail=f"Error calculating visibility grid: {str(e)}"
+        )
+    
+    grid = np.where(missing, GRID_NODATA, np.clip(scores, 0, 100)).astype(np.uint8).reshape(height, width)
+    stats["missing_cells"] = int(missing.sum())
+    
+    if format == "png":
+        return Response(
+            content=encode_png(grid, transparent=GRID_NODATA),
+            media_type="image/png",
+            headers={
+                "X-Grid-Width": str(width),
+                "X-Grid-Height": str(height),
+                "X-Grid-Nodata": str(GRID_NODATA),
+                "X-Grid-Missing": str(stats["missing_cells"])
+            }
+        )
+    
+    return {
+        "bbox": [min_lon, min_lat, max_lon, max_lat],
+        "resolution": resolution,
+        "date": iso_date,
+        "width": width,
+        "height": height,
+        "dtype": "uint8",
+        "nodata": GRID_NODATA,
+        "encoding": "base64",
+        "data": encode_base64(grid),
+        "stats": stats
+    }
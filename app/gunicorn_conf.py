@@ -0,0 +1,45 @@
+"""
+Gunicorn settings for running several workers
+
+    gunicorn -c app/gunicorn_conf.py app.main:app
+
+With preload_app the master imports the app once and forks the workers
+from it: imports, the light-pollution mapping and other module-level
+setup happen once, and their pages are shared copy-on-write. Nothing
+opens a socket or starts a thread at import time (RedisCache.connect
+and the pools run in each worker's lifespan), so forking is safe.
+
+Each worker then warms up on its own and reports ready on /readyz. On
+SIGTERM it drains in-flight upstream work for up to
+SHUTDOWN_DRAIN_TIMEOUT, within gunicorn's graceful_timeout.
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty, writable directory so /metrics
+aggregates every worker.
+"""
+
+import glob
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+# Longer than SHUTDOWN_DRAIN_TIMEOUT, so a draining worker isn't killed mid-drain
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+accesslog = None
+
+
+def on_starting(server) -> None:
+    # Stale per-process metric files from an earlier run would be summed in
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker) -> None:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,93 @@
-from fastapi import FastAPI
-from app.api.visibility import router as visibility_router
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api.visibility import router as visibility_router, weather_service
 from app.api.cache import router as cache_router
+from app.api.export import router as export_router
+from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
+from app.services.admission import Shed
+from app.services.lifecycle import lifecycle
+from app.services.log import configure_logging
+from app.services.metrics import (
+    REQUEST_SECONDS, server_timing_header, start_request_timing, stop_request_timing
+)
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+from app.services.refresh_scheduler import refresh_scheduler
 
-app = FastAPI(title="Sky Visibility API")
+
+configure_logging()
+
+# Server-Timing header: "off", "opt-in" (only for requests sending
+# X-Server-Timing: 1) or "always"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "opt-in").lower()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up concurrently in the background: the server accepts
+    # connections (and answers /livez) at once, /readyz once pools are warm.
+    # A dependency that's down starts its background reconnects right away
+    lifecycle.start({
+        "redis": lambda: asyncio.to_thread(cache.connect),
+        "redis_async": async_cache.warm,
+        "upstream": weather_service.warm
+    })
+    refresh_scheduler.start()
+    yield
+    # Drain: report not-ready, let in-flight proactive refreshes and
+    # upstream calls finish within SHUTDOWN_DRAIN_TIMEOUT, then close the
+    # pooled upstream and Redis connections
+    lifecycle.begin_drain()
+    await refresh_scheduler.stop(lifecycle.drain_remaining())
+    await weather_service.drain(lifecycle.drain_remaining())
+    await weather_service.aclose()
+    await async_cache.aclose()
+
+
+app = FastAPI(title="Sky Visibility API", lifespan=lifespan)
 
 # Include routers
 app.include_router(visibility_router)
+app.include_router(export_router)
 app.include_router(cache_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+
+
+@app.exception_handler(Shed)
+async def shed_request(request: Request, exc: Shed):
+    """Requests shed by admission control: a fast 503 saying when to retry"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=exc.headers)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record request latency per route and, if asked for, a Server-Timing breakdown"""
+    start = time.perf_counter()
+    wants_timing = SERVER_TIMING == "always" or (
+        SERVER_TIMING == "opt-in" and request.headers.get("x-server-timing") == "1"
+    )
+    token = start_request_timing() if wants_timing else None
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = stop_request_timing(token) if token is not None else None
+        # Route template, not the raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(request.method, getattr(route, "path", "unmatched"), str(status)).observe(elapsed)
+
+    if timings is not None:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
 
 @app.get("/")
 def read_root():
     return {"message": "Sky Visibility API is running"}
-
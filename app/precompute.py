@@ -0,0 +1,153 @@
+"""
+Precompute /visibility results for registered observing sites
+
+Reads a site list (CSV: lat,lon[,anything else], a header row is
+skipped), fetches the inputs for the next --nights nights through the
+service's batched cache/upstream path (concurrent, and paced to at most
+--max-rps upstream requests per second), scores every site and night
+exactly as GET /visibility would and writes a results file for
+app.services.precomputed. Sites sharing a location cell are computed
+once, at the cell center, like the live path.
+
+Usage:
+    python -m app.precompute SITES OUTPUT [--nights 7] [--start YYYY-MM-DD]
+        [--concurrency 10] [--max-rps 20] [--chunk-size 500] [--valid-for 3600]
+
+Then set PRECOMPUTED_RESULTS=OUTPUT on the API. Re-running replaces the
+file atomically; API workers pick the new one up within
+PRECOMPUTED_CHECK_SECONDS.
+"""
+
+import argparse
+import asyncio
+import csv
+import math
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.api.visibility import build_visibility_response, weather_service
+from app.services.light_pollution import light_pollution
+from app.services.precomputed import ROW_COLUMNS, write_results
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+from app.services.response_cache import response_cache
+
+
+def read_sites(path: str) -> List[Tuple[float, float]]:
+    """(lat, lon) per row of a CSV site list"""
+    sites = []
+    with open(path, newline="") as f:
+        for i, row in enumerate(csv.reader(f)):
+            if not row or not row[0].strip():
+                continue
+            try:
+                lat, lon = float(row[0]), float(row[1])
+            except (ValueError, IndexError):
+                if i == 0:
+                    continue
+                raise ValueError(f"{path} line {i + 1}: expected lat,lon")
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"{path} line {i + 1}: coordinates out of range")
+            sites.append((lat, lon))
+    return sites
+
+
+async def precompute(sites: List[Tuple[float, float]], start: date, nights: int,
+                     concurrency: int, max_rps: float, chunk_size: int) -> Dict:
+    """
+    Compute every (site cell, night); returns the write_results arguments
+    (cells, lats, lons, columns, bodies) and run stats
+    """
+    cells: Dict[str, Tuple[float, float]] = {}
+    for lat, lon in sites:
+        cell_id, cell_lat, cell_lon = cache.location_cell("hourly", lat, lon)
+        cells.setdefault(cell_id, (cell_lat, cell_lon))
+    cell_ids = sorted(cells)
+
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(nights)]
+    queries = [(*cells[cell_id], iso_date) for cell_id in cell_ids for iso_date in dates]
+
+    weather_service.batch_concurrency = concurrency
+    columns: Dict[str, List[float]] = {name: [] for name, _ in ROW_COLUMNS}
+    bodies: List[bytes] = []
+    stats = {"sites": len(sites), "cells": len(cell_ids), "rows": len(queries), "upstream_fetches": 0, "degraded": 0}
+
+    for offset in range(0, len(queries), chunk_size):
+        chunk = queries[offset:offset + chunk_size]
+        chunk_start = time.monotonic()
+
+        inputs, chunk_stats = await weather_service.get_visibility_inputs_many(chunk)
+        pollution = light_pollution.values([lat for lat, _, _ in chunk], [lon for _, lon, _ in chunk])
+        for (lat, lon, iso_date), (astronomy_data, cloud_cover, degraded), value in zip(chunk, inputs, pollution):
+            response = build_visibility_response(lat, lon, iso_date, astronomy_data, cloud_cover, degraded, float(value))
+            bodies.append(response_cache.serialize(response))
+            columns["score"].append(response["visibility_score"])
+            columns["cloud_cover"].append(cloud_cover)
+            columns["moon_illumination"].append(astronomy_data["moon_illumination"])
+            columns["light_pollution"].append(float(value))
+            columns["degraded"].append(1 if degraded else 0)
+            stats["degraded"] += bool(degraded)
+
+        # Pace upstream load: this chunk's fetches may not exceed max_rps
+        fetches = chunk_stats["upstream_fetches"]
+        stats["upstream_fetches"] += fetches
+        if max_rps > 0:
+            await asyncio.sleep(max(0.0, fetches / max_rps - (time.monotonic() - chunk_start)))
+
+    return {
+        "cells": cell_ids,
+        "lats": [cells[cell_id][0] for cell_id in cell_ids],
+        "lons": [cells[cell_id][1] for cell_id in cell_ids],
+        "columns": columns,
+        "bodies": bodies,
+        "stats": stats
+    }
+
+
+async def run(sites_path: str, output: str, nights: int, start: Optional[date], concurrency: int,
+              max_rps: float, chunk_size: int, valid_for: float) -> Dict:
+    sites = read_sites(sites_path)
+    start = start or datetime.now(timezone.utc).date()
+    began = time.perf_counter()
+    try:
+        result = await precompute(sites, start, nights, concurrency, max_rps, chunk_size)
+    finally:
+        await weather_service.aclose()
+        await async_cache.aclose()
+
+    write_results(
+        output, result["cells"], result["lats"], result["lons"], start, nights,
+        result["columns"], result["bodies"], time.time() + valid_for
+    )
+    scores = [score for score in result["columns"]["score"] if not math.isnan(score)]
+    return {
+        **result["stats"],
+        "first_date": start.isoformat(),
+        "nights": nights,
+        "mean_score": round(sum(scores) / len(scores), 1) if scores else None,
+        "seconds": round(time.perf_counter() - began, 2)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sites", help="CSV of lat,lon")
+    parser.add_argument("output")
+    parser.add_argument("--nights", type=int, default=7)
+    parser.add_argument("--start", type=date.fromisoformat, help="First night (default: today, UTC)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent upstream requests")
+    parser.add_argument("--max-rps", type=float, default=20.0, help="Upstream requests per second, 0 for no limit")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Site-nights per batched lookup")
+    parser.add_argument("--valid-for", type=float, default=3600.0, help="Seconds the results are served for")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(
+        args.sites, args.output, args.nights, args.start, args.concurrency,
+        args.max_rps, args.chunk_size, args.valid_for
+    ))
+    print(f"wrote {args.output}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Admission Control
+Separate concurrency limits for cache-answerable and upstream-bound
+requests, with bounded deadline-aware queues, and per-API-key
+token-bucket quotas kept in Redis
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from typing import AsyncContextManager, AsyncIterator, Deque, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from app.services.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED, ADMISSION_WAIT_SECONDS
+from app.services.redis_async import async_cache
+
+# Monotonic time by which the current request should be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("admission_deadline", default=None)
+
+
+class Shed(Exception):
+    """A request turned away by admission control, and when to retry"""
+
+    def __init__(self, admission_class: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"Service overloaded ({admission_class} requests: {reason}), retry later")
+        self.admission_class = admission_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class AdmissionClass:
+    """
+    A concurrency limit with a bounded FIFO queue in front of it
+
+    Over the limit, requests queue (up to max_queue of them) for at most
+    max_wait seconds or until their deadline, whichever is sooner. An
+    arrival whose expected wait -- its queue position times the mean time
+    a slot is held, over the limit -- is already past that budget is shed
+    at once, so overload turns into fast rejections rather than requests
+    timing out at the back of the queue.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Exponentially weighted mean of how long a slot is held
+        self.mean_hold: Optional[float] = None
+        self.stats = {"admitted": 0, "waited": 0, "shed": 0}
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at this queue position gets a slot, going by recent hold times"""
+        if self.mean_hold is None:
+            return 0.0
+        return position * self.mean_hold / self.limit
+
+    def _shed(self, reason: str, position: int) -> Shed:
+        self.stats["shed"] += 1
+        ADMISSION_SHED.labels(self.name, reason).inc()
+        return Shed(self.name, reason, self.expected_wait(position))
+
+    async def _acquire(self, deadline: Optional[float]) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        position = len(self._waiters) + 1
+        if position > self.max_queue:
+            raise self._shed("queue_full", position)
+        budget = self.max_wait
+        if deadline is not None:
+            budget = min(budget, deadline - time.monotonic())
+        if self.expected_wait(position) > budget:
+            raise self._shed("deadline", position)
+
+        # _release hands the slot over by resolving the waiter
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["waited"] += 1
+        ADMISSION_QUEUE_DEPTH.labels(self.name).inc()
+        try:
+            await asyncio.wait_for(waiter, max(budget, 0.0))
+        except asyncio.TimeoutError:
+            raise self._shed("timeout", len(self._waiters))
+        except asyncio.CancelledError:
+            # Handed the slot just as the request went away: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.labels(self.name).dec()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold a slot for the block; raises Shed if none can be had in time"""
+        start = time.monotonic()
+        await self._acquire(_deadline.get())
+        acquired = time.monotonic()
+        ADMISSION_WAIT_SECONDS.labels(self.name).observe(acquired - start)
+        ADMISSION_IN_FLIGHT.labels(self.name).inc()
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            hold = time.monotonic() - acquired
+            self.mean_hold = hold if self.mean_hold is None else 0.9 * self.mean_hold + 0.1 * hold
+            ADMISSION_IN_FLIGHT.labels(self.name).dec()
+            self._release()
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "mean_hold_seconds": round(self.mean_hold, 4) if self.mean_hold is not None else None,
+            **self.stats
+        }
+
+
+class AdmissionController:
+    """
+    Admission for /visibility
+
+    A request answered from cache, or computed from cached inputs, holds a
+    "cache" slot, a generous limit since these take milliseconds; one that
+    has to fetch from upstream gives its cache slot back after the lookups
+    and holds an "upstream" slot, a much smaller limit, for the fetch.
+    Neither class's hold times include the other's work.
+    When upstream slows down, upstream-bound requests queue and get shed
+    while cache-answerable ones keep flowing. A shed upstream-bound request
+    gets a degraded response built from fallback inputs
+    (ADMISSION_SHED_MODE=degrade, the default) or a 503 with Retry-After
+    (reject); a shed cache-bound request always gets the 503.
+
+    Clients may send X-Request-Deadline-Ms, the time they will wait in
+    milliseconds; otherwise ADMISSION_DEADLINE_SECONDS applies.
+
+    With API_QUOTA_RATE set, each API key (the API_KEY_HEADER header, or
+    the client address without one) also draws from a token bucket in
+    Redis shared by every replica; an empty bucket is a 429 with
+    Retry-After. Quotas fail open while Redis is unreachable.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.classes = {
+            "cache": AdmissionClass(
+                "cache",
+                int(os.getenv("ADMISSION_CACHE_LIMIT", 256)),
+                int(os.getenv("ADMISSION_CACHE_QUEUE", 1024)),
+                float(os.getenv("ADMISSION_CACHE_MAX_WAIT", 0.5))
+            ),
+            "upstream": AdmissionClass(
+                "upstream",
+                int(os.getenv("ADMISSION_UPSTREAM_LIMIT", 32)),
+                int(os.getenv("ADMISSION_UPSTREAM_QUEUE", 64)),
+                float(os.getenv("ADMISSION_UPSTREAM_MAX_WAIT", 2.0))
+            )
+        }
+        self.default_deadline = float(os.getenv("ADMISSION_DEADLINE_SECONDS", 5.0))
+        self.shed_mode = os.getenv("ADMISSION_SHED_MODE", "degrade").lower()
+
+        # Requests per second per API key, 0 for no quota, and the burst allowed
+        self.quota_rate = float(os.getenv("API_QUOTA_RATE", 0))
+        self.quota_burst = float(os.getenv("API_QUOTA_BURST", 20))
+        self.api_key_header = os.getenv("API_KEY_HEADER", "X-API-Key")
+
+        self.stats = {"degraded_responses": 0, "quota_rejections": 0, "quota_unavailable": 0}
+
+    def slot(self, name: str) -> AsyncContextManager:
+        """A slot of the named class for an async with block (a no-op when disabled)"""
+        if not self.enabled:
+            return nullcontext()
+        return self.classes[name].admit()
+
+    async def check_quota(self, request: Request) -> None:
+        """Router dependency: take a token from the caller's bucket or answer 429"""
+        if self.quota_rate <= 0:
+            return
+
+        api_key = request.headers.get(self.api_key_header)
+        if api_key:
+            # Hashed so keys aren't stored in Redis in the clear
+            identity = "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        else:
+            identity = "addr:" + (request.client.host if request.client else "unknown")
+
+        result = await async_cache.take_token(f"quota:{identity}", self.quota_rate, self.quota_burst)
+        if result is None:
+            self.stats["quota_unavailable"] += 1
+            return
+        taken, tokens = result
+        if not taken:
+            self.stats["quota_rejections"] += 1
+            ADMISSION_SHED.labels("quota", "exhausted").inc()
+            raise HTTPException(
+                status_code=429,
+                detail="API quota exceeded",
+                headers={"Retry-After": str(max(1, math.ceil((1 - tokens) / self.quota_rate)))}
+            )
+
+    async def set_deadline(self, request: Request) -> None:
+        """Route dependency: set the deadline slots are queued against for this request"""
+        budget = self.default_deadline
+        header = request.headers.get("x-request-deadline-ms")
+        if header:
+            try:
+                budget = max(0.0, float(header) / 1000)
+            except ValueError:
+                pass
+        _deadline.set(time.monotonic() + budget)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "shed_mode": self.shed_mode,
+            "default_deadline_seconds": self.default_deadline,
+            "quota": {"rate": self.quota_rate, "burst": self.quota_burst} if self.quota_rate > 0 else None,
+            "classes": {name: admission_class.get_stats() for name, admission_class in self.classes.items()},
+            **self.stats
+        }
+
+
+# Global admission controller for this worker
+admission = AdmissionController()
@@ -0,0 +1,76 @@
+"""
+Background Cache Jobs
+Runs large cache clears off the request path and tracks their progress
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.services.redis_cache import cache
+
+
+class ClearJobs:
+    """
+    Registry of background clear_pattern runs
+
+    Each job runs in its own daemon thread and reports how many keys it
+    has scanned and deleted so far. Only the most recent jobs are kept.
+    """
+
+    def __init__(self) -> None:
+        self.max_jobs = int(os.getenv("CACHE_CLEAR_MAX_JOBS", 100))
+
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, pattern: str, batch_size: Optional[int] = None) -> Dict:
+        """Start clearing pattern in the background; returns the job's initial state"""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "pattern": pattern,
+            "status": "running",
+            "scanned": 0,
+            "deleted": 0,
+            "started_at": time.time(),
+            "finished_at": None,
+            "error": None
+        }
+
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        threading.Thread(
+            target=self._run, args=(job, batch_size), name=f"cache-clear-{job['job_id'][:8]}", daemon=True
+        ).start()
+        return dict(job)
+
+    def _run(self, job: Dict, batch_size: Optional[int]) -> None:
+        def progress(scanned: int, deleted: int) -> None:
+            job["scanned"] = scanned
+            job["deleted"] = deleted
+
+        try:
+            job["deleted"] = cache.clear_pattern(job["pattern"], batch_size, progress)
+            job["status"] = "done" if cache.enabled else "failed"
+            if not cache.enabled:
+                job["error"] = "Cache became unavailable during the clear"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job's state, None if unknown or already evicted"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+# Global job registry
+clear_jobs = ClearJobs()
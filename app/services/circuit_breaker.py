@@ -0,0 +1,226 @@
+"""
+Upstream Circuit Breakers
+Fail fast while an upstream endpoint is down or slow, and size its
+timeout from the latency it has actually shown recently
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+from app.services.metrics import CIRCUIT_REJECTIONS, CIRCUIT_STATE
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+
+def is_upstream_failure(e: BaseException) -> bool:
+    """
+    Errors that say the upstream itself is unhealthy: timeouts, connection
+    errors, 5xx and 429. Other 4xx responses and bad payloads don't count.
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream endpoint
+
+    - closed: calls go through. Outcomes from the last window_seconds are
+      kept; once there are min_calls of them and the failure rate or the
+      slow-call rate reaches its threshold, the circuit opens
+    - open: calls fail immediately with CircuitOpenError for open_seconds
+    - half_open: up to half_open_probes calls go through; if they all
+      succeed the circuit closes, any failure re-opens it
+
+    timeout() adapts to recent successful latencies: a multiple of their
+    p95, between min_timeout and max_timeout, so a healthy fast upstream
+    isn't given the full max_timeout to hang.
+    """
+
+    def __init__(self, name: str, max_timeout: float) -> None:
+        self.name = name
+        self.failure_rate = float(os.getenv("UPSTREAM_BREAKER_FAILURE_RATE", 0.5))
+        self.slow_call_seconds = float(os.getenv("UPSTREAM_BREAKER_SLOW_SECONDS", 3.0))
+        self.slow_call_rate = float(os.getenv("UPSTREAM_BREAKER_SLOW_RATE", 0.8))
+        self.min_calls = int(os.getenv("UPSTREAM_BREAKER_MIN_CALLS", 10))
+        self.window_seconds = float(os.getenv("UPSTREAM_BREAKER_WINDOW_SECONDS", 30))
+        self.open_seconds = float(os.getenv("UPSTREAM_BREAKER_OPEN_SECONDS", 15))
+        self.half_open_probes = int(os.getenv("UPSTREAM_BREAKER_HALF_OPEN_PROBES", 1))
+
+        self.max_timeout = max_timeout
+        self.min_timeout = min(float(os.getenv("UPSTREAM_TIMEOUT_MIN", 1.0)), max_timeout)
+        self.timeout_multiplier = float(os.getenv("UPSTREAM_TIMEOUT_MULTIPLIER", 3.0))
+        self.timeout_min_samples = int(os.getenv("UPSTREAM_TIMEOUT_MIN_SAMPLES", 20))
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # (time, failed, slow) per call in the current window
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+
+        self.stats = {"opened": 0, "rejected": 0}
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def is_open(self) -> bool:
+        """Whether calls would be rejected right now (open and not yet due for a probe)"""
+        return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Quantile of recent successful latencies in seconds, None until there are enough of them"""
+        with self._lock:
+            if len(self._latencies) < self.timeout_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[max(0, int(len(latencies) * q) - 1)]
+
+    def timeout(self) -> float:
+        """Timeout for the next call, from recent successful latencies"""
+        p95 = self.latency_quantile(0.95)
+        if p95 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def before_call(self) -> None:
+        """Let a call through, or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self.stats["rejected"] += 1
+                    CIRCUIT_REJECTIONS.labels(self.name).inc()
+                    raise CircuitOpenError(f"Circuit for {self.name} is open")
+                self._set_state(HALF_OPEN)
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.stats["rejected"] += 1
+                    CIRCUIT_REJECTIONS.labels(self.name).inc()
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open, probe in flight")
+                self._probes_in_flight += 1
+
+    def record(self, seconds: float, failed: bool) -> None:
+        """Record the outcome of a call let through by before_call"""
+        slow = seconds >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if not failed:
+                self._latencies.append(seconds)
+
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._outcomes.clear()
+                        self._set_state(CLOSED)
+                return
+
+            if self.state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            self._outcomes.append((now, failed, slow))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._set_state(OPEN)
+        self._opened_at = now
+        self._outcomes.clear()
+        self.stats["opened"] += 1
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run one upstream call through the breaker, recording how it went"""
+        self.before_call()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(time.perf_counter() - start, is_upstream_failure(e))
+            raise
+        except BaseException:
+            # Cancelled: says nothing about the upstream, just free the probe slot
+            self._release_probe()
+            raise
+        self.record(time.perf_counter() - start, False)
+
+    def _release_probe(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            stats = {
+                "state": self.state,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+                **self.stats
+            }
+        stats["timeout_seconds"] = round(self.timeout(), 3)
+        p95 = self.latency_quantile(0.95)
+        stats["latency_p95_seconds"] = round(p95, 4) if p95 is not None else None
+        return stats
+
+
+class UpstreamBreakers:
+    """One CircuitBreaker per upstream endpoint, created on first use"""
+
+    def __init__(self) -> None:
+        self.max_timeout = float(os.getenv("UPSTREAM_TIMEOUT", 10.0))
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(endpoint, CircuitBreaker(endpoint, self.max_timeout))
+        return breaker
+
+    def is_open(self, endpoint: str) -> bool:
+        return self.get(endpoint).is_open()
+
+    def get_stats(self) -> dict:
+        """Breaker state per endpoint, for /cache/stats"""
+        return {name: breaker.get_stats() for name, breaker in list(self._breakers.items())}
+
+
+# Global breakers, shared by every upstream call in this worker
+upstream_breakers = UpstreamBreakers()
@@ -0,0 +1,440 @@
+"""
+Local Astronomy Engine
+Vectorized sun/moon ephemeris: positions, rise/set, twilight and lunar
+illumination, computed with NumPy instead of calling astronomy.json
+
+Sun positions use the Astronomical Almanac low-precision formulae
+(~0.01 deg) and moon positions the truncated lunar series (~0.3 deg),
+which keeps rise/set and twilight times within about a minute.
+"""
+
+from datetime import date as date_type, datetime
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+# Julian day of 2000-01-01 12:00 UTC minus the JD of proleptic ordinal 0
+_J2000_FROM_ORDINAL = 1721424.5 - 2451545.0
+
+# Sample grid: local 00:00 of the date through local 12:00 the next day
+STEP_MINUTES = 5.0
+WINDOW_MINUTES = 36 * 60
+_SAMPLES = np.arange(0.0, WINDOW_MINUTES + STEP_MINUTES, STEP_MINUTES)
+_NOON = 12 * 60
+_MIDNIGHT = 24 * 60
+
+# Sun/moon positions are evaluated hourly and interpolated onto the sample
+# grid; over an hour both move slowly enough for linear interpolation
+_NODE_STRIDE = int(60 / STEP_MINUTES)
+_NODES = _SAMPLES[::_NODE_STRIDE]
+_NODE_INDEX = np.minimum(np.arange(_SAMPLES.size) // _NODE_STRIDE, _NODES.size - 2)
+_NODE_FRACTION = (_SAMPLES - _NODES[_NODE_INDEX]) / 60.0
+
+# Altitudes (degrees) of the sun's center for each event
+SUNRISE_ALTITUDE = -0.833   # upper limb on the horizon, with refraction
+TWILIGHT_ALTITUDES = {
+    "civil": -6.0,
+    "nautical": -12.0,
+    "astronomical": -18.0
+}
+
+# Sky state by sun altitude, darkest last; see twilight_states
+TWILIGHT_STATES = ["day", "civil", "nautical", "astronomical", "night"]
+
+MOON_PHASES = [
+    "New Moon", "Waxing Crescent", "First Quarter", "Waxing Gibbous",
+    "Full Moon", "Waning Gibbous", "Last Quarter", "Waning Crescent"
+]
+
+DateLike = Union[str, date_type, datetime]
+
+
+def _sind(x):
+    return np.sin(np.radians(x))
+
+
+def _cosd(x):
+    return np.cos(np.radians(x))
+
+
+def days_since_j2000(ordinals, minutes, utc_offset_hours):
+    """
+    Days since J2000.0 for local times given as (date ordinal, minutes
+    after local midnight) at a fixed UTC offset. Arguments broadcast.
+    """
+    return (np.asarray(ordinals, dtype=float) + _J2000_FROM_ORDINAL
+            + (np.asarray(minutes, dtype=float) / 60.0 - np.asarray(utc_offset_hours, dtype=float)) / 24.0)
+
+
+def sun_position(d):
+    """
+    Geocentric sun position for days since J2000
+    Returns (right_ascension, declination, ecliptic_longitude) in degrees
+    """
+    g = (357.529 + 0.98560028 * d) % 360.0
+    q = (280.459 + 0.98564736 * d) % 360.0
+    lam = q + 1.915 * _sind(g) + 0.020 * _sind(2 * g)
+    eps = 23.439 - 0.00000036 * d
+
+    ra = np.degrees(np.arctan2(_cosd(eps) * _sind(lam), _cosd(lam)))
+    dec = np.degrees(np.arcsin(_sind(eps) * _sind(lam)))
+    return ra, dec, lam
+
+
+def moon_position(d):
+    """
+    Geocentric moon position for days since J2000
+    Returns (right_ascension, declination, ecliptic_longitude,
+    ecliptic_latitude, horizontal_parallax) in degrees
+    """
+    t = d / 36525.0
+
+    lam = (218.32 + 481267.881 * t
+           + 6.29 * _sind(135.0 + 477198.87 * t)
+           - 1.27 * _sind(259.3 - 413335.36 * t)
+           + 0.66 * _sind(235.7 + 890534.22 * t)
+           + 0.21 * _sind(269.9 + 954397.74 * t)
+           - 0.19 * _sind(357.5 + 35999.05 * t)
+           - 0.11 * _sind(186.5 + 966404.03 * t))
+    beta = (5.13 * _sind(93.3 + 483202.02 * t)
+            + 0.28 * _sind(228.2 + 960400.89 * t)
+            - 0.28 * _sind(318.3 + 6003.15 * t)
+            - 0.17 * _sind(217.6 - 407332.21 * t))
+    parallax = (0.9508
+                + 0.0518 * _cosd(134.9 + 477198.85 * t)
+                + 0.0095 * _cosd(259.2 - 413335.38 * t)
+                + 0.0078 * _cosd(235.7 + 890534.23 * t)
+                + 0.0028 * _cosd(269.9 + 954397.70 * t))
+
+    # Ecliptic -> equatorial
+    eps = 23.439 - 0.00000036 * d
+    x = _cosd(beta) * _cosd(lam)
+    y = _cosd(beta) * _sind(lam)
+    z = _sind(beta)
+    y_eq = y * _cosd(eps) - z * _sind(eps)
+    z_eq = y * _sind(eps) + z * _cosd(eps)
+
+    ra = np.degrees(np.arctan2(y_eq, x))
+    dec = np.degrees(np.arcsin(np.clip(z_eq, -1.0, 1.0)))
+    return ra, dec, lam % 360.0, beta, parallax
+
+
+def altitude(lat, lon, d, ra, dec):
+    """Altitude (degrees) of a body at (ra, dec) seen from (lat, lon) at days since J2000"""
+    gmst = 280.46061837 + 360.98564736629 * d
+    hour_angle = gmst + lon - ra
+    sin_alt = _sind(lat) * _sind(dec) + _cosd(lat) * _cosd(dec) * _cosd(hour_angle)
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+
+def sun_altitude(lat, lon, d):
+    """Sun altitude (degrees); arguments broadcast"""
+    ra, dec, _ = sun_position(d)
+    return altitude(lat, lon, d, ra, dec)
+
+
+def moon_altitude(lat, lon, d):
+    """Topocentric moon altitude (degrees), corrected for parallax; arguments broadcast"""
+    ra, dec, _, _, parallax = moon_position(d)
+    alt = altitude(lat, lon, d, ra, dec)
+    return alt - parallax * _cosd(alt)
+
+
+def moon_illumination(d):
+    """
+    Illuminated fraction of the moon (0-1) and its phase name index
+    Returns (illumination, phase_index)
+    """
+    _, _, sun_lon = sun_position(d)
+    _, _, moon_lon, moon_lat, _ = moon_position(d)
+
+    # Elongation; the phase angle is close enough to 180 deg minus it
+    cos_elongation = _cosd(moon_lat) * _cosd(moon_lon - sun_lon)
+    illumination = (1.0 - cos_elongation) / 2.0
+
+    age = (moon_lon - sun_lon) % 360.0
+    phase_index = (np.floor((age + 22.5) / 45.0) % 8).astype(int)
+    return illumination, phase_index
+
+
+def _interpolate_nodes(values):
+    """Linearly interpolate (rows, nodes) values onto the (rows, samples) grid"""
+    lower = values[:, _NODE_INDEX]
+    upper = values[:, _NODE_INDEX + 1]
+    return lower + (upper - lower) * _NODE_FRACTION
+
+
+def _sampled_positions(d0):
+    """
+    Sun and moon equatorial coordinates on the sample grid for each
+    starting instant in d0 (days since J2000 at local midnight)
+    Returns (sun_ra, sun_dec, moon_ra, moon_dec, moon_parallax), each (len(d0), samples)
+    """
+    d = d0[:, None] + _NODES[None, :] / 1440.0
+    sun_ra, sun_dec, _ = sun_position(d)
+    moon_ra, moon_dec, _, _, parallax = moon_position(d)
+
+    # Unwrap right ascension so interpolation doesn't cross the 360 -> 0 jump
+    return (
+        _interpolate_nodes(np.unwrap(sun_ra, period=360.0, axis=1)),
+        _interpolate_nodes(sun_dec),
+        _interpolate_nodes(np.unwrap(moon_ra, period=360.0, axis=1)),
+        _interpolate_nodes(moon_dec),
+        _interpolate_nodes(parallax)
+    )
+
+
+def _crossings(f, rising: bool, lo, hi):
+    """
+    First time (minutes) per row where f crosses zero in the given
+    direction within [lo, hi); NaN where there is none
+    """
+    a = f[:, :-1]
+    b = f[:, 1:]
+    mask = (a < 0) & (b >= 0) if rising else (a >= 0) & (b < 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        times = _SAMPLES[:-1] + STEP_MINUTES * a / (a - b)
+
+    mask &= (times >= lo[:, None]) & (times < hi[:, None])
+    found = mask.any(axis=1)
+    idx = mask.argmax(axis=1)
+    return np.where(found, times[np.arange(f.shape[0]), idx], np.nan)
+
+
+def _dark_window(f, lo_default):
+    """
+    Start/end (minutes) of the night's span with f < 0, i.e. the sun below
+    a twilight altitude, searched from local noon to noon the next day
+    """
+    n = f.shape[0]
+    noon_idx = int(_NOON / STEP_MINUTES)
+    noon = np.full(n, float(_NOON))
+    end_of_window = np.full(n, float(WINDOW_MINUTES))
+
+    start = _crossings(f, False, noon, end_of_window)
+    # Already dark at noon: polar night
+    start = np.where(f[:, noon_idx] < 0, _NOON, start)
+
+    end = _crossings(f, True, np.nan_to_num(start, nan=lo_default), end_of_window)
+    end = np.where(np.isnan(start), np.nan, np.where(np.isnan(end), WINDOW_MINUTES, end))
+    return start, end
+
+
+def nightly_ephemeris(lat, lon, ordinals, utc_offset_hours=None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized ephemeris for N (lat, lon, date) tuples
+
+    Parameters:
+    - lat, lon: arrays of shape (N,) in degrees
+    - ordinals: proleptic Gregorian ordinals (date.toordinal()) of shape (N,)
+    - utc_offset_hours: local UTC offsets; defaults to the nominal zone, round(lon / 15)
+
+    Returns arrays of shape (N,). Times are minutes after local midnight of
+    the date (values over 1440 fall on the next morning), NaN when the event
+    doesn't happen:
+    - sunrise, sunset, moonrise, moonset (during the date itself)
+    - <level>_dusk / <level>_dawn for civil, nautical and astronomical twilight
+    - moon_illumination (0-1) and moon_phase_index at local midnight
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    ordinals = np.atleast_1d(np.asarray(ordinals, dtype=float))
+    if utc_offset_hours is None:
+        utc_offset_hours = np.round(lon / 15.0)
+    offsets = np.broadcast_to(np.asarray(utc_offset_hours, dtype=float), lat.shape)
+
+    n = lat.shape[0]
+    d0 = days_since_j2000(ordinals, 0.0, offsets)
+    d = d0[:, None] + _SAMPLES[None, :] / 1440.0
+    lat_col = lat[:, None]
+    lon_col = lon[:, None]
+
+    # Positions only depend on time, so rows sharing a date and UTC offset share them
+    unique_d0, inverse = np.unique(d0, return_inverse=True)
+    sun_ra, sun_dec, moon_ra, moon_dec, parallax = (
+        values[inverse] for values in _sampled_positions(unique_d0)
+    )
+
+    sun_alt = altitude(lat_col, lon_col, d, sun_ra, sun_dec)
+    moon_alt = altitude(lat_col, lon_col, d, moon_ra, moon_dec)
+
+    day_start = np.zeros(n)
+    day_end = np.full(n, float(_MIDNIGHT))
+
+    result: Dict[str, np.ndarray] = {
+        "sunrise": _crossings(sun_alt - SUNRISE_ALTITUDE, True, day_start, day_end),
+        "sunset": _crossings(sun_alt - SUNRISE_ALTITUDE, False, day_start, day_end),
+        # Moon's center at rise/set sits 0.7275 * parallax - 0.5667 deg above the horizon
+        "moonrise": _crossings(moon_alt - (0.7275 * parallax - 0.5667), True, day_start, day_end),
+        "moonset": _crossings(moon_alt - (0.7275 * parallax - 0.5667), False, day_start, day_end)
+    }
+
+    for level, level_alt in TWILIGHT_ALTITUDES.items():
+        dusk, dawn = _dark_window(sun_alt - level_alt, _NOON)
+        result[f"{level}_dusk"] = dusk
+        result[f"{level}_dawn"] = dawn
+
+    illumination, phase_index = moon_illumination(
+        days_since_j2000(ordinals, _MIDNIGHT, offsets)
+    )
+    result["moon_illumination"] = illumination
+    result["moon_phase_index"] = phase_index
+    return result
+
+
+def darkness_window(ephemeris: Dict[str, np.ndarray]):
+    """
+    Darkest available window per row: astronomical night, or nautical
+    twilight where the sun never gets 18 deg below the horizon
+
+    Returns (start, end, hours, level_index) arrays; level_index is 0 for
+    astronomical, 1 for nautical and -1 where there is no dark window
+    """
+    astro_start = ephemeris["astronomical_dusk"]
+    nautical_start = ephemeris["nautical_dusk"]
+    use_astro = ~np.isnan(astro_start)
+
+    start = np.where(use_astro, astro_start, nautical_start)
+    end = np.where(use_astro, ephemeris["astronomical_dawn"], ephemeris["nautical_dawn"])
+    hours = np.where(np.isnan(start), 0.0, (end - start) / 60.0)
+    level = np.where(use_astro, 0, np.where(np.isnan(nautical_start), -1, 1))
+    return start, end, hours, level
+
+
+def _to_ordinal(value: DateLike) -> int:
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date_type):
+        return value.toordinal()
+    return datetime.strptime(value, "%Y-%m-%d").toordinal()
+
+
+def utc_offset_hours(lat: float, lon: float, date: str) -> float:
+    """
+    UTC offset for a location on a date
+
+    Uses the location's real time zone (with DST) from 'timezonefinder',
+    the same local time upstream's hourly series is in. Falls back to the
+    nominal zone round(lon / 15), which can be an hour or more off (e.g.
+    UTC+2 for Nairobi, which is UTC+3), only if it isn't installed.
+    """
+    global _tz_finder
+    if _tz_finder is None:
+        try:
+            from timezonefinder import TimezoneFinder
+            _tz_finder = TimezoneFinder()
+        except ImportError:
+            _tz_finder = False
+
+    if _tz_finder:
+        name = _tz_finder.timezone_at(lat=lat, lng=lon)
+        if name:
+            from zoneinfo import ZoneInfo
+            local_noon = datetime.strptime(date, "%Y-%m-%d").replace(hour=12, tzinfo=ZoneInfo(name))
+            return local_noon.utcoffset().total_seconds() / 3600
+
+    return float(round(lon / 15.0))
+
+
+_tz_finder = None
+
+
+def format_minutes(minutes: float, twelve_hour: bool = False) -> Optional[str]:
+    """Format minutes after local midnight as a clock time ("21:30" or "09:30 PM")"""
+    if minutes is None or np.isnan(minutes):
+        return None
+    total = int(round(minutes)) % (24 * 60)
+    hour, minute = divmod(total, 60)
+    if twelve_hour:
+        return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+    return f"{hour:02d}:{minute:02d}"
+
+
+@lru_cache(maxsize=4096)
+def astronomy_for(lat: float, lon: float, date: str) -> Dict:
+    """
+    Astronomy data for one location and YYYY-MM-DD date, shaped like the
+    astronomy.json-derived dict the weather service returns, plus the
+    darkness window. Times are local (see utc_offset_hours).
+
+    Cached per (lat, lon, date); callers must not mutate the result.
+    """
+    eph = nightly_ephemeris([lat], [lon], [_to_ordinal(date)], utc_offset_hours(lat, lon, date))
+    start, end, hours, level = darkness_window(eph)
+
+    def clock(name: str, fallback: str) -> str:
+        return format_minutes(eph[name][0], twelve_hour=True) or fallback
+
+    return {
+        "moon_illumination": round(float(eph["moon_illumination"][0]), 3),
+        "moon_phase": MOON_PHASES[int(eph["moon_phase_index"][0])],
+        "sunrise": clock("sunrise", "No sunrise"),
+        "sunset": clock("sunset", "No sunset"),
+        "moonrise": clock("moonrise", "No moonrise"),
+        "moonset": clock("moonset", "No moonset"),
+        "dark_start": format_minutes(start[0]),
+        "dark_end": format_minutes(end[0]),
+        "darkness_hours": round(float(hours[0]), 1),
+        "darkness_level": ["astronomical", "nautical"][level[0]] if level[0] >= 0 else None
+    }
+
+
+def astronomy_for_many(lats: Sequence[float], lons: Sequence[float], dates: Sequence[DateLike],
+                       utc_offsets: Optional[Sequence[float]] = None) -> Dict[str, np.ndarray]:
+    """
+    Vectorized counterpart of astronomy_for: raw ephemeris plus darkness
+    window arrays. Times use utc_offsets, or the nominal zone when omitted.
+    """
+    ordinals = np.array([_to_ordinal(d) for d in dates], dtype=float)
+    eph = nightly_ephemeris(lats, lons, ordinals, utc_offsets)
+    start, end, hours, level = darkness_window(eph)
+    eph.update(dark_start=start, dark_end=end, darkness_hours=hours, darkness_level=level)
+    return eph
+
+
+def twilight_states(sun_alt) -> np.ndarray:
+    """
+    Index into TWILIGHT_STATES for each sun altitude: day, civil/nautical/
+    astronomical twilight, or full night with the sun 18 deg down
+    """
+    sun_alt = np.asarray(sun_alt, dtype=float)
+    return (
+        (sun_alt < SUNRISE_ALTITUDE).astype(int)
+        + (sun_alt < TWILIGHT_ALTITUDES["civil"])
+        + (sun_alt < TWILIGHT_ALTITUDES["nautical"])
+        + (sun_alt < TWILIGHT_ALTITUDES["astronomical"])
+    )
+
+
+@lru_cache(maxsize=1024)
+def night_slots(lat: float, lon: float, date: str, step_minutes: float = 60.0) -> Dict[str, np.ndarray]:
+    """
+    Sun and moon state for each step_minutes slot of the night starting on
+    a YYYY-MM-DD date, evaluated at the slot midpoints
+
+    Covers local noon of the date to noon the next day and keeps only slots
+    with the sun below the horizon. Returns arrays of equal length:
+    - start: slot start in minutes after local midnight of the date
+      (values over 1440 fall on the next morning)
+    - sun_altitude, moon_altitude (degrees), moon_illumination (0-1)
+    - twilight: index into TWILIGHT_STATES
+
+    Cached per (lat, lon, date, step); callers must not mutate the result.
+    """
+    start = np.arange(_NOON, _NOON + _MIDNIGHT, step_minutes)
+    d = days_since_j2000(_to_ordinal(date), start + step_minutes / 2, utc_offset_hours(lat, lon, date))
+
+    sun_alt = sun_altitude(lat, lon, d)
+    moon_alt = moon_altitude(lat, lon, d)
+    illumination, _ = moon_illumination(d)
+
+    night = sun_alt < SUNRISE_ALTITUDE
+    return {
+        "start": start[night],
+        "sun_altitude": sun_alt[night],
+        "moon_altitude": moon_alt[night],
+        "moon_illumination": illumination[night],
+        "twilight": twilight_states(sun_alt[night])
+    }
@@ -0,0 +1,116 @@
+"""
+Spatial Quantization
+Maps raw coordinates onto cells so nearby points share cache entries
+"""
+
+import math
+from typing import Tuple
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Encode a coordinate as a geohash string of the given length"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_decode(geohash: str) -> Tuple[float, float]:
+    """Decode a geohash to the (lat, lon) center of its cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        bits = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+class Quantizer:
+    """
+    Snaps coordinates to a cell
+
+    Configured with a spec string:
+    - "grid:<degrees>"  fixed lat/lon grid, e.g. "grid:0.05" (~5.5 km)
+    - "geohash:<chars>" geohash cell, e.g. "geohash:5" (~4.9 x 4.9 km)
+    - "none"            no quantization, the raw coordinates are the cell
+    """
+
+    def __init__(self, spec: str) -> None:
+        self.spec = spec.strip().lower()
+        kind, _, arg = self.spec.partition(":")
+
+        if kind == "grid":
+            self.kind = "grid"
+            self.step = float(arg)
+            if self.step <= 0:
+                raise ValueError(f"Grid step must be positive: {spec}")
+        elif kind == "geohash":
+            self.kind = "geohash"
+            self.precision = int(arg)
+            if not 1 <= self.precision <= 12:
+                raise ValueError(f"Geohash precision must be 1-12: {spec}")
+        elif kind == "none":
+            self.kind = "none"
+        else:
+            raise ValueError(f"Unknown quantization spec: {spec}")
+
+    def cell(self, lat: float, lon: float) -> Tuple[str, float, float]:
+        """
+        Returns (cell_id, center_lat, center_lon) for a coordinate
+
+        On a grid, lat 90 and lon 180 fall in the last cell below them
+        rather than a cell of their own past the edge, and a step that
+        doesn't divide the range has its edge cells' centers clamped to
+        it, so every center is a valid coordinate.
+        """
+        if self.kind == "grid":
+            i, center_lat = self._grid_cell(lat, 90.0)
+            j, center_lon = self._grid_cell(lon, 180.0)
+            return f"g{self.step:g}_{i}_{j}", center_lat, center_lon
+
+        if self.kind == "geohash":
+            geohash = geohash_encode(lat, lon, self.precision)
+            center_lat, center_lon = geohash_decode(geohash)
+            return f"gh_{geohash}", round(center_lat, 6), round(center_lon, 6)
+
+        return f"{lat}_{lon}", lat, lon
+
+    def _grid_cell(self, value: float, limit: float) -> Tuple[int, float]:
+        """(index, center) of value's grid cell, within -limit..limit"""
+        last = math.ceil(round(limit / self.step, 9)) - 1
+        index = max(-last - 1, min(last, math.floor(value / self.step)))
+        center = min(limit, max(-limit, (index + 0.5) * self.step))
+        return index, round(center, 6)
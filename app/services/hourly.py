@@ -0,0 +1,174 @@
+"""
+Hourly Forecast Records
+Packs one location-day of hourly weather into a compact binary record
+"""
+
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+HOURS = 24
+
+# Legacy night window used before darkness windows were known: 19:00-06:00
+DEFAULT_NIGHT_WINDOW = (19 * 60, 6 * 60)
+
+_VERSION = 1
+_HEADER = struct.Struct("<BB")  # version, hour count
+
+# (field, array typecode, scale, missing sentinel); values are stored as
+# round(value * scale) so the record is all small unsigned integers
+_FIELDS: Tuple[Tuple[str, str, int, int], ...] = (
+    ("cloud", "B", 1, 0xFF),           # %
+    ("humidity", "B", 1, 0xFF),        # %
+    ("visibility_km", "H", 10, 0xFFFF),  # 0.1 km
+    ("precip_mm", "H", 100, 0xFFFF)    # 0.01 mm
+)
+
+# forecast.json hour keys for each field
+_SOURCE_KEYS = {
+    "cloud": "cloud",
+    "humidity": "humidity",
+    "visibility_km": "vis_km",
+    "precip_mm": "precip_mm"
+}
+
+
+def _window_hours(start_minutes: int, end_minutes: int) -> List[int]:
+    """
+    Hours of the day overlapping [start, end) in minutes after midnight
+    A window ending at or before its start wraps past midnight
+    """
+    start_hour = (start_minutes // 60) % HOURS
+    end_hour = -(-end_minutes // 60) % HOURS  # ceil, so a partial last hour counts
+    if start_hour < end_hour:
+        return list(range(start_hour, end_hour))
+    return list(range(start_hour, HOURS)) + list(range(0, end_hour))
+
+
+def parse_clock(value: Optional[str]) -> Optional[int]:
+    """Minutes after midnight for an "HH:MM" clock time, None if missing"""
+    if not value:
+        return None
+    try:
+        return int(value[:2]) * 60 + int(value[3:5])
+    except ValueError:
+        return None
+
+
+def darkness_window(astronomy: Dict) -> Optional[Tuple[int, int]]:
+    """(start, end) minutes of the dark window in an astronomy dict, if it has one"""
+    start = parse_clock(astronomy.get("dark_start"))
+    end = parse_clock(astronomy.get("dark_end"))
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+class HourlyForecast:
+    """
+    Hourly cloud, humidity, visibility and precipitation for one
+    location and local calendar day
+
+    Packed layout (little endian): version u8, hour count u8, then
+    cloud u8[24], humidity u8[24], visibility u16[24] (0.1 km) and
+    precipitation u16[24] (0.01 mm) -- 146 bytes, against ~20 KB for the
+    forecast.json day it replaces. Missing hours hold the field's
+    all-ones sentinel and are left out of averages.
+    """
+
+    __slots__ = ("series",)
+
+    def __init__(self, series: Dict[str, array]) -> None:
+        self.series = series
+
+    @classmethod
+    def from_forecast_day(cls, forecast_day: Dict) -> "HourlyForecast":
+        """Build a record from one forecast.json forecastday entry"""
+        series = {name: array(code, [missing] * HOURS) for name, code, _, missing in _FIELDS}
+
+        for hour in forecast_day.get("hour", []):
+            # "YYYY-MM-DD HH:MM"
+            index = int(hour["time"][11:13])
+            for name, _, scale, missing in _FIELDS:
+                value = hour.get(_SOURCE_KEYS[name])
+                if value is not None:
+                    series[name][index] = min(int(round(value * scale)), missing - 1)
+
+        return cls(series)
+
+    @classmethod
+    def from_values(cls, values: Dict[str, Sequence[Optional[float]]]) -> "HourlyForecast":
+        """
+        Build a record from per-field hourly values in natural units (hour 0
+        first, None where missing); fields left out are all missing
+        """
+        series = {name: array(code, [missing] * HOURS) for name, code, _, missing in _FIELDS}
+
+        for name, _, scale, missing in _FIELDS:
+            for index, value in enumerate(values.get(name, ())[:HOURS]):
+                if value is not None:
+                    series[name][index] = min(int(round(value * scale)), missing - 1)
+
+        return cls(series)
+
+    def pack(self) -> bytes:
+        parts = [_HEADER.pack(_VERSION, HOURS)]
+        for name, _, _, _ in _FIELDS:
+            values = self.series[name]
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "HourlyForecast":
+        version, hours = _HEADER.unpack_from(data)
+        if version != _VERSION or hours != HOURS:
+            raise ValueError(f"Unsupported hourly record (version {version}, {hours} hours)")
+
+        series = {}
+        offset = _HEADER.size
+        for name, code, _, _ in _FIELDS:
+            values = array(code)
+            size = values.itemsize * HOURS
+            values.frombytes(data[offset:offset + size])
+            if sys.byteorder == "big":
+                values.byteswap()
+            series[name] = values
+            offset += size
+        return cls(series)
+
+    def values(self, field: str) -> List[Optional[float]]:
+        """Hourly values of a field in its natural unit, None where missing"""
+        _, _, scale, missing = next(f for f in _FIELDS if f[0] == field)
+        return [None if v == missing else v / scale for v in self.series[field]]
+
+    def average(self, field: str, hours: Iterable[int]) -> Optional[float]:
+        """Mean of a field over the given hours, None if all of them are missing"""
+        _, _, scale, missing = next(f for f in _FIELDS if f[0] == field)
+        raw = self.series[field]
+        present = [raw[h] for h in hours if raw[h] != missing]
+        if not present:
+            return None
+        return sum(present) / len(present) / scale
+
+    def window_average(self, field: str, start_minutes: int, end_minutes: int) -> Optional[float]:
+        """
+        Mean of a field over a clock window; a window past midnight wraps
+        onto the early hours of the same record
+        """
+        return self.average(field, _window_hours(start_minutes, end_minutes))
+
+    def cloud_cover(self, window: Optional[Tuple[int, int]] = None, default: int = 30) -> int:
+        """Average cloud cover (%) over a (start, end) minutes window, the legacy night hours by default"""
+        start, end = window or DEFAULT_NIGHT_WINDOW
+        cloud = self.window_average("cloud", start, end)
+        return int(cloud) if cloud is not None else default
+
+    def summary(self, window: Optional[Tuple[int, int]] = None) -> Dict[str, Optional[float]]:
+        """Every field averaged over a window (see cloud_cover)"""
+        start, end = window or DEFAULT_NIGHT_WINDOW
+        hours = _window_hours(start, end)
+        return {name: self.average(name, hours) for name, _, _, _ in _FIELDS}
@@ -0,0 +1,116 @@
+"""
+Worker Lifecycle
+Non-blocking startup, readiness and graceful draining for one worker process
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.services.log import get_logger, log_event
+from app.services.redis_async import async_cache
+
+logger = get_logger(__name__)
+
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+
+WarmUpStep = Callable[[], Awaitable]
+
+# Module import time, the closest thing to process start a worker can see
+# (with a preloading master this is the master's import, shared by workers)
+_IMPORTED_AT = time.monotonic()
+
+
+class Lifecycle:
+    """
+    Startup state behind /livez and /readyz
+
+    start() runs the warm-up steps (connecting and filling pools)
+    concurrently in a background task, so the server accepts connections
+    and answers /livez immediately while /readyz reports "starting". Once
+    every step has finished, or startup_timeout has passed, the worker is
+    ready; a failed step is reported but doesn't keep it out of rotation,
+    since every dependency has a fallback (unless READYZ_REQUIRE_REDIS).
+
+    On shutdown the worker reports "draining" and gets drain_timeout
+    seconds to finish in-flight upstream work before pools are closed.
+    """
+
+    def __init__(self) -> None:
+        self.startup_timeout = float(os.getenv("STARTUP_TIMEOUT", 10))
+        self.drain_timeout = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 15))
+        # Keep a worker out of rotation while Redis is unreachable
+        self.require_redis = os.getenv("READYZ_REQUIRE_REDIS", "false").lower() == "true"
+
+        self.state = STARTING
+        self.checks: Dict[str, Dict] = {}
+        self.ready_after: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._drain_started = 0.0
+
+    def start(self, steps: Dict[str, WarmUpStep]) -> None:
+        """Run the warm-up steps in the background on the running loop"""
+        self.state = STARTING
+        self._task = asyncio.ensure_future(self._warm_up(steps))
+
+    async def _run_step(self, name: str, step: WarmUpStep) -> None:
+        start = time.perf_counter()
+        check: Dict = {}
+        try:
+            check["ok"] = await step() is not False
+        except Exception as e:
+            check["ok"] = False
+            check["error"] = str(e)
+        check["seconds"] = round(time.perf_counter() - start, 4)
+        self.checks[name] = check
+
+    async def _warm_up(self, steps: Dict[str, WarmUpStep]) -> None:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._run_step(name, step) for name, step in steps.items())),
+                self.startup_timeout
+            )
+        except asyncio.TimeoutError:
+            pending = [name for name in steps if name not in self.checks]
+            for name in pending:
+                self.checks[name] = {"ok": False, "error": "timed out"}
+            log_event(logger, logging.WARNING, "warm-up timed out, serving anyway", pending=pending)
+
+        if self.state == STARTING:
+            self.state = READY
+            self.ready_after = time.monotonic() - _IMPORTED_AT
+            log_event(logger, logging.INFO, "worker ready", seconds=round(self.ready_after, 3), checks=self.checks)
+
+    def is_ready(self) -> bool:
+        if self.state != READY:
+            return False
+        return async_cache.enabled or not self.require_redis
+
+    def begin_drain(self) -> None:
+        """Report not-ready from now on and start the drain clock"""
+        self.state = DRAINING
+        self._drain_started = time.monotonic()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        log_event(logger, logging.INFO, "worker draining", timeout=self.drain_timeout)
+
+    def drain_remaining(self) -> float:
+        """Seconds left of the drain timeout"""
+        return max(0.0, self.drain_timeout - (time.monotonic() - self._drain_started))
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.is_ready(),
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "pid": os.getpid(),
+            "checks": self.checks
+        }
+
+
+# Global lifecycle of this worker process
+lifecycle = Lifecycle()
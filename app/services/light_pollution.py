@@ -0,0 +1,182 @@
+"""
+Light Pollution Raster
+Memory-mapped global light-pollution grid with constant-time lookups
+
+File format (little-endian): a 64-byte header followed by the cells,
+row-major, north to south and west to east:
+
+    magic       8s   b"LPRAST01"
+    dtype       B    1 = uint8, 2 = uint16
+    (padding)   3x
+    width       I    columns
+    height      I    rows
+    west        d    longitude of the left edge of column 0
+    north       d    latitude of the top edge of row 0
+    cell_size   d    degrees per cell, both axes
+    scale       d    pollution (0-100) = stored value * scale
+    nodata      I    stored value meaning "no data"
+    (padding)   to 64 bytes
+
+The file is mapped read-only, never read into memory: a lookup is an
+index computation plus one page-cache read, and every worker process
+mapping the same file shares the same physical pages.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.services.log import get_logger, log_event
+
+logger = get_logger(__name__)
+
+MAGIC = b"LPRAST01"
+HEADER = struct.Struct("<8sB3xIIddddI")
+HEADER_SIZE = 64
+DTYPES = {1: np.dtype("<u1"), 2: np.dtype("<u2")}
+
+
+def write_raster(path: str, values: np.ndarray, west: float, north: float, cell_size: float,
+                 scale: float, nodata: int) -> None:
+    """
+    Write a 2-D array of stored values (uint8 or uint16, row 0 = north) in
+    the raster format; written to a temporary file and renamed into place
+    so readers never map a half-written file
+    """
+    values = np.asarray(values)
+    if values.ndim != 2 or values.dtype.kind != "u" or values.dtype.itemsize not in (1, 2):
+        raise ValueError("values must be a 2-D uint8 or uint16 array")
+    code = values.dtype.itemsize
+
+    height, width = values.shape
+    header = HEADER.pack(MAGIC, code, width, height, west, north, cell_size, scale, nodata)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\x00"))
+        f.write(values.astype(DTYPES[code], copy=False).tobytes())
+    os.replace(tmp_path, path)
+
+
+class LightPollutionRaster:
+    """A mapped raster file; see the module docstring for the format"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, code, width, height, west, north, cell_size, scale, nodata = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or code not in DTYPES:
+            raise ValueError(f"{path} is not a light-pollution raster")
+
+        dtype = DTYPES[code]
+        if len(self._mmap) < HEADER_SIZE + width * height * dtype.itemsize:
+            raise ValueError(f"{path} is truncated")
+
+        self.width = width
+        self.height = height
+        self.west = west
+        self.north = north
+        self.cell_size = cell_size
+        self.scale = scale
+        self.nodata = nodata
+        self.south = north - height * cell_size
+        self.east = west + width * cell_size
+        self.itemsize = dtype.itemsize
+        # Zero-copy view over the mapping, for bulk lookups
+        self.cells = np.frombuffer(self._mmap, dtype=dtype, count=width * height, offset=HEADER_SIZE).reshape(height, width)
+
+    def _index(self, lat: float, lon: float) -> Optional[Tuple[int, int]]:
+        if not (self.south <= lat <= self.north and self.west <= lon <= self.east):
+            return None
+        # The southern/eastern edges belong to the last row/column
+        row = min(int((self.north - lat) / self.cell_size), self.height - 1)
+        col = min(int((lon - self.west) / self.cell_size), self.width - 1)
+        return row, col
+
+    def lookup(self, lat: float, lon: float) -> Optional[float]:
+        """Pollution (0-100) of the cell containing the point, None outside the grid or on no-data"""
+        index = self._index(lat, lon)
+        if index is None:
+            return None
+        offset = HEADER_SIZE + (index[0] * self.width + index[1]) * self.itemsize
+        if self.itemsize == 1:
+            value = self._mmap[offset]
+        else:
+            value = self._mmap[offset] | (self._mmap[offset + 1] << 8)
+        if value == self.nodata:
+            return None
+        return value * self.scale
+
+    def lookup_many(self, lats, lons, default: float) -> np.ndarray:
+        """Vectorized lookup; points outside the grid or on no-data get default"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        inside = (lats >= self.south) & (lats <= self.north) & (lons >= self.west) & (lons <= self.east)
+        # Points outside (or NaN) are pointed at cell 0 and masked out below
+        lats = np.where(inside, lats, self.north)
+        lons = np.where(inside, lons, self.west)
+        rows = np.minimum(((self.north - lats) / self.cell_size).astype(np.int64), self.height - 1)
+        cols = np.minimum(((lons - self.west) / self.cell_size).astype(np.int64), self.width - 1)
+
+        stored = self.cells[rows, cols]
+        valid = inside & (stored != self.nodata)
+        return np.where(valid, stored * self.scale, default)
+
+    def close(self) -> None:
+        self.cells = None
+        self._mmap.close()
+
+
+class LightPollution:
+    """
+    Light pollution (0-100) per location, from the raster at
+    LIGHT_POLLUTION_RASTER when configured, else LIGHT_POLLUTION_DEFAULT
+    everywhere (also used outside the raster and on no-data cells)
+    """
+
+    def __init__(self) -> None:
+        self.path = os.getenv("LIGHT_POLLUTION_RASTER", "")
+        self.default = float(os.getenv("LIGHT_POLLUTION_DEFAULT", 0.5))
+        self.raster: Optional[LightPollutionRaster] = None
+
+        if self.path:
+            try:
+                self.raster = LightPollutionRaster(self.path)
+                log_event(
+                    logger, logging.INFO, "light pollution raster mapped", path=self.path,
+                    width=self.raster.width, height=self.raster.height, cell_size=self.raster.cell_size
+                )
+            except (OSError, ValueError) as e:
+                log_event(logger, logging.ERROR, "light pollution raster unavailable, using the default", path=self.path, error=str(e))
+
+    def value(self, lat: float, lon: float) -> float:
+        if self.raster is None:
+            return self.default
+        value = self.raster.lookup(lat, lon)
+        return self.default if value is None else value
+
+    def values(self, lats, lons) -> np.ndarray:
+        """Bulk lookup for batch and grid requests"""
+        if self.raster is None:
+            return np.full(np.broadcast(np.asarray(lats), np.asarray(lons)).shape, self.default)
+        return self.raster.lookup_many(lats, lons, self.default)
+
+    def get_stats(self) -> dict:
+        if self.raster is None:
+            return {"source": "default", "default": self.default}
+        return {
+            "source": self.path,
+            "width": self.raster.width,
+            "height": self.raster.height,
+            "cell_size": self.raster.cell_size,
+            "default": self.default
+        }
+
+
+# Global light pollution lookup; the raster is mapped once per process
+light_pollution = LightPollution()
@@ -0,0 +1,84 @@
+"""
+Structured Logging
+Leveled JSON logs, with hot-path events sampled so they cost almost nothing
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+from typing import Any
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event and any fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {})
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records marked sampled (per-request hot-path events)"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False):
+            return self.rate >= 1.0 or random.random() < self.rate
+        return True
+
+
+def configure_logging() -> None:
+    """
+    Set up the "app" logger once from the environment:
+    - LOG_LEVEL: debug, info (default), warning, ...
+    - LOG_FORMAT: json (default) or text
+    - LOG_SAMPLE_RATE: fraction of sampled events kept (default 0.01)
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s %(fields)s", defaults={"fields": {}}))
+    handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", 0.01))))
+
+    logger = logging.getLogger("app")
+    logger.setLevel(os.getenv("LOG_LEVEL", "info").upper())
+    logger.addHandler(handler)
+    logger.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sampled: bool = False, **fields: Any) -> None:
+    """
+    Log an event with structured fields
+
+    sampled=True marks per-request events (cache hits/misses) that are
+    only kept at LOG_SAMPLE_RATE; the level check happens first, so
+    disabled events cost a single comparison.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields, "sampled": sampled})
@@ -0,0 +1,192 @@
+"""
+Metrics and Request Timing
+Prometheus metrics for requests, pipeline stages, cache lookups and
+upstream calls, plus the per-request Server-Timing accumulator
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Latency buckets (seconds) from sub-millisecond cache hits to upstream timeouts
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Total time to handle a request",
+    ["method", "route", "status"],
+    buckets=_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds",
+    "Time spent in one stage of a request (redis_get, redis_set, upstream_<endpoint>, scoring, ...)",
+    ["stage"],
+    buckets=_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups per key namespace, tier (l1, l2) and result (hit, miss)",
+    ["namespace", "tier", "result"]
+)
+CACHE_STALE_SERVED = Counter(
+    "cache_stale_served_total",
+    "Stale cache entries served while a refresh runs in the background",
+    ["namespace"]
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed upstream calls per endpoint and kind (timeout, http, error)",
+    ["endpoint", "kind"]
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Upstream circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)",
+    ["endpoint"],
+    multiprocess_mode="max"
+)
+CIRCUIT_REJECTIONS = Counter(
+    "upstream_circuit_rejections_total",
+    "Upstream calls skipped because the endpoint's circuit was open",
+    ["endpoint"]
+)
+NEGATIVE_CACHE_HITS = Counter(
+    "negative_cache_hits_total",
+    "Cache misses served from the fallback because the key failed upstream recently",
+    ["namespace"]
+)
+PROVIDER_SECONDS = Histogram(
+    "provider_request_duration_seconds",
+    "Successful upstream request time per weather provider and operation",
+    ["provider", "operation"],
+    buckets=_BUCKETS
+)
+PROVIDER_WINS = Counter(
+    "provider_wins_total",
+    "Upstream lookups answered per weather provider and operation; with hedging, "
+    "the provider whose answer was used",
+    ["provider", "operation"]
+)
+HEDGED_REQUESTS = Counter(
+    "provider_hedged_requests_total",
+    "Lookups also sent to the secondary provider, because the primary was slower "
+    "than its p95 (slow) or failed (failed)",
+    ["operation", "reason"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Requests holding an admission slot per class (cache, upstream)",
+    ["class"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an admission slot per class",
+    ["class"],
+    multiprocess_mode="livesum"
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Time admitted requests waited for a slot per class",
+    ["class"],
+    buckets=_BUCKETS
+)
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Requests shed per class (cache, upstream, quota) and reason (queue_full, deadline, "
+    "timeout, exhausted)",
+    ["class", "reason"]
+)
+EXPORT_ROWS = Counter(
+    "visibility_export_rows_total",
+    "Rows streamed by /visibility/export per status (200, or the row's error status)",
+    ["status"]
+)
+
+# Stage durations for the current request, set by the timing middleware
+# when a Server-Timing header was asked for
+_request_timings: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("request_timings", default=None)
+
+
+def namespace(key: str) -> str:
+    """Metric label for a cache key: its prefix, e.g. "hourly" or "astronomy" """
+    return key.split(":", 1)[0]
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a block as a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def upstream_call(endpoint: str) -> Iterator[None]:
+    """Time an upstream call as upstream_<endpoint> and count how it failed, if it did"""
+    start = time.perf_counter()
+    try:
+        yield
+    except httpx.TimeoutException:
+        UPSTREAM_ERRORS.labels(endpoint, "timeout").inc()
+        raise
+    except httpx.HTTPStatusError:
+        UPSTREAM_ERRORS.labels(endpoint, "http").inc()
+        raise
+    except Exception:
+        UPSTREAM_ERRORS.labels(endpoint, "error").inc()
+        raise
+    finally:
+        record_stage(f"upstream_{endpoint}", time.perf_counter() - start)
+
+
+def start_request_timing() -> object:
+    """Start collecting stage timings for this request; returns a token for stop_request_timing"""
+    return _request_timings.set({})
+
+
+def stop_request_timing(token: object) -> Dict[str, List[float]]:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)  # type: ignore[arg-type]
+    return timings
+
+
+def server_timing_header(timings: Dict[str, List[float]], total_seconds: float) -> str:
+    """
+    Format stage timings as a Server-Timing header value
+    Stages that ran several times (or concurrently) report their summed time
+    """
+    parts: List[Tuple[str, str]] = [
+        (stage, f"{stage};dur={seconds * 1000:.2f}" + (f";desc=\"x{count}\"" if count > 1 else ""))
+        for stage, (seconds, count) in timings.items()
+    ]
+    parts.sort()
+    return ", ".join([text for _, text in parts] + [f"total;dur={total_seconds * 1000:.2f}"])
+
+
+def render_metrics() -> bytes:
+    """
+    Metrics in the Prometheus text format. With PROMETHEUS_MULTIPROC_DIR
+    set (gunicorn), values are aggregated across all worker processes.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
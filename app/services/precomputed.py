@@ -0,0 +1,255 @@
+"""
+Precomputed Results Store
+Memory-mapped /visibility results for registered sites, written offline
+by app.precompute and answered with an index lookup
+
+File format (little-endian): a 64-byte header, then these sections in
+order, each padded to a multiple of 8 bytes:
+
+    cells               S<cell_width>[sites]  sorted location cell ids
+    lat, lon            f8[sites]             cell centers the rows were computed at
+    score               f4[rows]              visibility score, NaN if not computed
+    cloud_cover         f4[rows]              %
+    moon_illumination   f4[rows]              0-1
+    light_pollution     f4[rows]              0-100
+    degraded            u1[rows]              1 if any input came from a fallback
+    body_offsets        u8[rows + 1]          serialized response bodies ...
+    bodies              bytes                 ... and their concatenation
+
+with rows = sites * nights, site-major: the row for (site i, night j)
+is i * nights + j, and night j is first_day + j.
+
+    magic         8s   b"VISPRE01"
+    sites         I
+    nights        I
+    first_day     I    proleptic Gregorian ordinal of night 0
+    cell_width    I    bytes per cell id
+    generated_at  d    epoch seconds
+    valid_until   d    epoch seconds; rows are not served after this
+    bodies_size   Q
+    (padding)     to 64 bytes
+
+Bodies are ResponseCache.serialize output for the "night" resolution,
+so a hit is spliced and ETagged exactly like a response cache hit.
+Files are written to a temporary path and renamed into place; readers
+notice the new inode and re-map it, so swapping results is atomic.
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.log import get_logger, log_event
+from app.services.metrics import CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+MAGIC = b"VISPRE01"
+HEADER = struct.Struct("<8sIIIIddQ")
+HEADER_SIZE = 64
+
+# Per-row columns after the site columns, in file order
+ROW_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("score", "<f4"),
+    ("cloud_cover", "<f4"),
+    ("moon_illumination", "<f4"),
+    ("light_pollution", "<f4"),
+    ("degraded", "u1")
+)
+
+
+def _padded(size: int) -> int:
+    return -(-size // 8) * 8
+
+
+def write_results(path: str, cells: Sequence[str], lats: Sequence[float], lons: Sequence[float],
+                  first_day: date, nights: int, columns: Dict[str, Sequence[float]],
+                  bodies: Sequence[bytes], valid_until: float) -> None:
+    """
+    Write a results file; cells must be sorted and unique, and columns and
+    bodies hold sites * nights rows in site-major order. Written to a
+    temporary file and renamed into place so readers never map a
+    half-written file.
+    """
+    sites = len(cells)
+    rows = sites * nights
+    if list(cells) != sorted(set(cells)):
+        raise ValueError("cells must be sorted and unique")
+    if len(bodies) != rows or any(len(columns[name]) != rows for name, _ in ROW_COLUMNS):
+        raise ValueError(f"expected {rows} rows ({sites} sites x {nights} nights)")
+
+    encoded = [cell.encode() for cell in cells]
+    cell_width = max((len(cell) for cell in encoded), default=1)
+    offsets = np.zeros(rows + 1, dtype="<u8")
+    np.cumsum([len(body) for body in bodies], out=offsets[1:])
+
+    sections = [
+        np.array(encoded, dtype=f"S{cell_width}"),
+        np.asarray(lats, dtype="<f8"),
+        np.asarray(lons, dtype="<f8"),
+        *(np.asarray(columns[name], dtype=dtype) for name, dtype in ROW_COLUMNS),
+        offsets
+    ]
+    header = HEADER.pack(
+        MAGIC, sites, nights, first_day.toordinal(), cell_width, time.time(), valid_until, int(offsets[-1])
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\x00"))
+        for section in sections:
+            data = section.tobytes()
+            f.write(data.ljust(_padded(len(data)), b"\x00"))
+        for body in bodies:
+            f.write(body)
+    os.replace(tmp_path, path)
+
+
+class ResultsFile:
+    """A mapped results file; see the module docstring for the format"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, sites, nights, first_day, cell_width, generated_at, valid_until, bodies_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a precomputed results file")
+
+        self.sites = sites
+        self.nights = nights
+        self.first_day = first_day
+        self.generated_at = generated_at
+        self.valid_until = valid_until
+        rows = sites * nights
+
+        # Zero-copy views over the mapping, one per section
+        offset = HEADER_SIZE
+        views = []
+        for dtype, count in [(f"S{cell_width}", sites), ("<f8", sites), ("<f8", sites)] + \
+                [(dtype, rows) for _, dtype in ROW_COLUMNS] + [("<u8", rows + 1)]:
+            dtype = np.dtype(dtype)
+            if offset + dtype.itemsize * count > len(self._mmap):
+                raise ValueError(f"{path} is truncated")
+            views.append(np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset))
+            offset += _padded(dtype.itemsize * count)
+
+        self.cells, self.lats, self.lons = views[:3]
+        self.columns = {name: view for (name, _), view in zip(ROW_COLUMNS, views[3:-1])}
+        self.body_offsets = views[-1]
+        self.bodies_start = offset
+        if self.bodies_start + bodies_size > len(self._mmap):
+            raise ValueError(f"{path} is truncated")
+
+    def row(self, cell_id: str, iso_date: str) -> Optional[int]:
+        """Row for a cell and night, None if the site isn't registered or the night not covered"""
+        try:
+            night = date.fromisoformat(iso_date).toordinal() - self.first_day
+        except ValueError:
+            return None
+        if not 0 <= night < self.nights:
+            return None
+
+        needle = cell_id.encode()
+        if len(needle) > self.cells.dtype.itemsize:
+            return None
+        site = int(np.searchsorted(self.cells, needle))
+        if site >= self.sites or self.cells[site] != needle:
+            return None
+        return site * self.nights + night
+
+    def body(self, row: int) -> bytes:
+        start, end = self.body_offsets[row], self.body_offsets[row + 1]
+        return self._mmap[self.bodies_start + int(start):self.bodies_start + int(end)]
+
+
+class PrecomputedResults:
+    """
+    The results file at PRECOMPUTED_RESULTS, if configured
+
+    The path is re-checked at most every PRECOMPUTED_CHECK_SECONDS; when
+    the file has been replaced the new one is mapped and the old mapping
+    is dropped once nothing references it. Degraded rows, and every row
+    once the file is past its valid_until, are treated as misses so the
+    live path computes them instead.
+    """
+
+    def __init__(self) -> None:
+        self.path = os.getenv("PRECOMPUTED_RESULTS", "")
+        self.check_seconds = float(os.getenv("PRECOMPUTED_CHECK_SECONDS", 5))
+
+        self.current: Optional[ResultsFile] = None
+        self._checked_at = float("-inf")
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0, "reload_errors": 0}
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = now
+
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            return
+        if self.current is not None and self.current.inode == inode:
+            return
+
+        try:
+            self.current = ResultsFile(self.path)
+            self.stats["reloads"] += 1
+            log_event(
+                logger, logging.INFO, "precomputed results mapped", path=self.path,
+                sites=self.current.sites, nights=self.current.nights
+            )
+        except (OSError, ValueError) as e:
+            self.stats["reload_errors"] += 1
+            log_event(logger, logging.ERROR, "precomputed results unreadable, keeping the previous file", path=self.path, error=str(e))
+
+    def lookup(self, cell_id: str, iso_date: str) -> Optional[Tuple[bytes, float]]:
+        """(body, valid_until) for a registered site's night, else None"""
+        if not self.path:
+            return None
+        self._refresh()
+
+        results = self.current
+        row = None
+        if results is not None and time.time() < results.valid_until:
+            row = results.row(cell_id, iso_date)
+            if row is not None and (results.columns["degraded"][row] or math.isnan(results.columns["score"][row])):
+                row = None
+
+        if row is None:
+            self.stats["misses"] += 1
+            CACHE_LOOKUPS.labels("response", "precomputed", "miss").inc()
+            return None
+        self.stats["hits"] += 1
+        CACHE_LOOKUPS.labels("response", "precomputed", "hit").inc()
+        return results.body(row), results.valid_until
+
+    def get_stats(self) -> dict:
+        results = self.current
+        if results is None:
+            return {"source": self.path or None, **self.stats}
+        return {
+            "source": self.path,
+            "sites": results.sites,
+            "nights": results.nights,
+            "first_date": date.fromordinal(results.first_day).isoformat(),
+            "generated_at": results.generated_at,
+            "valid_until": results.valid_until,
+            **self.stats
+        }
+
+
+# Global results store; mapped lazily on the first lookup
+precomputed_results = PrecomputedResults()
@@ -0,0 +1,46 @@
+"""
+Raster Encoding
+Compact encodings for score grids returned by /visibility/grid
+"""
+
+import base64
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+
+
+def encode_base64(grid: np.ndarray) -> str:
+    """Base64 of the raw row-major uint8 bytes"""
+    return base64.b64encode(np.ascontiguousarray(grid, dtype=np.uint8).tobytes()).decode("ascii")
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data)) + kind + data
+        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png(grid: np.ndarray, transparent: Optional[int] = None) -> bytes:
+    """
+    Encode a 2-D uint8 array as an 8-bit grayscale PNG tile
+    (row 0 is the top of the image); pixels equal to transparent, if
+    given, are transparent (e.g. a nodata value)
+    """
+    grid = np.ascontiguousarray(grid, dtype=np.uint8)
+    height, width = grid.shape
+
+    # Each scanline is prefixed with filter type 0 (none)
+    scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+    scanlines[:, 1:] = grid
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", header)
+        + (_png_chunk(b"tRNS", struct.pack(">H", transparent)) if transparent is not None else b"")
+        + _png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
@@ -0,0 +1,358 @@
+"""
+Async Redis Cache
+redis.asyncio counterpart of RedisCache for code running on the event loop
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from app.services.log import get_logger, log_event
+from app.services.metrics import timed
+from app.services.redis_memory import memory_async_client
+from app.services.redis_cache import RedisCache, CacheEntry, SOFT_EXPIRY_FIELD, _RELEASE_LOCK_SCRIPT, cache
+
+logger = get_logger(__name__)
+
+# Errors that mean Redis itself is unreachable, rather than a bad command
+_CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError, asyncio.TimeoutError, OSError)
+
+# Token bucket refilled at ARGV[1] tokens/s up to ARGV[2], taking ARGV[3]
+# tokens if it has them; time comes from the Redis server so every replica
+# agrees. Returns {1 if taken, tokens left as a string}
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("time")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("hmget", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local taken = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    taken = 1
+end
+redis.call("hset", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("pexpire", KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {taken, tostring(tokens)}
+"""
+
+
+class AsyncRedisCache:
+    """
+    Non-blocking access to the same cache as RedisCache
+
+    Shares the sync cache's L1, key helpers, encoding and hit counters, so
+    both see the same entries; only the Redis round trips differ. Runs on
+    its own sized connection pool with per-command timeouts.
+
+    A connection error disables the cache and starts a background task
+    that pings Redis with backoff and re-enables it once Redis answers, so
+    a blip during a deploy doesn't turn caching off until the next restart.
+    """
+
+    def __init__(self, sync_cache: RedisCache) -> None:
+        self.sync = sync_cache
+
+        self.host = os.getenv("REDIS_HOST", "redis")
+        self.port = int(os.getenv("REDIS_PORT", 6379))
+        self.db = int(os.getenv("REDIS_DB", 0))
+        self.pool_size = int(os.getenv("REDIS_ASYNC_POOL_SIZE", 50))
+        self.pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT", 1.0))
+        self.op_timeout = float(os.getenv("REDIS_OP_TIMEOUT", 0.5))
+        self.connect_timeout = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1.0))
+        # Connections opened at startup, so the first requests don't pay for connecting
+        self.warm_connections = min(int(os.getenv("REDIS_WARM_CONNECTIONS", 4)), self.pool_size)
+
+        # Optimistic until the first ping or command says otherwise
+        self.enabled = True
+        self._client: Optional[aioredis.Redis] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "disconnects": 0,
+            "reconnects": 0
+        }
+
+    @property
+    def client(self) -> aioredis.Redis:
+        """
+        Pooled client, created on first use so it binds to the running loop
+        (and recreated if called from a different loop, e.g. in tests)
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            if self.sync.backend == "memory":
+                self._client = memory_async_client()
+                return self._client
+            self._client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool(
+                    host=self.host,
+                    port=self.port,
+                    db=self.db,
+                    max_connections=self.pool_size,
+                    timeout=self.pool_timeout,
+                    socket_timeout=self.op_timeout,
+                    socket_connect_timeout=self.connect_timeout,
+                    decode_responses=False
+                )
+            )
+        return self._client
+
+    async def connect(self) -> bool:
+        """Ping Redis; if it's down, disable the cache and keep retrying in the background"""
+        try:
+            await self.client.ping()
+            self.enabled = True
+            return True
+        except Exception as e:
+            self._handle_error("connect", e)
+            return False
+
+    async def warm(self) -> bool:
+        """Connect, then ping over warm_connections pooled connections at once"""
+        if not await self.connect():
+            return False
+        try:
+            await asyncio.gather(*(self.client.ping() for _ in range(self.warm_connections - 1)))
+        except Exception as e:
+            self._handle_error("warm", e)
+            return False
+        return True
+
+    async def aclose(self) -> None:
+        """Stop reconnecting and close the connection pool"""
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _handle_error(self, operation: str, e: Exception) -> None:
+        log_event(logger, logging.WARNING, "async cache operation failed", operation=operation, error=str(e))
+        if not isinstance(e, _CONNECTION_ERRORS):
+            return
+
+        if self.enabled:
+            self.enabled = False
+            self.stats["disconnects"] += 1
+            log_event(logger, logging.ERROR, "redis unreachable, async caching disabled until it reconnects")
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.ensure_future(self._reconnect_loop())
+
+    async def _reconnect_loop(self) -> None:
+        delay = self.sync.retry_interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.client.ping()
+            except Exception:
+                delay = min(delay * 2, self.sync.retry_max_interval)
+                continue
+
+            self.enabled = True
+            self.stats["reconnects"] += 1
+            log_event(logger, logging.INFO, "redis reconnected (async)")
+            return
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get value from cache, stale or not; see RedisCache.get"""
+        entry = await self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    async def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Get (value, stale) from cache; see RedisCache.get_entry"""
+        return (await self.get_many_entries([key]))[0]
+
+    async def get_soft_expiry(self, key: str, skip_l1: bool = False) -> Optional[float]:
+        """
+        See RedisCache.get_soft_expiry; with skip_l1, read Redis even if
+        L1 has the key (refreshing L1 from it), to see another worker's write
+        """
+        stored = (await self._get_many_stored([key], skip_l1))[0]
+        if stored is None:
+            return None
+        if isinstance(stored, dict) and SOFT_EXPIRY_FIELD in stored:
+            return stored[SOFT_EXPIRY_FIELD]
+        return float("inf")
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values at once, stale or not; None for misses"""
+        return [entry[0] if entry is not None else None for entry in await self.get_many_entries(keys)]
+
+    async def get_many_entries(self, keys: List[str]) -> List[Optional[CacheEntry]]:
+        """
+        Get several (value, stale) entries at once
+        L1 misses are fetched from Redis in a single pipelined round trip
+        """
+        stored = await self._get_many_stored(keys)
+        return [self.sync._unwrap(value) if value is not None else None for value in stored]
+
+    async def _get_many_stored(self, keys: List[str], skip_l1: bool = False) -> List[Optional[Any]]:
+        if skip_l1:
+            stored, missing = [None] * len(keys), list(range(len(keys)))
+        else:
+            stored, missing = self.sync._l1_lookup(keys)
+
+        if missing and self.enabled:
+            try:
+                with timed("redis_get"):
+                    pipe = self.client.pipeline(transaction=False)
+                    reads = self.sync._queue_reads(pipe, keys, missing)
+                    replies = await pipe.execute()
+                self.sync._absorb_replies(keys, reads, replies, stored)
+            except Exception as e:
+                self._handle_error("get_many", e)
+
+        return stored
+
+    async def get_location_entry(self, key: str, legacy_key: Optional[str] = None) -> Optional[CacheEntry]:
+        """
+        Get a location-keyed (value, stale) entry, counting hits per key scheme
+        See RedisCache.get_location_entry
+        """
+        sync = self.sync
+        scheme = "legacy" if sync.key_mode == "legacy" else "quantized"
+        entry = await self.get_entry(key)
+        if entry is not None:
+            sync.key_stats[scheme]["hits"] += 1
+            return entry
+        sync.key_stats[scheme]["misses"] += 1
+
+        if legacy_key is None or legacy_key == key:
+            return None
+
+        entry = await self.get_entry(legacy_key)
+        if entry is None:
+            sync.key_stats["legacy"]["misses"] += 1
+            return None
+
+        sync.key_stats["legacy"]["hits"] += 1
+        try:
+            ttl = await self.client.ttl(legacy_key)
+            if isinstance(ttl, int) and ttl > 0:
+                await self.set(key, entry[0], ttl)
+        except Exception as e:
+            self._handle_error("migrate", e)
+        return entry
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    async def set(self, key: str, value: Any, ttl_seconds: int = 3600, soft_ttl_seconds: Optional[int] = None) -> bool:
+        """Set value in cache with TTL; see RedisCache.set"""
+        return await self.set_many([(key, value, ttl_seconds)], soft_ttl_seconds)
+
+    async def set_many(self, items: Iterable[Tuple[str, Any, int]], soft_ttl_seconds: Optional[int] = None) -> bool:
+        """
+        Set several (key, value, ttl_seconds) entries in one pipelined round trip
+        soft_ttl_seconds, if given, applies to every entry
+        """
+        items = list(items)
+        if not items or not self.enabled:
+            return False
+
+        sync = self.sync
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            serialized = [sync._encode(value, soft_ttl_seconds) for _, value, _ in items]
+            sync._queue_writes(pipe, [(key, raw, ttl_seconds) for (key, _, ttl_seconds), (_, raw) in zip(items, serialized)])
+            with timed("redis_set"):
+                await pipe.execute()
+
+            for (key, _, ttl_seconds), (stored, raw) in zip(items, serialized):
+                sync.l1.set(key, stored, sync._l1_ttl(key, ttl_seconds), len(raw))
+            return True
+        except Exception as e:
+            self._handle_error("set_many", e)
+            return False
+
+    # ------------------------------------------------------------------
+    # Locks (same keys and tokens as RedisCache)
+    # ------------------------------------------------------------------
+
+    async def acquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """See RedisCache.acquire_lock"""
+        if not self.enabled:
+            return None
+
+        token = uuid.uuid4().hex
+        try:
+            if await self.client.set(f"lock:{name}", token, nx=True, px=ttl_ms):
+                return token
+            return None
+        except Exception as e:
+            self._handle_error("lock", e)
+            return None
+
+    async def release_lock(self, name: str, token: str) -> bool:
+        """See RedisCache.release_lock"""
+        if not self.enabled:
+            return False
+
+        try:
+            released = await self.client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+            return bool(released)
+        except Exception as e:
+            self._handle_error("unlock", e)
+            return False
+
+    async def lock_held(self, name: str) -> bool:
+        """See RedisCache.lock_held"""
+        if not self.enabled:
+            return False
+
+        try:
+            return bool(await self.client.exists(f"lock:{name}"))
+        except Exception as e:
+            self._handle_error("lock check", e)
+            return False
+
+    # ------------------------------------------------------------------
+    # Rate limiting
+    # ------------------------------------------------------------------
+
+    async def take_token(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Optional[Tuple[bool, float]]:
+        """
+        Take cost tokens from the bucket at key (refilled at rate per
+        second, holding up to burst), shared by every worker and replica
+
+        Returns (taken, tokens left), or None when Redis is unavailable
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            taken, tokens = await self.client.eval(_TOKEN_BUCKET_SCRIPT, 1, key, rate, burst, cost)
+            return bool(taken), float(tokens)
+        except Exception as e:
+            self._handle_error("token bucket", e)
+            return None
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pool_size": self.pool_size,
+            "op_timeout_seconds": self.op_timeout,
+            **self.stats
+        }
+
+
+# Global async cache instance, sharing L1 with the sync cache
+async_cache = AsyncRedisCache(cache)
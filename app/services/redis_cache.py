@@ -5,41 +5,244 @@ Handles caching for weather and astronomy API responses
 
 import redis
 import json
+import logging
+import math
 import os
-from typing import Optional, Any
-from datetime import timedelta
+import re
+import struct
+import threading
+import time
+import uuid
+from typing import Optional, Any, Callable, Dict, Iterable, List, Tuple
+from datetime import datetime, timedelta, timezone
+from app.services.geo import Quantizer
+from app.services.local_cache import LocalCache
+from app.services.log import get_logger, log_event
+from app.services.metrics import CACHE_LOOKUPS, namespace, timed
+from app.services.redis_memory import memory_client
+
+logger = get_logger(__name__)
+
+
+# Delete the lock only if it still holds our token, so a holder whose
+# lock already expired can't release someone else's
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Pub/sub channel used to tell every worker to drop L1 entries
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Values stored with a soft expiry are wrapped as {SOFT_EXPIRY_FIELD: epoch, "value": ...}
+SOFT_EXPIRY_FIELD = "__soft_expiry__"
+
+# (value, stale) as returned by the *_entry getters
+CacheEntry = Tuple[Any, bool]
+
+# Binary values are stored as BINARY_MARKER + soft expiry (float64, NaN if
+# none) + payload. JSON text never starts with a NUL byte, so binary and
+# JSON values can share the keyspace.
+BINARY_MARKER = b"\x00"
+_BINARY_HEADER = struct.Struct("<d")
+
+# Location keys, "<prefix>:cell=<id>:date=<YYYY-MM-DD>"; in the hash layout
+# each cell's keys are fields of one hash, "<prefix>:cell=<id>", named by date
+_LOCATION_KEY = re.compile(r"^([^:]+:cell=[^:]+):date=(\d{4}-\d{2}-\d{2})$")
+
+# Hash fields hold their hard expiry (epoch seconds, float64) ahead of the
+# encoded value, so one HMGET returns every field's value and remaining TTL
+_FIELD_HEADER = struct.Struct("<d")
+
+# Rolling-window write of ARGV[3..] (field, value pairs): set the fields,
+# drop other fields (dates) before ARGV[1], the start of the window, and
+# extend the hash's TTL to at least ARGV[2] seconds
+_HASH_SET_SCRIPT = """
+local written = {}
+for i = 3, #ARGV, 2 do
+    redis.call("hset", KEYS[1], ARGV[i], ARGV[i + 1])
+    written[ARGV[i]] = true
+end
+for _, field in ipairs(redis.call("hkeys", KEYS[1])) do
+    if field < ARGV[1] and not written[field] then
+        redis.call("hdel", KEYS[1], field)
+    end
+end
+if redis.call("ttl", KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call("expire", KEYS[1], ARGV[2])
+end
+return 1
+"""
 
 
 class RedisCache:
     """
     Redis cache wrapper for weather/astronomy data
+    
+    Reads go through a bounded in-process L1 cache first and only fall
+    back to Redis (L2) on an L1 miss. Deletes and clears are broadcast
+    over pub/sub so every worker drops its L1 copies.
+    
+    Values are JSON encoded, except bytes which are stored as-is, so
+    packed records don't pay for a text encoding.
+    
+    Location keys are stored either as one Redis string per (cell, date)
+    (CACHE_LAYOUT=keys, the default) or as one hash per cell with a field
+    per date (CACHE_LAYOUT=hash), so every date of a cell is one HMGET and
+    the per-key overhead is paid once per cell. Callers use the same keys
+    either way. Hash fields expire one by one with HEXPIRE
+    (CACHE_HASH_EXPIRY=field, Redis 7.4+), or the hash expires with its
+    newest field and writes drop dates older than CACHE_HASH_WINDOW_DAYS
+    (window, the default). Switching layouts starts those prefixes cold.
+    
+    If Redis is unreachable (at startup or later) the cache disables
+    itself and a background thread keeps pinging until it comes back.
+    
+    Construction does no network I/O, so importing the module is instant
+    and safe before forking workers; each worker calls connect() at
+    startup to ping Redis and subscribe to invalidations.
     """
     
     def __init__(self) -> None:
         """Initialize Redis connection"""
-        self.redis_client: Optional[redis.Redis] = None
+        self._pubsub_thread = None
+        
+        # L1 (in-process) cache; TTLs per key prefix, always capped by the Redis TTL
+        self.l1 = LocalCache(
+            max_entries=int(os.getenv("L1_CACHE_MAX_ENTRIES", 10000)),
+            max_bytes=int(os.getenv("L1_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+        )
+        self.l1_ttls: Dict[str, int] = {
+            "hourly": int(os.getenv("L1_TTL_HOURLY", os.getenv("L1_TTL_CLOUD_COVER", 300))),  # 5 minutes
+            "astronomy": int(os.getenv("L1_TTL_ASTRONOMY", 3600)),      # 1 hour
+            "response": int(os.getenv("L1_TTL_RESPONSE", 300))          # 5 minutes
+        }
+        self.l1_default_ttl = int(os.getenv("L1_TTL_DEFAULT", 60))
+        
+        # L2 (Redis) lookups made by this process
+        self.l2_hits = 0
+        self.l2_misses = 0
+        
+        # Location keys: "quantized" (cell IDs), "legacy" (raw floats) or
+        # "migrate" (quantized, falling back to and copying legacy entries;
+        # astronomy only, see MIGRATABLE_PREFIXES in weather_astronomy_service)
+        self.key_mode = os.getenv("CACHE_KEY_MODE", "quantized").lower()
+        self.quantizers: Dict[str, Quantizer] = {
+            "hourly": Quantizer(os.getenv("CACHE_GEO_HOURLY", os.getenv("CACHE_GEO_CLOUD_COVER", "grid:0.05"))),
+            "astronomy": Quantizer(os.getenv("CACHE_GEO_ASTRONOMY", "grid:0.5"))
+        }
+        self.default_quantizer = Quantizer(os.getenv("CACHE_GEO_DEFAULT", "grid:0.05"))
+        
+        # Storage layout of location keys: "keys" or "hash" (see the class docstring)
+        self.layout = os.getenv("CACHE_LAYOUT", "keys").lower()
+        self.hash_prefixes = {p.strip() for p in os.getenv("CACHE_HASH_PREFIXES", "hourly,astronomy").split(",") if p.strip()}
+        self.hash_expiry = os.getenv("CACHE_HASH_EXPIRY", "window").lower()
+        self.hash_window_days = int(os.getenv("CACHE_HASH_WINDOW_DAYS", 7))
+        
+        # Keys per SCAN/UNLINK round trip when clearing, and keys sampled
+        # for the per-prefix stats
+        self.clear_batch_size = int(os.getenv("CACHE_CLEAR_BATCH_SIZE", 500))
+        self.stats_sample_size = int(os.getenv("CACHE_STATS_SAMPLE_SIZE", 1000))
+        self.key_stats: Dict[str, Dict[str, int]] = {
+            "quantized": {"hits": 0, "misses": 0},
+            "legacy": {"hits": 0, "misses": 0}
+        }
+        
         redis_host = os.getenv("REDIS_HOST", "redis")
         redis_port = int(os.getenv("REDIS_PORT", 6379))
         redis_db = int(os.getenv("REDIS_DB", 0))
         
-        try:
+        # Reconnect attempts back off from retry_interval up to retry_max_interval
+        self.retry_interval = float(os.getenv("REDIS_RETRY_INTERVAL", 1.0))
+        self.retry_max_interval = float(os.getenv("REDIS_RETRY_MAX_INTERVAL", 30.0))
+        self._reconnect_thread: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+        # Optimistic until connect() or a failing command says otherwise
+        self.enabled = True
+        
+        # "redis" (a real server) or "memory" (in-process stand-in, for
+        # benchmarks and local runs)
+        self.backend = os.getenv("REDIS_BACKEND", "redis").lower()
+        self.host, self.port = redis_host, redis_port
+        if self.backend == "memory":
+            self.redis_client = memory_client()
+            self.host, self.port = "memory", 0
+        else:
+            # Sized pool shared by request threads; callers wait up to
+            # REDIS_POOL_TIMEOUT for a free connection, and every command
+            # gives up after REDIS_OP_TIMEOUT
             self.redis_client = redis.Redis(
-                host=redis_host,
-                port=redis_port,
-                db=redis_db,
-                decode_responses=True,
-                socket_connect_timeout=5
+                connection_pool=redis.BlockingConnectionPool(
+                    host=redis_host,
+                    port=redis_port,
+                    db=redis_db,
+                    max_connections=int(os.getenv("REDIS_POOL_SIZE", 20)),
+                    timeout=float(os.getenv("REDIS_POOL_TIMEOUT", 1.0)),
+                    socket_timeout=float(os.getenv("REDIS_OP_TIMEOUT", 0.5)),
+                    socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", 1.0)),
+                    decode_responses=False
+                )
+            )
+    
+    def connect(self) -> bool:
+        """
+        Ping Redis and start listening for invalidations; if it's down,
+        disable the cache and keep retrying in the background
+        Blocks for up to the connect timeout, so call it off the event loop
+        """
+        try:
+            self.redis_client.ping()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            log_event(logger, logging.WARNING, "redis connection failed, retrying in the background", error=str(e))
+            with self._state_lock:
+                self.enabled = False
+            self._start_reconnect()
+            return False
+        
+        self.enabled = True
+        log_event(logger, logging.INFO, "redis connected", host=self.host, port=self.port)
+        if self._pubsub_thread is None:
+            self._subscribe_invalidations()
+        return True
+    
+    def _handle_error(self, operation: str, e: Exception) -> None:
+        """Log a failed operation; connection errors disable the cache until Redis is back"""
+        log_event(logger, logging.WARNING, "cache operation failed", operation=operation, error=str(e))
+        if isinstance(e, (redis.ConnectionError, redis.TimeoutError)):
+            with self._state_lock:
+                was_enabled, self.enabled = self.enabled, False
+            if was_enabled:
+                log_event(logger, logging.ERROR, "redis unreachable, caching disabled until it reconnects")
+            self._start_reconnect()
+    
+    def _start_reconnect(self) -> None:
+        with self._state_lock:
+            if self._reconnect_thread is not None and self._reconnect_thread.is_alive():
+                return
+            self._reconnect_thread = threading.Thread(
+                target=self._reconnect_loop, name="redis-reconnect", daemon=True
             )
-            # Test connection
-            if self.redis_client is not None:
+            self._reconnect_thread.start()
+    
+    def _reconnect_loop(self) -> None:
+        delay = self.retry_interval
+        while True:
+            time.sleep(delay)
+            try:
                 self.redis_client.ping()
+            except Exception:
+                delay = min(delay * 2, self.retry_max_interval)
+                continue
+            
+            # Entries may have changed while we weren't listening for invalidations
+            self.l1.clear_pattern("*")
+            if self._pubsub_thread is None:
+                self._subscribe_invalidations()
             self.enabled = True
-            print("✅ Redis cache connected successfully")
-        except (redis.ConnectionError, redis.TimeoutError) as e:
-            print(f"⚠️  Redis connection failed: {e}")
-            print("⚠️  Continuing without cache...")
-            self.enabled = False
-            self.redis_client = None
+            log_event(logger, logging.INFO, "redis reconnected")
+            return
     
     def _generate_key(self, prefix: str, **kwargs) -> str:
         """
@@ -49,86 +252,574 @@ class RedisCache:
         params = ":".join([f"{k}={v}" for k, v in sorted(kwargs.items())])
         return f"{prefix}:{params}"
     
+    def location_cell(self, prefix: str, lat: float, lon: float) -> Tuple[str, float, float]:
+        """
+        Quantize a coordinate with the prefix's quantizer
+        Returns (cell_id, center_lat, center_lon)
+        """
+        return self.quantizers.get(prefix, self.default_quantizer).cell(lat, lon)
+    
+    def location_key(self, prefix: str, lat: float, lon: float, date: str) -> str:
+        """
+        Generate a cache key from the location's cell and an already-normalized date
+        Example: hourly:cell=g0.05_-26_736:date=2025-12-14
+        """
+        cell_id, _, _ = self.location_cell(prefix, lat, lon)
+        return self._generate_key(prefix, cell=cell_id, date=date)
+    
+    def hash_location(self, key: str) -> Optional[Tuple[str, str]]:
+        """
+        (hash key, field) storing a key in the hash layout, None if it's
+        stored as a key of its own
+        Example: hourly:cell=g0.05_-26_736:date=2025-12-14 -> (hourly:cell=g0.05_-26_736, 2025-12-14)
+        """
+        if self.layout != "hash":
+            return None
+        match = _LOCATION_KEY.match(key)
+        if match is None or key.split(":", 1)[0] not in self.hash_prefixes:
+            return None
+        return match.group(1), match.group(2)
+    
+    def get_location_entry(self, key: str, legacy_key: Optional[str] = None) -> Optional[CacheEntry]:
+        """
+        Get a location-keyed (value, stale) entry, counting hits per key scheme
+        
+        With a legacy_key (migrate mode), a miss on the quantized key falls
+        back to the pre-quantization key and copies the hit across with its
+        remaining TTL, so old entries keep serving while the cache turns over.
+        """
+        scheme = "legacy" if self.key_mode == "legacy" else "quantized"
+        entry = self.get_entry(key)
+        if entry is not None:
+            self.key_stats[scheme]["hits"] += 1
+            return entry
+        self.key_stats[scheme]["misses"] += 1
+        
+        if legacy_key is None or legacy_key == key:
+            return None
+        
+        entry = self.get_entry(legacy_key)
+        if entry is None:
+            self.key_stats["legacy"]["misses"] += 1
+            return None
+        
+        self.key_stats["legacy"]["hits"] += 1
+        try:
+            ttl = self.redis_client.ttl(legacy_key)
+            if isinstance(ttl, int) and ttl > 0:
+                self.set(key, entry[0], ttl)
+        except Exception as e:
+            self._handle_error("migrate", e)
+        return entry
+    
+    @staticmethod
+    def _wrap(value: Any, soft_ttl_seconds: Optional[int]) -> Any:
+        if soft_ttl_seconds is None:
+            return value
+        return {SOFT_EXPIRY_FIELD: time.time() + soft_ttl_seconds, "value": value}
+    
+    def _encode(self, value: Any, soft_ttl_seconds: Optional[int]) -> Tuple[Any, bytes]:
+        """Returns (stored, raw): the wrapped value kept in L1 and the bytes written to Redis"""
+        stored = self._wrap(value, soft_ttl_seconds)
+        if isinstance(value, (bytes, bytearray)):
+            soft_expiry = stored[SOFT_EXPIRY_FIELD] if soft_ttl_seconds is not None else math.nan
+            return stored, BINARY_MARKER + _BINARY_HEADER.pack(soft_expiry) + bytes(value)
+        return stored, json.dumps(stored).encode()
+    
+    @staticmethod
+    def _decode(raw: bytes) -> Any:
+        """Inverse of _encode: the stored (possibly soft-expiry wrapped) value"""
+        if raw[:1] == BINARY_MARKER:
+            (soft_expiry,) = _BINARY_HEADER.unpack_from(raw, 1)
+            payload = raw[1 + _BINARY_HEADER.size:]
+            if math.isnan(soft_expiry):
+                return payload
+            return {SOFT_EXPIRY_FIELD: soft_expiry, "value": payload}
+        return json.loads(raw)
+    
+    @staticmethod
+    def _unwrap(stored: Any) -> CacheEntry:
+        """Split a stored value into (value, stale); values without a soft expiry are never stale"""
+        if isinstance(stored, dict) and SOFT_EXPIRY_FIELD in stored:
+            return stored["value"], stored[SOFT_EXPIRY_FIELD] <= time.time()
+        return stored, False
+    
+    def _l1_ttl(self, key: str, redis_ttl: float) -> float:
+        """L1 TTL for a key: the per-prefix TTL, never longer than what Redis has left"""
+        prefix = key.split(":", 1)[0]
+        return min(self.l1_ttls.get(prefix, self.l1_default_ttl), redis_ttl)
+    
+    def _subscribe_invalidations(self) -> None:
+        """Listen for invalidations from other workers in a background thread"""
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._handle_invalidation})
+            self._pubsub_thread = pubsub.run_in_thread(
+                sleep_time=1.0,
+                daemon=True,
+                exception_handler=self._handle_pubsub_error
+            )
+        except Exception as e:
+            self._handle_error("invalidation subscribe", e)
+    
+    def _handle_invalidation(self, message: dict) -> None:
+        try:
+            payload = json.loads(message["data"])
+            if payload.get("pattern") is not None:
+                self.l1.clear_pattern(payload["pattern"])
+            elif payload.get("key") is not None:
+                self.l1.delete(payload["key"])
+        except Exception as e:
+            log_event(logger, logging.WARNING, "cache invalidation failed", error=str(e))
+    
+    @staticmethod
+    def _handle_pubsub_error(e: Exception, pubsub: Any, thread: Any) -> None:
+        # Keep the listener alive; redis-py reconnects on the next get_message
+        log_event(logger, logging.WARNING, "cache invalidation listener error", error=str(e))
+    
+    def _publish_invalidation(self, key: Optional[str] = None, pattern: Optional[str] = None) -> None:
+        try:
+            self.redis_client.publish(
+                INVALIDATION_CHANNEL,
+                json.dumps({"key": key, "pattern": pattern})
+            )
+        except Exception as e:
+            self._handle_error("invalidation publish", e)
+    
     def get(self, key: str) -> Optional[Any]:
         """
-        Get value from cache
+        Get value from cache, stale or not
+        Checks the in-process L1 first, then Redis
         Returns None if key doesn't exist or cache is disabled
         """
-        if not self.enabled or self.redis_client is None:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+    
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """
+        Get (value, stale) from cache, where stale means the value is past its
+        soft expiry but not yet past the hard Redis TTL
+        Returns None if key doesn't exist or cache is disabled
+        """
+        stored = self._get_stored(key)
+        return self._unwrap(stored) if stored is not None else None
+    
+    def get_soft_expiry(self, key: str) -> Optional[float]:
+        """
+        Epoch time at which key goes stale; infinity for values stored
+        without a soft TTL, None if the key isn't cached
+        """
+        stored = self._get_stored(key)
+        if stored is None:
             return None
+        if isinstance(stored, dict) and SOFT_EXPIRY_FIELD in stored:
+            return stored[SOFT_EXPIRY_FIELD]
+        return float("inf")
+    
+    def _get_stored(self, key: str) -> Optional[Any]:
+        """Raw stored value (possibly soft-expiry wrapped) from L1, then Redis"""
+        return self._get_many_stored([key])[0]
+    
+    def _get_many_stored(self, keys: List[str]) -> List[Optional[Any]]:
+        stored, missing = self._l1_lookup(keys)
+        
+        if missing and self.enabled:
+            try:
+                # Fetch each value and its remaining TTL in one round trip
+                with timed("redis_get"):
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    reads = self._queue_reads(pipe, keys, missing)
+                    replies = pipe.execute()
+                self._absorb_replies(keys, reads, replies, stored)
+            except Exception as e:
+                self._handle_error("get", e)
+        
+        return stored
+    
+    def _l1_lookup(self, keys: List[str]) -> Tuple[List[Optional[Any]], List[int]]:
+        """Stored values found in L1, and the indices of keys that missed"""
+        stored = []
+        for key in keys:
+            value = self.l1.get(key)
+            CACHE_LOOKUPS.labels(namespace(key), "l1", "miss" if value is None else "hit").inc()
+            stored.append(value)
+        return stored, [i for i, value in enumerate(stored) if value is None]
+    
+    def _queue_reads(self, pipe: Any, keys: List[str], missing: List[int]) -> List[Tuple[Optional[str], List[int]]]:
+        """
+        Queue the reads for the L1 misses on a pipeline: GET and PTTL per
+        plain key, one HMGET per location hash
+        Returns (hash key, or None for a plain key, key indices) per read
+        """
+        reads: List[Tuple[Optional[str], List[int]]] = []
+        hashes: Dict[str, List[int]] = {}
+        for i in missing:
+            location = self.hash_location(keys[i])
+            if location is None:
+                pipe.get(keys[i])
+                pipe.pttl(keys[i])
+                reads.append((None, [i]))
+            else:
+                hashes.setdefault(location[0], []).append(i)
+        
+        for hash_key, indices in hashes.items():
+            pipe.hmget(hash_key, [self.hash_location(keys[i])[1] for i in indices])
+            reads.append((hash_key, indices))
+        return reads
+    
+    def _absorb_replies(self, keys: List[str], reads: List[Tuple[Optional[str], List[int]]], replies: List[Any],
+                        stored: List[Optional[Any]]) -> None:
+        """Decode the replies to _queue_reads' reads into stored and L1"""
+        position = 0
+        now = time.time()
+        for hash_key, indices in reads:
+            if hash_key is None:
+                raw, pttl = replies[position], replies[position + 1]
+                position += 2
+                self._absorb(keys[indices[0]], raw, pttl / 1000 if pttl else 0, stored, indices[0])
+                continue
+            
+            for i, raw in zip(indices, replies[position]):
+                ttl = 0.0
+                if raw and isinstance(raw, bytes):
+                    (hard_expiry,) = _FIELD_HEADER.unpack_from(raw)
+                    ttl = hard_expiry - now
+                    # Past its hard expiry but not yet dropped from the hash
+                    raw = raw[_FIELD_HEADER.size:] if ttl > 0 else None
+                self._absorb(keys[i], raw, ttl, stored, i)
+            position += 1
+    
+    def _absorb(self, key: str, raw: Any, ttl: float, stored: List[Optional[Any]], i: int) -> None:
+        if raw and isinstance(raw, bytes):
+            self.l2_hits += 1
+            CACHE_LOOKUPS.labels(namespace(key), "l2", "hit").inc()
+            stored[i] = self._decode(raw)
+            if ttl > 0:
+                self.l1.set(key, stored[i], self._l1_ttl(key, ttl), len(raw))
+        else:
+            self.l2_misses += 1
+            CACHE_LOOKUPS.labels(namespace(key), "l2", "miss").inc()
+    
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Get several values at once, stale or not
+        Returns values aligned with keys, None for misses
+        """
+        return [entry[0] if entry is not None else None for entry in self.get_many_entries(keys)]
+    
+    def get_many_entries(self, keys: List[str]) -> List[Optional[CacheEntry]]:
+        """
+        Get several (value, stale) entries at once
+        L1 misses are fetched from Redis in a single pipelined round trip
+        Returns entries aligned with keys, None for misses
+        """
+        stored = self._get_many_stored(keys)
+        return [self._unwrap(value) if value is not None else None for value in stored]
+    
+    def set_many(self, items: Iterable[Tuple[str, Any, int]], soft_ttl_seconds: Optional[int] = None) -> bool:
+        """
+        Set several (key, value, ttl_seconds) entries in one pipelined round trip
+        soft_ttl_seconds, if given, applies to every entry (see set)
+        """
+        items = list(items)
+        if not items or not self.enabled:
+            return False
         
         try:
-            value = self.redis_client.get(key)
-            if value and isinstance(value, str):
-                return json.loads(value)
-            return None
+            pipe = self.redis_client.pipeline(transaction=False)
+            serialized = [self._encode(value, soft_ttl_seconds) for _, value, _ in items]
+            self._queue_writes(pipe, [(key, raw, ttl_seconds) for (key, _, ttl_seconds), (_, raw) in zip(items, serialized)])
+            with timed("redis_set"):
+                pipe.execute()
+            
+            for (key, _, ttl_seconds), (stored, raw) in zip(items, serialized):
+                self.l1.set(key, stored, self._l1_ttl(key, ttl_seconds), len(raw))
+            return True
         except Exception as e:
-            print(f"Cache get error: {e}")
-            return None
+            self._handle_error("set_many", e)
+            return False
+    
+    def _queue_writes(self, pipe: Any, writes: List[Tuple[str, bytes, int]]) -> None:
+        """
+        Queue the commands storing (key, raw, ttl_seconds) writes on a
+        pipeline: SET EX per plain key, one HSET (and HEXPIRE per TTL) or
+        one rolling-window script call per location hash
+        """
+        hashes: Dict[str, List[Tuple[str, bytes, int]]] = {}
+        now = time.time()
+        for key, raw, ttl_seconds in writes:
+            location = self.hash_location(key)
+            if location is None:
+                pipe.set(key, raw, ex=ttl_seconds)
+            else:
+                hash_key, field = location
+                hashes.setdefault(hash_key, []).append((field, _FIELD_HEADER.pack(now + ttl_seconds) + raw, ttl_seconds))
+        
+        for hash_key, fields in hashes.items():
+            if self.hash_expiry == "field":
+                pipe.hset(hash_key, mapping={field: value for field, value, _ in fields})
+                for ttl_seconds in {ttl for _, _, ttl in fields}:
+                    pipe.hexpire(hash_key, ttl_seconds, *[field for field, _, ttl in fields if ttl == ttl_seconds])
+            else:
+                oldest = (datetime.now(timezone.utc) - timedelta(days=self.hash_window_days)).strftime("%Y-%m-%d")
+                pairs = [part for field, value, _ in fields for part in (field, value)]
+                pipe.eval(_HASH_SET_SCRIPT, 1, hash_key, oldest, max(ttl for _, _, ttl in fields), *pairs)
     
-    def set(self, key: str, value: Any, ttl_seconds: int = 3600) -> bool:
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600, soft_ttl_seconds: Optional[int] = None) -> bool:
         """
         Set value in cache with TTL (time to live)
         Default TTL: 1 hour (3600 seconds)
+        
+        bytes values are stored verbatim and come back as bytes
+        
+        With soft_ttl_seconds, the value is kept until the hard TTL but
+        reported as stale by get_entry once the soft TTL has passed
         """
-        if not self.enabled or self.redis_client is None:
+        if not self.enabled:
             return False
         
         try:
-            serialized = json.dumps(value)
-            self.redis_client.setex(key, ttl_seconds, serialized)
+            stored, raw = self._encode(value, soft_ttl_seconds)
+            with timed("redis_set"):
+                if self.hash_location(key) is None:
+                    self.redis_client.set(key, raw, ex=ttl_seconds)
+                else:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    self._queue_writes(pipe, [(key, raw, ttl_seconds)])
+                    pipe.execute()
+            self.l1.set(key, stored, self._l1_ttl(key, ttl_seconds), len(raw))
             return True
         except Exception as e:
-            print(f"Cache set error: {e}")
+            self._handle_error("set", e)
             return False
     
     def delete(self, key: str) -> bool:
-        """Delete a key from cache"""
-        if not self.enabled or self.redis_client is None:
+        """Delete a key from cache and tell every worker to drop it from L1"""
+        self.l1.delete(key)
+        
+        if not self.enabled:
             return False
         
         try:
-            self.redis_client.delete(key)
+            location = self.hash_location(key)
+            if location is None:
+                self.redis_client.delete(key)
+            else:
+                self.redis_client.hdel(*location)
+            self._publish_invalidation(key=key)
             return True
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            self._handle_error("delete", e)
             return False
     
-    def clear_pattern(self, pattern: str) -> int:
+    def clear_pattern(self, pattern: str, batch_size: Optional[int] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> int:
         """
-        Clear all keys matching a pattern
+        Clear all keys matching a pattern, in Redis and in every worker's L1
         Example: clear_pattern("weather:*") clears all weather cache
+        
+        In the hash layout the pattern is matched against hash keys, so a
+        prefix or cell pattern clears whole hashes; one naming a date only
+        matches keys stored outside hashes.
+        
+        Keys are streamed from SCAN and removed with UNLINK (freed lazily by
+        Redis) batch_size at a time, so neither side ever holds or blocks
+        on the whole key set. progress(scanned, deleted) is called after
+        each batch. Returns the number of keys deleted.
         """
-        if not self.enabled or self.redis_client is None:
+        self.l1.clear_pattern(pattern)
+        
+        if not self.enabled:
             return 0
         
+        batch_size = batch_size or self.clear_batch_size
+        scanned = 0
+        deleted = 0
         try:
-            keys = list(self.redis_client.scan_iter(match=pattern))
-            if keys:
-                deleted = self.redis_client.delete(*keys)
-                return deleted if isinstance(deleted, int) else 0
+            self._publish_invalidation(pattern=pattern)
+            batch: List[bytes] = []
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    scanned += len(batch)
+                    deleted += self.redis_client.unlink(*batch)
+                    batch = []
+                    if progress is not None:
+                        progress(scanned, deleted)
+            if batch:
+                scanned += len(batch)
+                deleted += self.redis_client.unlink(*batch)
+                if progress is not None:
+                    progress(scanned, deleted)
+            
+            # Workers may have re-read keys into L1 while the clear was running
+            self.l1.clear_pattern(pattern)
+            self._publish_invalidation(pattern=pattern)
+            return deleted
+        except Exception as e:
+            self._handle_error("clear", e)
+            return deleted
+    
+    def total_keys(self) -> int:
+        """Keys in the Redis database, 0 if the cache is disabled"""
+        if not self.enabled:
             return 0
+        
+        try:
+            return int(self.redis_client.dbsize())
         except Exception as e:
-            print(f"Cache clear error: {e}")
+            self._handle_error("dbsize", e)
             return 0
     
-    def get_stats(self) -> dict:
-        """Get cache statistics"""
-        if not self.enabled or self.redis_client is None:
-            return {"enabled": False, "message": "Cache disabled"}
+    def sample_namespaces(self, sample_size: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Estimated key count and memory per key prefix ("hourly", "astronomy", ...)
+        
+        Samples keys with RANDOMKEY and sizes them with MEMORY USAGE in two
+        pipelined round trips, then scales the sample up to DBSIZE. Cheap
+        enough for a stats endpoint however many keys there are.
+        
+        Entries count cache entries rather than Redis keys: a location hash
+        holds one per field, so bytes_per_entry compares the two layouts.
+        """
+        if not self.enabled:
+            return {}
+        
+        sample_size = sample_size or self.stats_sample_size
+        try:
+            total = int(self.redis_client.dbsize())
+            if total == 0:
+                return {}
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for _ in range(min(sample_size, total)):
+                pipe.randomkey()
+            keys = [key for key in pipe.execute() if key is not None]
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.memory_usage(key)
+                # WRONGTYPE for plain keys, which hold one entry
+                pipe.hlen(key)
+            replies = pipe.execute(raise_on_error=False)
+        except Exception as e:
+            self._handle_error("sample", e)
+            return {}
+        
+        namespaces: Dict[str, Dict[str, Any]] = {}
+        for key, size, fields in zip(keys, replies[0::2], replies[1::2]):
+            prefix = key.decode(errors="replace").split(":", 1)[0]
+            entry = namespaces.setdefault(prefix, {"sampled": 0, "sampled_entries": 0, "sampled_bytes": 0})
+            entry["sampled"] += 1
+            entry["sampled_entries"] += fields if isinstance(fields, int) else 1
+            if isinstance(size, int):
+                entry["sampled_bytes"] += size
+        
+        for entry in namespaces.values():
+            share = entry["sampled"] / len(keys)
+            entry["estimated_keys"] = round(total * share)
+            entry["estimated_entries"] = round(total * share * entry["sampled_entries"] / entry["sampled"])
+            entry["estimated_bytes"] = round(total * share * entry["sampled_bytes"] / entry["sampled"])
+            entry["bytes_per_key"] = round(entry["sampled_bytes"] / entry["sampled"])
+            entry["bytes_per_entry"] = round(entry["sampled_bytes"] / entry["sampled_entries"]) if entry["sampled_entries"] else 0
+        return namespaces
+    
+    def acquire_lock(self, name: str, ttl_ms: int) -> Optional[str]:
+        """
+        Try to take a short-lived lock (SET NX PX)
+        Returns the lock token on success, None if another holder has it
+        or the cache is disabled
+        """
+        if not self.enabled:
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            if self.redis_client.set(f"lock:{name}", token, nx=True, px=ttl_ms):
+                return token
+            return None
+        except Exception as e:
+            self._handle_error("lock", e)
+            return None
+    
+    def release_lock(self, name: str, token: str) -> bool:
+        """
+        Release a lock taken with acquire_lock, only if we still own it
+        """
+        if not self.enabled:
+            return False
+        
+        try:
+            released = self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+            return bool(released)
+        except Exception as e:
+            self._handle_error("unlock", e)
+            return False
+    
+    def lock_held(self, name: str) -> bool:
+        """Check whether a lock taken with acquire_lock is still held"""
+        if not self.enabled:
+            return False
+        
+        try:
+            return bool(self.redis_client.exists(f"lock:{name}"))
+        except Exception as e:
+            self._handle_error("lock check", e)
+            return False
+    
+    def _key_stats(self) -> dict:
+        """Location-key hit ratios per scheme, to compare before/after quantization, and the storage layout"""
+        schemes = {}
+        for scheme, counts in self.key_stats.items():
+            lookups = counts["hits"] + counts["misses"]
+            schemes[scheme] = {
+                **counts,
+                "hit_ratio": round(counts["hits"] / lookups, 4) if lookups else 0.0
+            }
+        return {
+            "mode": self.key_mode,
+            "quantization": {prefix: q.spec for prefix, q in self.quantizers.items()},
+            "layout": self.layout,
+            **({"hash_prefixes": sorted(self.hash_prefixes), "hash_expiry": self.hash_expiry} if self.layout == "hash" else {}),
+            **schemes
+        }
+    
+    def get_stats(self, sample_namespaces: bool = True) -> dict:
+        """
+        Get cache statistics, with L1 and L2 hit ratios reported separately
+        and, unless disabled, sampled per-prefix key counts and memory
+        """
+        l2_lookups = self.l2_hits + self.l2_misses
+        tiers = {
+            "l1": self.l1.get_stats(),
+            "l2": {
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "hit_ratio": round(self.l2_hits / l2_lookups, 4) if l2_lookups else 0.0
+            },
+            "keys": self._key_stats()
+        }
+        
+        if not self.enabled:
+            return {"enabled": False, "message": "Cache disabled", **tiers}
+        
+        if sample_namespaces:
+            tiers["namespaces"] = self.sample_namespaces()
         
         try:
             info: dict = self.redis_client.info()  # type: ignore
             return {
                 "enabled": True,
+                "backend": self.backend,
                 "connected_clients": info.get("connected_clients", 0),
                 "used_memory_human": info.get("used_memory_human", "0B"),
                 "total_keys": self.redis_client.dbsize(),
                 "hits": info.get("keyspace_hits", 0),
-                "misses": info.get("keyspace_misses", 0)
+                "misses": info.get("keyspace_misses", 0),
+                **tiers
             }
         except Exception as e:
-            return {"enabled": True, "error": str(e)}
+            return {"enabled": True, "error": str(e), **tiers}
 
 
 # Global cache instance
@@ -0,0 +1,37 @@
+"""
+In-Memory Redis
+In-process Redis stand-in for benchmarks and local runs without a Redis server
+"""
+
+import threading
+from typing import Any, Optional
+
+_server: Optional[Any] = None
+_server_lock = threading.Lock()
+
+
+def _fakeredis() -> Any:
+    try:
+        import fakeredis
+        return fakeredis
+    except ImportError as e:
+        raise RuntimeError("REDIS_BACKEND=memory needs the 'fakeredis' package (pip install fakeredis)") from e
+
+
+def memory_server() -> Any:
+    """The process-wide in-memory server, shared by the sync and async clients"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = _fakeredis().FakeServer()
+        return _server
+
+
+def memory_client() -> Any:
+    """Sync client on the in-memory server (a drop-in for redis.Redis)"""
+    return _fakeredis().FakeRedis(server=memory_server(), decode_responses=False)
+
+
+def memory_async_client() -> Any:
+    """Async client on the in-memory server (a drop-in for redis.asyncio.Redis)"""
+    return _fakeredis().FakeAsyncRedis(server=memory_server(), decode_responses=False)
@@ -0,0 +1,166 @@
+"""
+Background Refresh Scheduler
+Tracks how often each cache key is read and refreshes the hottest ones
+before they go stale, so popular locations never make a user wait on upstream
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from app.services.log import get_logger, log_event
+from app.services.redis_async import async_cache
+from app.services.single_flight import single_flight
+
+Refresher = Callable[[], Awaitable]
+
+logger = get_logger(__name__)
+
+
+class RefreshScheduler:
+    """
+    Proactively refreshes the top-N most-read keys
+    
+    Every interval, access counts decay, the top-N keys are checked and any
+    that are stale or will go soft-stale within the lead time are re-fetched
+    through single-flight. Upstream calls are capped by a per-minute budget
+    so proactive refreshes stay within the API quota.
+    """
+    
+    def __init__(self) -> None:
+        self.enabled = os.getenv("REFRESH_SCHEDULER_ENABLED", "true").lower() == "true"
+        self.interval = float(os.getenv("REFRESH_INTERVAL_SECONDS", 60))
+        self.top_n = int(os.getenv("REFRESH_TOP_N", 100))
+        self.lead_seconds = float(os.getenv("REFRESH_LEAD_SECONDS", 300))
+        self.budget_per_minute = float(os.getenv("REFRESH_BUDGET_PER_MINUTE", 30))
+        self.max_tracked = int(os.getenv("REFRESH_MAX_TRACKED", 10000))
+        # Fraction of each key's access count kept from one interval to the next
+        self.decay = float(os.getenv("REFRESH_DECAY", 0.5))
+        
+        self._counts: Dict[str, float] = {}
+        self._refreshers: Dict[str, Refresher] = {}
+        # Last seen soft expiry per key, so fresh keys aren't re-read every tick
+        self._soft_expiry: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._ticking = False
+        self._stopping = False
+        
+        self.stats = {
+            "ticks": 0,
+            "refreshed": 0,
+            "errors": 0,
+            "over_budget": 0
+        }
+    
+    def record_access(self, key: str, refresher: Refresher) -> None:
+        """Count a read of key and remember how to refresh it"""
+        if not self.enabled:
+            return
+        self._counts[key] = self._counts.get(key, 0.0) + 1.0
+        self._refreshers[key] = refresher
+    
+    def start(self) -> None:
+        """Start the refresh loop on the running event loop"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+    
+    async def stop(self, timeout: float = 0.0) -> None:
+        """
+        Stop the refresh loop; a tick already refreshing keys gets up to
+        timeout seconds to finish before it's cancelled
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        if self._ticking and timeout > 0:
+            await asyncio.wait({self._task}, timeout=timeout)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stopping = False
+    
+    async def _run(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.interval)
+            self._ticking = True
+            try:
+                await self.tick()
+            except Exception as e:
+                log_event(logger, logging.ERROR, "refresh scheduler tick failed", error=str(e))
+            finally:
+                self._ticking = False
+    
+    async def tick(self) -> None:
+        """One scheduling pass: pick hot keys that are due and refresh them within budget"""
+        self.stats["ticks"] += 1
+        budget = int(self.budget_per_minute * self.interval / 60)
+        
+        hot = heapq.nlargest(self.top_n, self._counts, key=self._counts.__getitem__)
+        due = [key for key in hot if await self._is_due(key)]
+        
+        if len(due) > budget:
+            self.stats["over_budget"] += len(due) - budget
+            due = due[:budget]
+        
+        await asyncio.gather(*(self._refresh(key) for key in due))
+        self._decay()
+    
+    async def _is_due(self, key: str) -> bool:
+        soft_expiry = self._soft_expiry.get(key)
+        if soft_expiry is None:
+            soft_expiry = await async_cache.get_soft_expiry(key)
+            if soft_expiry is None:
+                # Evicted or expired: fetch it again while it's still hot
+                return True
+            self._soft_expiry[key] = soft_expiry
+        
+        return soft_expiry - time.time() <= self.lead_seconds
+    
+    async def _refresh(self, key: str) -> None:
+        refresher = self._refreshers.get(key)
+        if refresher is None:
+            return
+        try:
+            await single_flight.refresh_async(key, refresher, fresh_for=self.lead_seconds)
+            self.stats["refreshed"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            log_event(logger, logging.WARNING, "proactive refresh failed", key=key, error=str(e))
+        # Re-read the new soft expiry on the next tick
+        self._soft_expiry.pop(key, None)
+    
+    def _decay(self) -> None:
+        for key in list(self._counts):
+            self._counts[key] *= self.decay
+            if self._counts[key] < 0.01:
+                self._forget(key)
+        
+        # Keep tracking bounded to the hottest keys
+        if len(self._counts) > self.max_tracked:
+            keep = set(heapq.nlargest(self.max_tracked, self._counts, key=self._counts.__getitem__))
+            for key in list(self._counts):
+                if key not in keep:
+                    self._forget(key)
+    
+    def _forget(self, key: str) -> None:
+        self._counts.pop(key, None)
+        self._refreshers.pop(key, None)
+        self._soft_expiry.pop(key, None)
+    
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tracked_keys": len(self._counts),
+            "top_n": self.top_n,
+            "budget_per_minute": self.budget_per_minute,
+            **self.stats
+        }
+
+
+# Global scheduler instance
+refresh_scheduler = RefreshScheduler()
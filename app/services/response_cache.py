@@ -0,0 +1,103 @@
+"""
+Computed-Response Cache
+Serialized /visibility responses keyed by (location cell, ISO date, resolution),
+with the ETag and Cache-Control values derived from them
+"""
+
+import hashlib
+import json
+import math
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+
+# Fields echoed from the request rather than computed; they are spliced
+# back in front of the cached body so nearby points can share an entry
+_ECHO_FIELDS = ("location", "date")
+_EXPIRY = struct.Struct("<d")
+
+
+def _dumps(value: Any) -> bytes:
+    # Same output as FastAPI's default JSONResponse
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseCache:
+    """
+    Cache of serialized /visibility bodies
+
+    An entry lives exactly as long as the freshest view of its inputs: it
+    expires when the first of the hourly/astronomy entries it was computed
+    from goes stale, so it never outlives the data behind it. The same
+    remaining lifetime becomes the Cache-Control max-age.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+        # Entries with less life left than this aren't worth storing
+        self.min_ttl = int(os.getenv("RESPONSE_CACHE_MIN_TTL", 5))
+        # Cap for responses whose inputs never go stale
+        self.max_ttl = int(os.getenv("RESPONSE_CACHE_MAX_TTL", 3600))
+
+    def key(self, cell_id: str, iso_date: str, variant: str) -> str:
+        return cache._generate_key("response", cell=cell_id, date=iso_date, variant=variant)
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """(body, expires_at) for a live entry, else None"""
+        if not self.enabled:
+            return None
+        raw = await async_cache.get(key)
+        if raw is None:
+            return None
+        (expires_at,) = _EXPIRY.unpack_from(raw)
+        if expires_at <= time.time():
+            return None
+        return raw[_EXPIRY.size:], expires_at
+
+    async def set(self, key: str, body: bytes, expires_at: float) -> bool:
+        """Store a body until expires_at (capped at max_ttl); skipped if that's too soon"""
+        if not self.enabled:
+            return False
+        remaining = min(expires_at - time.time(), self.max_ttl)
+        if remaining < self.min_ttl:
+            return False
+        return await async_cache.set(key, _EXPIRY.pack(time.time() + remaining) + body, math.ceil(remaining))
+
+    @staticmethod
+    def serialize(response: Dict) -> bytes:
+        """The response without its echoed fields, as JSON bytes"""
+        return _dumps({k: v for k, v in response.items() if k not in _ECHO_FIELDS})
+
+    @staticmethod
+    def assemble(location: Dict, date: str, body: bytes) -> bytes:
+        """Full response bytes: the echoed fields first, then the cached body"""
+        head = b'{"location":' + _dumps(location) + b',"date":' + _dumps(date)
+        return head + (b"," + body[1:] if body != b"{}" else b"}")
+
+    @staticmethod
+    def etag(content: bytes) -> str:
+        return '"' + hashlib.blake2b(content, digest_size=12).hexdigest() + '"'
+
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """If-None-Match check with weak comparison (RFC 9110)"""
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(
+            (tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates
+        )
+
+    def cache_control(self, expires_at: float) -> str:
+        max_age = int(min(expires_at - time.time(), self.max_ttl))
+        if max_age <= 0:
+            return "no-cache"
+        return f"public, max-age={max_age}"
+
+
+# Global response cache
+response_cache = ResponseCache()
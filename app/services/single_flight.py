@@ -0,0 +1,157 @@
+"""
+Single-flight Request Coalescing
+Makes sure a cache miss for a given key triggers one upstream fetch,
+no matter how many requests miss at the same time
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.services.redis_async import async_cache
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent cache-miss fetches for the same key
+    
+    - Inside one process, concurrent callers share one in-flight fetch
+      (coroutines await a shared task)
+    - Across workers and replicas, a short-lived Redis lock (SET NX PX)
+      elects one fetcher; the others poll the result key until it shows
+      up, the lock is released, or the wait times out
+    """
+    
+    def __init__(self) -> None:
+        # Lock TTL should outlive a full upstream timeout
+        self.lock_ttl_ms = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", 12000))
+        self.wait_timeout = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", self.lock_ttl_ms / 1000))
+        self.poll_interval = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", 0.05))
+        
+        self._lock = threading.Lock()
+        # In-flight fetches and refreshes, kept apart: a refresh may end
+        # with None (another worker is on it, or the key is fresh), which
+        # a cache miss joining it couldn't use
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._refreshes: Dict[str, asyncio.Future] = {}
+        
+        self.stats = {
+            "fetches": 0,
+            "coalesced_local": 0,
+            "coalesced_remote": 0,
+            "lock_wait_timeouts": 0,
+            "refreshes": 0,
+            "refreshes_skipped": 0,
+            "refreshes_already_fresh": 0
+        }
+    
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+    
+    def get_stats(self) -> dict:
+        """Coalescing counters for /cache/stats"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["coalesced_total"] = stats["coalesced_local"] + stats["coalesced_remote"]
+        return stats
+    
+    async def do_async(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fetch() for key unless an identical fetch is already in flight,
+        in which case await that one instead
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            self._count("coalesced_local")
+            return await asyncio.shield(task)
+        return await self._start(self._tasks, key, self._fetch_elected_async(key, fetch))
+    
+    @staticmethod
+    async def _start(tasks: Dict[str, asyncio.Future], key: str, coro: Awaitable[Any]) -> Any:
+        """Run coro as key's shared task in tasks until it is done"""
+        task = asyncio.ensure_future(coro)
+        tasks[key] = task
+        
+        def _forget(done: asyncio.Future) -> None:
+            if tasks.get(key) is done:
+                del tasks[key]
+        
+        task.add_done_callback(_forget)
+        
+        # Shield so one cancelled caller doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+    
+    async def _fetch_elected_async(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        token = await async_cache.acquire_lock(key, self.lock_ttl_ms)
+        
+        if token is None and async_cache.enabled:
+            value = await self._wait_for_result_async(key)
+            if value is not None:
+                self._count("coalesced_remote")
+                return value
+        
+        try:
+            if token is not None:
+                value = await async_cache.get(key)
+                if value is not None:
+                    return value
+            self._count("fetches")
+            return await fetch()
+        finally:
+            if token is not None:
+                await async_cache.release_lock(key, token)
+    
+    async def refresh_async(self, key: str, fetch: Callable[[], Awaitable[Any]], fresh_for: float = 0.0) -> Any:
+        """
+        Re-fetch a key that is stale, or will be within fresh_for seconds
+        
+        Unlike do_async this doesn't take a cached value as the result. If
+        another worker already holds the lock it is refreshing the key, so
+        this returns None without fetching. The lock holder first re-reads
+        the key's soft expiry from Redis, past this worker's L1 copy: if
+        another worker refreshed it meanwhile, it skips the fetch (and L1
+        now holds the fresh entry). A do_async for the key meanwhile runs
+        its own fetch, or waits on this one's lock, rather than sharing
+        this None.
+        """
+        task = self._refreshes.get(key)
+        if task is not None:
+            return await asyncio.shield(task)
+        return await self._start(self._refreshes, key, self._refresh_elected_async(key, fetch, fresh_for))
+    
+    async def _refresh_elected_async(self, key: str, fetch: Callable[[], Awaitable[Any]], fresh_for: float) -> Any:
+        token = await async_cache.acquire_lock(key, self.lock_ttl_ms)
+        if token is None and async_cache.enabled:
+            self._count("refreshes_skipped")
+            return None
+        
+        try:
+            if token is not None:
+                soft_expiry = await async_cache.get_soft_expiry(key, skip_l1=True)
+                if soft_expiry is not None and soft_expiry - time.time() > fresh_for:
+                    self._count("refreshes_already_fresh")
+                    return None
+            self._count("refreshes")
+            return await fetch()
+        finally:
+            if token is not None:
+                await async_cache.release_lock(key, token)
+    
+    async def _wait_for_result_async(self, key: str) -> Optional[Any]:
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            value = await async_cache.get(key)
+            if value is not None:
+                return value
+            if not await async_cache.lock_held(key):
+                return await async_cache.get(key)
+            await asyncio.sleep(self.poll_interval)
+        
+        self._count("lock_wait_timeouts")
+        return None
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
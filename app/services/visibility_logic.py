@@ -1,10 +1,23 @@
-from datetime import datetime, timedelta
+import os
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from app.services.ephemeris import TWILIGHT_STATES, astronomy_for, format_minutes, night_slots
+from app.services.hourly import HourlyForecast
+from app.services.visibility_score import best_window, calculate_slot_scores
 
-def calculate_darkness_window(date: str):
+# Timeline slot lengths accepted by ?resolution=
+TIMELINE_RESOLUTIONS = {"hourly": 60.0, "15min": 15.0}
+
+# Slots scoring at least this are "good" when picking the best window
+TIMELINE_GOOD_SCORE = float(os.getenv("TIMELINE_GOOD_SCORE", 60))
+
+def calculate_darkness_window(date: str, lat: float, lon: float):
     """
-    Temporary logic:
-    Assume astronomical darkness from 7:30 PM to 5:30 AM
-    (This will be replaced later with real sun calculations)
+    Darkness window for the night starting on the given date, computed
+    with the local ephemeris: astronomical dusk to dawn, or nautical
+    twilight where the sun never gets 18 degrees below the horizon.
+    dark_start/dark_end are None when there is no dark window at all.
     """
     # Try to parse multiple date formats
     try:
@@ -18,15 +31,89 @@ def calculate_darkness_window(date: str):
             # Default to today if parsing fails
             date_obj = datetime.now()
     
-    start = date_obj + timedelta(hours=19, minutes=30)
-    end = start + timedelta(hours=10)
+    astronomy = astronomy_for(lat, lon, date_obj.strftime("%Y-%m-%d"))
 
     return {
-        "dark_start": start.strftime("%H:%M"),
-        "dark_end": end.strftime("%H:%M")
+        "dark_start": astronomy["dark_start"],
+        "dark_end": astronomy["dark_end"],
+        "darkness_hours": astronomy["darkness_hours"],
+        "darkness_level": astronomy["darkness_level"]
     }
 
 
+def _slot_cloud_cover(starts: np.ndarray, tonight: Optional[HourlyForecast],
+                      tomorrow: Optional[HourlyForecast]) -> np.ndarray:
+    """
+    Cloud cover for each slot from the hourly records of the date and the
+    next day; hours missing from either fall back to the night's average
+    """
+    evening = tonight.values("cloud") if tonight is not None else [None] * 24
+    # Without tomorrow's record, reuse tonight's early hours as the legacy average did
+    morning = tomorrow.values("cloud") if tomorrow is not None else evening
+    hours = np.array(evening + morning, dtype=float)  # None -> nan
+
+    cloud = hours[np.minimum(starts // 60, 47).astype(int)]
+    missing = np.isnan(cloud)
+    if missing.all():
+        return np.full(cloud.shape, 30.0)
+    cloud[missing] = np.nanmean(cloud)
+    return cloud
+
+
+def calculate_visibility_timeline(date: str, lat: float, lon: float, resolution: str,
+                                  tonight: Optional[HourlyForecast],
+                                  tomorrow: Optional[HourlyForecast],
+                                  light_pollution: float = 0.5) -> dict:
+    """
+    Score every slot of the night and pick the best contiguous window
+
+    Slots run from sunset to sunrise at the given resolution (see
+    TIMELINE_RESOLUTIONS) and are scored in one vectorized pass from the
+    hourly cloud cover, moon altitude, twilight state and the location's
+    light pollution.
+    """
+    step = TIMELINE_RESOLUTIONS[resolution]
+    slots = night_slots(lat, lon, date, step)
+    starts = slots["start"]
+
+    cloud = _slot_cloud_cover(starts, tonight, tomorrow)
+    scores = calculate_slot_scores(
+        cloud_cover=cloud,
+        moon_illumination=slots["moon_illumination"],
+        moon_altitude=slots["moon_altitude"],
+        sun_altitude=slots["sun_altitude"],
+        light_pollution=light_pollution
+    )
+
+    timeline = [
+        {
+            "start": format_minutes(start),
+            "end": format_minutes(start + step),
+            "visibility_score": int(score),
+            "cloud_cover_percent": int(round(c)),
+            "moon_up": bool(moon_alt > 0),
+            "twilight": TWILIGHT_STATES[state]
+        }
+        for start, score, c, moon_alt, state in zip(
+            starts.tolist(), scores.tolist(), cloud.tolist(),
+            slots["moon_altitude"].tolist(), slots["twilight"].tolist()
+        )
+    ]
+
+    window = best_window(scores, TIMELINE_GOOD_SCORE)
+    best = None
+    if window is not None:
+        first, last = window
+        best = {
+            "start": format_minutes(starts[first]),
+            "end": format_minutes(starts[last - 1] + step),
+            "hours": round((last - first) * step / 60, 2),
+            "average_score": round(float(scores[first:last].mean()), 1)
+        }
+
+    return {"resolution": resolution, "slots": timeline, "best_window": best}
+
+
 def calculate_visibility_score():
     """
     Placeholder scoring logic
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def calculate_visibility_score(
     cloud_cover: float,
     moon_illumination: float,
@@ -6,6 +9,10 @@ def calculate_visibility_score(
 ) -> dict:
     """
     Calculate sky visibility score (0–100) based on key factors.
+
+    cloud_cover, moon_illumination and light_pollution are percentages
+    (0-100); ephemeris and provider illumination is a 0-1 fraction, so
+    callers scale it.
     """
 
     cloud_score = max(0, 100 - cloud_cover)
@@ -41,3 +48,115 @@ def calculate_visibility_score(
         "visibility_score": round(final_score),
         "explanation": " ".join(explanation)
     }
+
+
+def calculate_visibility_scores(
+    cloud_cover,
+    moon_illumination,
+    darkness_hours,
+    light_pollution,
+    explain: bool = False
+) -> dict:
+    """
+    Vectorized calculate_visibility_score for arrays of inputs, in the
+    same units (percentages).
+
+    Inputs broadcast against each other (scalars are fine). Scores are
+    returned as an integer array; explanation strings are only built
+    when explain=True.
+    """
+    cloud_cover = np.asarray(cloud_cover, dtype=float)
+    moon_illumination = np.asarray(moon_illumination, dtype=float)
+    darkness_hours = np.asarray(darkness_hours, dtype=float)
+    light_pollution = np.asarray(light_pollution, dtype=float)
+
+    cloud_score = np.maximum(0, 100 - cloud_cover)
+    moon_score = np.maximum(0, 100 - moon_illumination)
+    darkness_score = np.minimum(100, darkness_hours * 12.5)
+    pollution_score = np.maximum(0, 100 - light_pollution)
+
+    final_score = (
+        0.4 * cloud_score +
+        0.3 * moon_score +
+        0.2 * darkness_score +
+        0.1 * pollution_score
+    )
+
+    # np.round rounds half to even, like round() in the scalar version
+    result = {"visibility_score": np.round(final_score).astype(np.int64)}
+
+    if explain:
+        cloud_text = np.where(cloud_cover > 60, "Heavy cloud cover reduces visibility.", "Low cloud cover is favorable.")
+        moon_text = np.where(moon_illumination > 70, "Bright moonlight limits faint object visibility.", "Moonlight impact is minimal.")
+        darkness_text = np.where(darkness_hours < 4, "Short dark window available.", "Good duration of darkness.")
+        cloud_text, moon_text, darkness_text = np.broadcast_arrays(cloud_text, moon_text, darkness_text)
+        result["explanation"] = [
+            " ".join(parts) for parts in zip(cloud_text.ravel(), moon_text.ravel(), darkness_text.ravel())
+        ]
+
+    return result
+
+
+def calculate_slot_scores(
+    cloud_cover,
+    moon_illumination,
+    moon_altitude,
+    sun_altitude,
+    light_pollution=0.5
+) -> np.ndarray:
+    """
+    Visibility score (0-100) for each time slot of a night.
+
+    Same weights as calculate_visibility_score, but per slot: moonlight
+    only counts while the moon is up (ramping in over its first 30 degrees
+    of altitude) and the darkness term follows the sun's depth below the
+    horizon instead of the length of the night. moon_illumination is a
+    0-1 fraction here, as the ephemeris gives it, and scaled to the
+    percentage calculate_visibility_score takes. Returns an integer array.
+    """
+    cloud_cover = np.asarray(cloud_cover, dtype=float)
+    moon_illumination = np.asarray(moon_illumination, dtype=float)
+    moon_altitude = np.asarray(moon_altitude, dtype=float)
+    sun_altitude = np.asarray(sun_altitude, dtype=float)
+
+    moon_up = np.clip(moon_altitude / 30.0, 0.0, 1.0)
+
+    cloud_score = np.maximum(0, 100 - cloud_cover)
+    moon_score = 100 - 100 * moon_illumination * moon_up
+    # 0 at sunset, 100 once the sun is 18 degrees down (astronomical night)
+    darkness_score = np.interp(sun_altitude, [-18.0, -0.833], [100.0, 0.0])
+    pollution_score = max(0, 100 - light_pollution)
+
+    final_score = (
+        0.4 * cloud_score +
+        0.3 * moon_score +
+        0.2 * darkness_score +
+        0.1 * pollution_score
+    )
+    return np.round(final_score).astype(np.int64)
+
+
+def best_window(scores, threshold: float):
+    """
+    Best contiguous run of slots, in one linear pass.
+
+    Finds the run maximizing the sum of (score - threshold), so a run of
+    good slots can bridge a short dip but not a long bad stretch. When no
+    slot reaches the threshold this is the single best slot.
+
+    Returns (start, end) slot indices, end exclusive, or None if scores is empty.
+    """
+    best = None
+    best_total = -np.inf
+    run_start = 0
+    run_total = 0.0
+
+    for i, score in enumerate((np.asarray(scores, dtype=float) - threshold).tolist()):
+        if run_total <= 0:
+            run_start, run_total = i, score
+        else:
+            run_total += score
+        if run_total > best_total:
+            best, best_total = (run_start, i + 1), run_total
+
+    return best
@@ -2,156 +2,235 @@
 Weather and Astronomy Data Service with Redis Caching
 """
 
+import asyncio
 import httpx
-from datetime import datetime
-from typing import Dict
+import logging
+from datetime import datetime, timedelta, timezone
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 import os
-import math
+from app.services import ephemeris
+from app.services.circuit_breaker import CircuitOpenError, upstream_breakers
+from app.services.hourly import HourlyForecast, darkness_window
+from app.services.log import get_logger, log_event
+from app.services.metrics import (
+    CACHE_STALE_SERVED, HEDGED_REQUESTS, NEGATIVE_CACHE_HITS, PROVIDER_SECONDS, PROVIDER_WINS, timed, upstream_call
+)
+from app.services.redis_async import async_cache
 from app.services.redis_cache import cache
+from app.services.refresh_scheduler import refresh_scheduler
+from app.services.single_flight import single_flight
+from app.services.weather_providers import ASTRONOMY, FORECAST, FORECAST_DAYS, WeatherProvider, create_provider
 
+logger = get_logger(__name__)
 
-class WeatherAstronomyServiceSync:
+T = TypeVar("T")
+
+# Prefixes whose pre-quantization entries CACHE_KEY_MODE=migrate can reuse.
+# Not hourly: before the packed records, forecasts were cached as one
+# averaged int under cloud_cover:, which can't stand in for hourly data,
+# so hourly keys are simply refetched as the cache turns over
+MIGRATABLE_PREFIXES = {"astronomy"}
+
+
+def _http2_available() -> bool:
+    """HTTP/2 support in httpx needs the optional 'h2' package"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class WeatherAstronomyService:
     """
-    Weather service with Redis caching
+    Async weather service with Redis caching
+
+    Holds one long-lived pooled httpx.AsyncClient (keep-alive, HTTP/2 when
+    the 'h2' package is installed) so cache misses reuse warm connections
+    instead of paying a TCP+TLS handshake per request.
+
+    With a secondary provider configured, lookups are hedged: if the
+    primary hasn't answered within its recent p95 latency, the same
+    lookup goes to the secondary and whichever answers first wins. That
+    costs ~5% extra upstream requests and cuts the primary's slow tail.
     """
-    
+
     def __init__(self):
-        self.weather_api_key = os.getenv("WEATHER_API_KEY", "")
-        self.base_url = "https://api.weatherapi.com/v1"
-        
+        # Upstream weather APIs (see weather_providers.py). The primary
+        # answers every lookup; a secondary, if set, takes over failed
+        # lookups and races slow ones
+        self.provider = create_provider(os.getenv("WEATHER_PROVIDER", "weatherapi"))
+        secondary = os.getenv("WEATHER_PROVIDER_SECONDARY", "")
+        self.secondary_provider: Optional[WeatherProvider] = create_provider(secondary) if secondary else None
+        if self.secondary_provider is not None and self.secondary_provider.name == self.provider.name:
+            self.secondary_provider = None
+
+        # Hedging: once the primary has taken longer than this quantile of
+        # its recent latencies, the secondary is asked too. Until there are
+        # enough samples the default delay (seconds) is used instead
+        self.hedging = os.getenv("HEDGE_REQUESTS", "true").lower() == "true"
+        self.hedge_quantile = float(os.getenv("HEDGE_QUANTILE", 0.95))
+        self.hedge_default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", 1.0))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", 0.05))
+
+        # Upstream request timeout (in seconds)
+        self.timeout = float(os.getenv("UPSTREAM_TIMEOUT", 10.0))
+
         # Cache TTLs (in seconds)
-        self.cloud_cover_ttl = 3600  # 1 hour
+        self.cloud_cover_ttl = 3600  # 1 hour (hourly forecast records)
         self.astronomy_ttl = 86400   # 24 hours (astronomy data changes slowly)
-    
-    def get_cloud_cover(self, lat: float, lon: float, date: str) -> int:
+
+        # Stale-while-revalidate: past the TTLs above values are stale but
+        # still served (while refreshing in the background) for this long
+        self.cloud_cover_max_stale = int(os.getenv("CLOUD_COVER_MAX_STALE", 10800))  # 3 hours
+        self.astronomy_max_stale = int(os.getenv("ASTRONOMY_MAX_STALE", 86400))      # 24 hours
+
+        # Locally computed astronomy cached after an astronomy.json failure
+        self.astronomy_fallback_ttl = 1800  # 30 minutes
+
+        # After a failed upstream fetch, further misses for the same key go
+        # straight to the fallback for this long instead of retrying
+        self.negative_ttl = int(os.getenv("NEGATIVE_CACHE_TTL", 30))
+
+        # "local" computes astronomy with the ephemeris engine, "api" calls astronomy.json
+        self.astronomy_source = os.getenv("ASTRONOMY_SOURCE", "local").lower()
+
+        # {operation: {"hedged": n, "failovers": n, "wins": {provider: n}}}
+        self._provider_stats: Dict[str, Dict] = {}
+
+        # Connection pool limits
+        self.max_connections = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+        self.max_keepalive_connections = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))
+        self.keepalive_expiry = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30.0))
+        self.http2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true" and _http2_available()
+
+        # Max concurrent upstream requests for a batch
+        self.batch_concurrency = int(os.getenv("BATCH_UPSTREAM_CONCURRENCY", 10))
+
+        # Open a connection to each provider during startup warm-up
+        self.prewarm = os.getenv("UPSTREAM_PREWARM", "true").lower() == "true"
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._background: Set[asyncio.Future] = set()
+        self._in_flight = 0
+
+    def ttl_config(self) -> Dict:
+        """Cache lifetimes in seconds per data type, for /cache/stats"""
+        return {
+            "hourly": {
+                "soft_seconds": self.cloud_cover_ttl,
+                "hard_seconds": self.cloud_cover_ttl + self.cloud_cover_max_stale,
+                "negative_seconds": self.negative_ttl
+            },
+            "astronomy": {
+                "source": self.astronomy_source,
+                "soft_seconds": self.astronomy_ttl,
+                "hard_seconds": self.astronomy_ttl + self.astronomy_max_stale,
+                "fallback_seconds": self.astronomy_fallback_ttl
+            }
+        }
+
+    def _cache_location(self, prefix: str, lat: float, lon: float, date: str,
+                        iso_date: Optional[str] = None) -> Tuple[str, Optional[str], float, float]:
         """
-        Get cloud cover with caching
+        Resolve where a location's data lives in the cache
+
+        Returns (cache_key, legacy_key, query_lat, query_lon). Nearby
+        coordinates share a quantized cell, so upstream is queried at the
+        cell center to make the cached value the same whoever fetches it.
+        legacy_key is the pre-quantization key, only set in migrate mode
+        and for prefixes in MIGRATABLE_PREFIXES. iso_date can be passed
+        when the caller already normalized date.
         """
-        # Generate cache key
-        cache_key = cache._generate_key(
-            "cloud_cover",
-            lat=lat,
-            lon=lon,
-            date=date
-        )
-        
-        # Try to get from cache first
-        cached_value = cache.get(cache_key)
-        if cached_value is not None:
-            print(f"✅ Cache HIT: cloud_cover for {lat},{lon} on {date}")
-            return cached_value
-        
-        print(f"❌ Cache MISS: Fetching cloud_cover from API...")
-        
-        # If not in cache, fetch from API
-        try:
-            with httpx.Client(timeout=10.0) as client:
-                url = f"{self.base_url}/forecast.json"
-                params = {
-                    "key": self.weather_api_key,
-                    "q": f"{lat},{lon}",
-                    "dt": self._format_date(date),
-                    "aqi": "no"
-                }
-                
-                response = client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                cloud_cover = 30  # Default
-                
-                if "forecast" in data and "forecastday" in data["forecast"]:
-                    forecast_day = data["forecast"]["forecastday"][0]
-                    if "hour" in forecast_day:
-                        night_hours = [h for h in forecast_day["hour"] 
-                                      if int(h["time"].split()[1].split(":")[0]) >= 19 
-                                      or int(h["time"].split()[1].split(":")[0]) <= 5]
-                        if night_hours:
-                            avg_cloud = sum(h["cloud"] for h in night_hours) / len(night_hours)
-                            cloud_cover = int(avg_cloud)
-                
-                elif "current" in data:
-                    cloud_cover = data["current"].get("cloud", 30)
-                
-                # Store in cache
-                cache.set(cache_key, cloud_cover, self.cloud_cover_ttl)
-                
-                return cloud_cover
-                    
-        except Exception as e:
-            print(f"Error fetching cloud cover: {e}")
+        if cache.key_mode == "legacy":
+            return cache._generate_key(prefix, lat=lat, lon=lon, date=date), None, lat, lon
+
+        cell_id, query_lat, query_lon = cache.location_cell(prefix, lat, lon)
+        cache_key = cache._generate_key(prefix, cell=cell_id, date=iso_date or self._format_date(date))
+        legacy_key = None
+        if cache.key_mode == "migrate" and prefix in MIGRATABLE_PREFIXES:
+            legacy_key = cache._generate_key(prefix, lat=lat, lon=lon, date=date)
+        return cache_key, legacy_key, query_lat, query_lon
+
+    def _providers_for(self, operation: str) -> List[WeatherProvider]:
+        """Configured providers able to serve operation, primary first"""
+        return [
+            provider for provider in (self.provider, self.secondary_provider)
+            if provider is not None and provider.supports(operation)
+        ]
+
+    def upstream_down(self, operation: str) -> bool:
+        """Whether every provider for operation has its circuit open (or none serves it)"""
+        return all(upstream_breakers.is_open(provider.endpoint(operation)) for provider in self._providers_for(operation))
+
+    def _operation_stats(self, operation: str) -> Dict:
+        return self._provider_stats.setdefault(operation, {"hedged": 0, "failovers": 0, "wins": {}})
+
+    def _record_win(self, provider: WeatherProvider, operation: str) -> None:
+        PROVIDER_WINS.labels(provider.name, operation).inc()
+        wins = self._operation_stats(operation)["wins"]
+        wins[provider.name] = wins.get(provider.name, 0) + 1
+
+    def _record_hedge(self, operation: str, reason: str) -> None:
+        """Count a lookup sent on to the secondary: "slow" (hedged) or "failed" (failover)"""
+        HEDGED_REQUESTS.labels(operation, reason).inc()
+        self._operation_stats(operation)["hedged" if reason == "slow" else "failovers"] += 1
+
+    def provider_stats(self) -> Dict:
+        """Providers, hedging settings and per-operation win rates, for /cache/stats"""
+        operations = {}
+        for operation, stats in list(self._provider_stats.items()):
+            total = sum(stats["wins"].values())
+            operations[operation] = {
+                **stats,
+                "win_rate": {name: round(wins / total, 4) for name, wins in stats["wins"].items()} if total else {}
+            }
+        return {
+            "primary": self.provider.name,
+            "secondary": self.secondary_provider.name if self.secondary_provider is not None else None,
+            "hedging": self.hedging and self.secondary_provider is not None,
+            "hedge_quantile": self.hedge_quantile,
+            "operations": operations
+        }
+
+    def night_cloud_cover(self, record: Optional[HourlyForecast], astronomy: Optional[Dict] = None) -> int:
+        """
+        Cloud cover (%) averaged over the night's darkness window when the
+        astronomy data has one, else over the legacy 19:00-06:00 hours
+        Returns the default of 30 when there is no hourly record
+        """
+        if record is None:
             return 30
-    
-    def get_astronomy_data(self, lat: float, lon: float, date: str) -> Dict:
+        return record.cloud_cover(darkness_window(astronomy) if astronomy else None)
+
+    def _local_astronomy(self, lat: float, lon: float, date: str) -> Dict:
+        """Astronomy data computed locally, no network or cache involved"""
+        with timed("ephemeris"):
+            return ephemeris.astronomy_for(lat, lon, self._format_date(date))
+
+    def _astronomy_fallback(self, lat: float, lon: float, date: str) -> Dict:
+        """Local astronomy standing in for failed upstream astronomy data, marked as a fallback"""
+        return {**self._local_astronomy(lat, lon, date), "fallback": True}
+
+    @staticmethod
+    def _negative_key(cache_key: str) -> str:
+        """Marker key recording that cache_key's upstream fetch just failed"""
+        return f"neg:{cache_key}"
+
+    @staticmethod
+    def degraded_inputs(astronomy: Optional[Dict], *records: Optional[HourlyForecast]) -> List[str]:
         """
-        Get astronomy data with caching
+        Inputs that came from a fallback rather than upstream data: a
+        missing hourly record means cloud cover is the default
         """
-        # Generate cache key
-        cache_key = cache._generate_key(
-            "astronomy",
-            lat=lat,
-            lon=lon,
-            date=date
-        )
-        
-        # Try to get from cache first
-        cached_value = cache.get(cache_key)
-        if cached_value is not None:
-            print(f"✅ Cache HIT: astronomy data for {lat},{lon} on {date}")
-            return cached_value
-        
-        print(f"❌ Cache MISS: Fetching astronomy data from API...")
-        
-        # If not in cache, fetch from API
-        try:
-            with httpx.Client(timeout=10.0) as client:
-                url = f"{self.base_url}/astronomy.json"
-                params = {
-                    "key": self.weather_api_key,
-                    "q": f"{lat},{lon}",
-                    "dt": self._format_date(date)
-                }
-                
-                response = client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                result = None
-                
-                if "astronomy" in data and "astro" in data["astronomy"]:
-                    astro = data["astronomy"]["astro"]
-                    
-                    result = {
-                        "moon_illumination": int(astro.get("moon_illumination", 50)) / 100,
-                        "moon_phase": astro.get("moon_phase", "Unknown"),
-                        "sunrise": astro.get("sunrise", "06:00 AM"),
-                        "sunset": astro.get("sunset", "06:00 PM"),
-                        "moonrise": astro.get("moonrise", "08:00 PM"),
-                        "moonset": astro.get("moonset", "08:00 AM")
-                    }
-                    
-                    # Store in cache
-                    cache.set(cache_key, result, self.astronomy_ttl)
-                    return result
-                    
-        except Exception as e:
-            print(f"Error fetching astronomy data: {e}")
-        
-        # Fallback data
-        result = {
-            "moon_illumination": self._calculate_moon_illumination_fallback(date),
-            "moon_phase": "Unknown",
-            "sunrise": "06:00 AM",
-            "sunset": "06:00 PM",
-            "moonrise": "08:00 PM",
-            "moonset": "08:00 AM"
-        }
-        
-        # Cache fallback data with shorter TTL
-        cache.set(cache_key, result, 1800)  # 30 minutes
-        
-        return result
-    
+        degraded = []
+        if astronomy is not None and astronomy.get("fallback"):
+            degraded.append("astronomy")
+        if any(record is None for record in records):
+            degraded.append("cloud_cover")
+        return degraded
+
     def _format_date(self, date: str) -> str:
         """Convert date to YYYY-MM-DD format"""
         try:
@@ -163,18 +242,569 @@ class WeatherAstronomyServiceSync:
                 return date_obj.strftime("%Y-%m-%d")
             except ValueError:
                 return datetime.now().strftime("%Y-%m-%d")
-    
-    def _calculate_moon_illumination_fallback(self, date: str) -> float:
-        """Fallback moon calculation if API fails"""
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared upstream client, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+        return self._client
+
+    async def warm(self) -> bool:
+        """
+        Open a pooled connection (TCP+TLS, HTTP/2 if available) to each
+        provider, so the first cache misses don't pay for the handshake
+        Any HTTP response will do; True if every provider answered
+        """
+        if not self.prewarm:
+            return True
+        providers = [p for p in (self.provider, self.secondary_provider) if p is not None]
+        results = await asyncio.gather(
+            *(self.client.head(provider.base_url, timeout=2.0) for provider in providers),
+            return_exceptions=True
+        )
+        return not any(isinstance(result, Exception) for result in results)
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for in-flight upstream calls and
+        background refreshes to finish; True if they all did
+        """
+        deadline = time.monotonic() + timeout
+        while (self._in_flight or self._background) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return not (self._in_flight or self._background)
+
+    async def aclose(self) -> None:
+        """Cancel background refreshes and close the pooled upstream client"""
+        for task in list(self._background):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _provider_get(self, provider: WeatherProvider, operation: str, request: Tuple[str, Dict]) -> Dict:
+        """
+        GET a provider's endpoint through its circuit breaker, with the
+        breaker's adaptive timeout; returns the JSON body
+        Raises CircuitOpenError without calling upstream while the circuit is open
+        """
+        endpoint = provider.endpoint(operation)
+        breaker = upstream_breakers.get(endpoint)
+        url, params = request
+        start = time.perf_counter()
+        self._in_flight += 1
         try:
-            date_obj = datetime.strptime(self._format_date(date), "%Y-%m-%d")
-        except ValueError:
-            date_obj = datetime.now()
-        
-        reference_new_moon = datetime(2024, 1, 11)
-        lunar_cycle = 29.53
-        days_since = (date_obj - reference_new_moon).days
-        cycle_position = (days_since % lunar_cycle) / lunar_cycle
-        
-        illumination = 0.5 - 0.5 * math.cos(2 * math.pi * cycle_position)
-        return illumination
\ No newline at end of file
+            with breaker.guard(), upstream_call(endpoint):
+                response = await self.client.get(url, params=params, timeout=breaker.timeout())
+                response.raise_for_status()
+                data = response.json()
+        finally:
+            self._in_flight -= 1
+        PROVIDER_SECONDS.labels(provider.name, operation).observe(time.perf_counter() - start)
+        return data
+
+    def _hedge_delay(self, provider: WeatherProvider, operation: str) -> Optional[float]:
+        """Seconds to wait on the primary before asking the secondary too; None to never hedge"""
+        if not self.hedging:
+            return None
+        latency = upstream_breakers.get(provider.endpoint(operation)).latency_quantile(self.hedge_quantile)
+        if latency is None:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, latency)
+
+    async def _hedged(self, operation: str, call: Callable[[WeatherProvider], Awaitable[T]]) -> T:
+        """
+        Run call against the primary provider. If it fails, or is still
+        running after its hedge delay, run it against the secondary as well
+        and return the first success, cancelling the loser.
+        Raises if every provider fails, preferring a real upstream error
+        over CircuitOpenError so the failure is negatively cached.
+        """
+        providers = self._providers_for(operation)
+        if not providers:
+            raise ValueError(f"No configured weather provider serves {operation}")
+        primary = providers[0]
+        secondary = providers[1] if len(providers) > 1 else None
+        if secondary is not None and upstream_breakers.is_open(secondary.endpoint(operation)):
+            secondary = None
+
+        if secondary is None:
+            result = await call(primary)
+            self._record_win(primary, operation)
+            return result
+
+        first = asyncio.ensure_future(call(primary))
+        tasks = {first: primary}
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self._hedge_delay(primary, operation))
+            if done and first.exception() is None:
+                self._record_win(primary, operation)
+                return first.result()
+
+            self._record_hedge(operation, "failed" if done else "slow")
+            tasks[asyncio.ensure_future(call(secondary))] = secondary
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._record_win(tasks[task], operation)
+                        return task.result()
+
+            errors = [task.exception() for task in tasks]
+            raise next((e for e in errors if not isinstance(e, CircuitOpenError)), errors[0])
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _refresh_in_background(self, cache_key: str, refresh: Callable[[], Awaitable]) -> None:
+        """Re-fetch a stale key without making the current request wait"""
+        async def run() -> None:
+            try:
+                await single_flight.refresh_async(cache_key, refresh)
+            except Exception as e:
+                log_event(logger, logging.WARNING, "background refresh failed", key=cache_key, error=str(e))
+
+        task = asyncio.ensure_future(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_cloud_cover(self, lat: float, lon: float, date: str) -> int:
+        """
+        Get night cloud cover, from the cached hourly record
+        """
+        return self.night_cloud_cover(await self.get_hourly_forecast(lat, lon, date))
+
+    async def get_hourly_forecast(self, lat: float, lon: float, date: str) -> Optional[HourlyForecast]:
+        """
+        Get the hourly forecast record with caching
+
+        Stale records are returned right away and refreshed in the background;
+        only a missing (hard-expired) record waits on upstream.
+        Returns None if upstream fails
+        """
+        cache_key, legacy_key, query_lat, query_lon = self._cache_location(
+            "hourly", lat, lon, date
+        )
+
+        def refresh() -> Awaitable[Optional[bytes]]:
+            return self._fetch_hourly(cache_key, query_lat, query_lon, date)
+
+        refresh_scheduler.record_access(cache_key, refresh)
+
+        entry = await async_cache.get_location_entry(cache_key, legacy_key)
+        if entry is not None:
+            cached_value, stale = entry
+            if stale:
+                CACHE_STALE_SERVED.labels("hourly").inc()
+                log_event(logger, logging.INFO, "cache stale, refreshing", sampled=True, namespace="hourly", lat=lat, lon=lon, date=date)
+                self._refresh_in_background(cache_key, refresh)
+            else:
+                log_event(logger, logging.DEBUG, "cache hit", sampled=True, namespace="hourly", lat=lat, lon=lon, date=date)
+            return HourlyForecast.unpack(cached_value)
+
+        log_event(logger, logging.INFO, "cache miss", sampled=True, namespace="hourly", lat=lat, lon=lon, date=date)
+
+        # Upstream is down: skip the fetch (and its cross-worker lock) entirely
+        if self.upstream_down(FORECAST):
+            return None
+
+        record = await single_flight.do_async(cache_key, refresh)
+        return HourlyForecast.unpack(record) if record is not None else None
+
+    async def _request_hourly(self, lat: float, lon: float, date: str) -> bytes:
+        """Fetch and pack one day's hours (hedged), raising on upstream errors"""
+        iso_date = self._format_date(date)
+
+        async def call(provider: WeatherProvider) -> bytes:
+            data = await self._provider_get(provider, FORECAST, provider.hourly_request(lat, lon, iso_date))
+            return provider.parse_hourly(data, iso_date)
+
+        return await self._hedged(FORECAST, call)
+
+    async def _recently_failed(self, cache_key: str) -> bool:
+        """Whether cache_key's upstream fetch failed within the last negative_ttl seconds"""
+        if await async_cache.get(self._negative_key(cache_key)) is None:
+            return False
+        NEGATIVE_CACHE_HITS.labels(cache_key.split(":", 1)[0]).inc()
+        return True
+
+    async def _fetch_hourly(self, cache_key: str, lat: float, lon: float, date: str) -> Optional[bytes]:
+        if await self._recently_failed(cache_key):
+            return None
+
+        try:
+            record = await self._request_hourly(lat, lon, date)
+            await async_cache.set(
+                cache_key, record,
+                self.cloud_cover_ttl + self.cloud_cover_max_stale,
+                soft_ttl_seconds=self.cloud_cover_ttl
+            )
+            return record
+
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            log_event(logger, logging.WARNING, "upstream fetch failed", endpoint="forecast", error=str(e))
+            await async_cache.set(self._negative_key(cache_key), 1, self.negative_ttl)
+            return None
+
+    async def get_astronomy_data(self, lat: float, lon: float, date: str) -> Dict:
+        """
+        Get astronomy data with caching
+        """
+        if self.astronomy_source == "local":
+            return self._local_astronomy(lat, lon, date)
+
+        cache_key, legacy_key, query_lat, query_lon = self._cache_location(
+            "astronomy", lat, lon, date
+        )
+
+        def refresh() -> Awaitable[Dict]:
+            return self._fetch_astronomy_data(cache_key, query_lat, query_lon, date)
+
+        refresh_scheduler.record_access(cache_key, refresh)
+
+        entry = await async_cache.get_location_entry(cache_key, legacy_key)
+        if entry is not None:
+            cached_value, stale = entry
+            if stale:
+                CACHE_STALE_SERVED.labels("astronomy").inc()
+                log_event(logger, logging.INFO, "cache stale, refreshing", sampled=True, namespace="astronomy", lat=lat, lon=lon, date=date)
+                self._refresh_in_background(cache_key, refresh)
+            else:
+                log_event(logger, logging.DEBUG, "cache hit", sampled=True, namespace="astronomy", lat=lat, lon=lon, date=date)
+            return cached_value
+
+        log_event(logger, logging.INFO, "cache miss", sampled=True, namespace="astronomy", lat=lat, lon=lon, date=date)
+
+        # Upstream is down: serve the fallback without caching it
+        if self.upstream_down(ASTRONOMY):
+            return self._astronomy_fallback(lat, lon, date)
+
+        return await single_flight.do_async(cache_key, refresh)
+
+    async def _request_astronomy_data(self, lat: float, lon: float, date: str) -> Dict:
+        """Fetch astronomy data (hedged), raising on upstream errors or an unexpected payload"""
+        iso_date = self._format_date(date)
+
+        async def call(provider: WeatherProvider) -> Dict:
+            data = await self._provider_get(provider, ASTRONOMY, provider.astronomy_request(lat, lon, iso_date))
+            return provider.parse_astronomy(data)
+
+        return await self._hedged(ASTRONOMY, call)
+
+    async def _fetch_astronomy_data(self, cache_key: str, lat: float, lon: float, date: str) -> Dict:
+        try:
+            result = await self._request_astronomy_data(lat, lon, date)
+            await async_cache.set(
+                cache_key, result,
+                self.astronomy_ttl + self.astronomy_max_stale,
+                soft_ttl_seconds=self.astronomy_ttl
+            )
+            return result
+
+        except CircuitOpenError:
+            return self._astronomy_fallback(lat, lon, date)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "upstream fetch failed", endpoint="astronomy", error=str(e))
+
+        # Fallback data, cached with a shorter TTL
+        result = self._astronomy_fallback(lat, lon, date)
+        await async_cache.set(cache_key, result, self.astronomy_fallback_ttl)
+        return result
+
+    async def get_visibility_inputs(self, lat: float, lon: float, date: str) -> Tuple[Dict, int, List[str]]:
+        """
+        Fetch astronomy data and the hourly forecast concurrently
+
+        Returns (astronomy_data, cloud_cover, degraded_inputs), with cloud
+        cover averaged over the night's darkness window
+        """
+        astronomy_data, record = await asyncio.gather(
+            self.get_astronomy_data(lat, lon, date),
+            self.get_hourly_forecast(lat, lon, date)
+        )
+        return astronomy_data, self.night_cloud_cover(record, astronomy_data), self.degraded_inputs(astronomy_data, record)
+
+    async def get_night_hourly(self, lat: float, lon: float, date: str) -> Tuple[Optional[HourlyForecast], Optional[HourlyForecast]]:
+        """
+        Hourly records for the date and the day after, which together
+        cover the whole night starting on the date
+
+        Returns (tonight, tomorrow), either None if upstream fails
+        """
+        iso_date = self._format_date(date)
+        next_date = (datetime.strptime(iso_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        tonight, tomorrow = await asyncio.gather(
+            self.get_hourly_forecast(lat, lon, iso_date),
+            self.get_hourly_forecast(lat, lon, next_date)
+        )
+        return tonight, tomorrow
+
+    async def inputs_soft_expiry(self, lat: float, lon: float, iso_dates: List[str]) -> float:
+        """
+        Epoch time at which the first of the cached inputs behind a
+        response for these dates goes stale; 0 if any is missing, so a
+        response computed from fallbacks is never treated as fresh.
+        Usually answered from L1, as the inputs were just read.
+        """
+        keys = [self._cache_location("hourly", lat, lon, d, d)[0] for d in iso_dates]
+        if self.astronomy_source != "local":
+            keys.append(self._cache_location("astronomy", lat, lon, iso_dates[0], iso_dates[0])[0])
+
+        expiries = await asyncio.gather(*(async_cache.get_soft_expiry(key) for key in keys))
+        if any(expiry is None for expiry in expiries):
+            return 0.0
+        return min(expiries)
+
+    async def get_visibility_inputs_many(
+        self, queries: List[Tuple[float, float, str]]
+    ) -> Tuple[List[Tuple[Dict, int, List[str]]], Dict]:
+        """
+        Batch counterpart of get_visibility_inputs
+
+        Queries are deduplicated by cache key, all keys are read in one
+        pipelined round trip and misses are fetched concurrently (bounded
+        by batch_concurrency), each written back as soon as it arrives.
+
+        Returns ([(astronomy_data, cloud_cover, degraded_inputs), ...] aligned
+        with queries, stats)
+        """
+        stats = {"unique_keys": 0, "cache_hits": 0, "upstream_fetches": 0}
+
+        records = await self._get_many_cached(
+            "hourly", queries, self._request_hourly,
+            self.cloud_cover_ttl, self.cloud_cover_max_stale, lambda lat, lon, date: None, stats
+        )
+
+        if self.astronomy_source == "local":
+            astronomy = [self._local_astronomy(lat, lon, date) for lat, lon, date in queries]
+        else:
+            astronomy = await self._get_many_cached(
+                "astronomy", queries, self._request_astronomy_data,
+                self.astronomy_ttl, self.astronomy_max_stale, self._astronomy_fallback, stats
+            )
+
+        inputs = []
+        for record, astronomy_data in zip(records, astronomy):
+            hourly = HourlyForecast.unpack(record) if record is not None else None
+            inputs.append((
+                astronomy_data,
+                self.night_cloud_cover(hourly, astronomy_data),
+                self.degraded_inputs(astronomy_data, hourly)
+            ))
+        return inputs, stats
+
+    async def get_hourly_forecast_days(
+        self, lat: float, lon: float, days: int
+    ) -> Tuple[List[Tuple[str, Optional[HourlyForecast]]], Dict]:
+        """
+        Hourly forecast records for the next `days` days starting today
+
+        Reads every day's hourly entry in one pipelined round trip.
+        If any is missing, makes a single multi-day forecast request (one
+        across workers too) and splits it into per-day hourly records,
+        which also warms the single-day get_hourly_forecast path.
+
+        Returns ([(YYYY-MM-DD, record or None), ...], stats)
+        """
+        # Upstream's forecast starts at the location's local date
+        now = datetime.now(timezone.utc)
+        today = (now + timedelta(hours=ephemeris.utc_offset_hours(lat, lon, now.strftime("%Y-%m-%d")))).date()
+        dates = [(today + timedelta(days=i)).isoformat() for i in range(days)]
+        resolved = [self._cache_location("hourly", lat, lon, d, d) for d in dates]
+        keys = [cache_key for cache_key, _, _, _ in resolved]
+        cell_id, query_lat, query_lon = cache.location_cell("hourly", lat, lon)
+
+        cached = await async_cache.get_many(keys)
+        if all(value is not None for value in cached):
+            nights = [(d, HourlyForecast.unpack(value)) for d, value in zip(dates, cached)]
+            return nights, {"cache_hits": days, "upstream_fetches": 0}
+
+        # One upstream request per cell/start date/length, however many callers
+        forecast_key = cache._generate_key("forecast", cell=cell_id, date=dates[0], days=days)
+        keys_by_date = dict(zip(dates, keys))
+        fetched_here = []
+
+        async def fetch() -> List[str]:
+            """
+            Fetch and cache every day, then leave forecast_key naming the
+            days written; all before the single-flight lock is released, so
+            workers waiting on it re-read the days instead of fetching
+            """
+            by_date = await self._request_hourly_forecast(query_lat, query_lon, days)
+            fetched_here.append(True)
+            written = [d for d in dates if d in by_date]
+            await async_cache.set_many(
+                ((keys_by_date[d], by_date[d], self.cloud_cover_ttl + self.cloud_cover_max_stale) for d in written),
+                soft_ttl_seconds=self.cloud_cover_ttl
+            )
+            await async_cache.set(forecast_key, written, max(1, single_flight.lock_ttl_ms // 1000))
+            return written
+
+        written: List[str] = []
+        # Skip upstream while its circuit is open or if this request failed moments ago
+        if not self.upstream_down(FORECAST_DAYS) and not await self._recently_failed(forecast_key):
+            try:
+                written = await single_flight.do_async(forecast_key, fetch)
+            except CircuitOpenError:
+                pass
+            except Exception as e:
+                log_event(logger, logging.WARNING, "upstream fetch failed", endpoint="forecast_days", error=str(e))
+                await async_cache.set(self._negative_key(forecast_key), 1, self.negative_ttl)
+
+        by_date = {}
+        if written:
+            by_date = dict(zip(written, await async_cache.get_many([keys_by_date[d] for d in written])))
+        records = [by_date.get(d) or value for d, value in zip(dates, cached)]
+        nights = [
+            (d, HourlyForecast.unpack(record) if record is not None else None)
+            for d, record in zip(dates, records)
+        ]
+        hits = sum(value is not None for value in cached)
+        return nights, {"cache_hits": hits, "upstream_fetches": len(fetched_here)}
+
+    async def _request_hourly_forecast(self, lat: float, lon: float, days: int) -> Dict[str, bytes]:
+        """Fetch several days at once (hedged); returns {date: packed hourly record}"""
+        async def call(provider: WeatherProvider) -> Dict[str, bytes]:
+            data = await self._provider_get(provider, FORECAST_DAYS, provider.forecast_request(lat, lon, days))
+            return provider.parse_forecast(data)
+
+        return await self._hedged(FORECAST_DAYS, call)
+
+    async def get_cloud_cover_many(
+        self,
+        queries: List[Tuple[float, float, str]],
+        max_fetches: Optional[int] = None
+    ) -> Tuple[List[Optional[int]], Dict]:
+        """
+        Cloud cover for many (lat, lon, date) queries through the batched
+        cache path. At most max_fetches upstream requests are made.
+
+        Returns (cloud_covers aligned with queries, stats); a query with no
+        hourly record (past the fetch budget, or upstream failing) has None
+        rather than a made-up default
+        """
+        stats = {"unique_keys": 0, "cache_hits": 0, "upstream_fetches": 0}
+        records = await self._get_many_cached(
+            "hourly", queries, self._request_hourly,
+            self.cloud_cover_ttl, self.cloud_cover_max_stale, lambda lat, lon, date: None, stats, max_fetches
+        )
+
+        # Cells sharing a cache entry share the record, so average each once
+        cloud_by_record: Dict[bytes, int] = {}
+        for record in records:
+            if record is not None and record not in cloud_by_record:
+                cloud_by_record[record] = self.night_cloud_cover(HourlyForecast.unpack(record))
+        return [cloud_by_record.get(record) if record is not None else None for record in records], stats
+
+    async def _get_many_cached(
+        self,
+        prefix: str,
+        queries: List[Tuple[float, float, str]],
+        request: Callable[[float, float, str], Awaitable],
+        ttl_seconds: int,
+        max_stale_seconds: int,
+        fallback: Callable,
+        stats: Dict,
+        max_fetches: Optional[int] = None
+    ) -> List:
+        # Collapse queries onto distinct cache keys (same cell and date),
+        # normalizing each distinct date string only once
+        iso_dates = {date: self._format_date(date) for date in {date for _, _, date in queries}}
+        resolved = [
+            self._cache_location(prefix, lat, lon, date, iso_dates[date])
+            for lat, lon, date in queries
+        ]
+        unique: Dict[str, Tuple[float, float, str]] = {}
+        for (cache_key, _, query_lat, query_lon), (_, _, date) in zip(resolved, queries):
+            unique.setdefault(cache_key, (query_lat, query_lon, date))
+
+        keys = list(unique)
+        values = {}
+        for key, entry in zip(keys, await async_cache.get_many_entries(keys)):
+            if entry is None:
+                continue
+            values[key], stale = entry
+            if stale:
+                self._refresh_in_background(key, self._cached_request(key, request, ttl_seconds, max_stale_seconds, *unique[key]))
+        misses = [key for key in keys if key not in values]
+
+        # Over the fetch budget, remaining misses are served from the fallback
+        skipped = 0
+        if max_fetches is not None and len(misses) > max_fetches:
+            skipped = len(misses) - max_fetches
+            for key in misses[max_fetches:]:
+                values[key] = fallback(*unique[key])
+            misses = misses[:max_fetches]
+            stats["skipped_fetches"] = stats.get("skipped_fetches", 0) + skipped
+
+        # Keys that failed upstream moments ago, or all of them while every
+        # provider's circuit is open, go straight to the fallback
+        operation = FORECAST if prefix == "hourly" else prefix
+        failing: Set[str] = set()
+        if misses and self.upstream_down(operation):
+            failing = set(misses)
+        elif misses:
+            markers = await async_cache.get_many([self._negative_key(key) for key in misses])
+            failing = {key for key, marker in zip(misses, markers) if marker is not None}
+            if failing:
+                NEGATIVE_CACHE_HITS.labels(prefix).inc(len(failing))
+        for key in failing:
+            values[key] = fallback(*unique[key])
+        misses = [key for key in misses if key not in failing]
+        if failing:
+            stats["fallbacks"] = stats.get("fallbacks", 0) + len(failing)
+
+        stats["unique_keys"] += len(keys)
+        stats["cache_hits"] += len(keys) - len(misses) - skipped - len(failing)
+        stats["upstream_fetches"] += len(misses)
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        fetched: Dict = {}
+        failed: List[str] = []
+
+        async def fetch(key: str) -> None:
+            lat, lon, date = unique[key]
+            async with semaphore:
+                try:
+                    # Written back inside the single-flight fetch, so workers
+                    # waiting on its lock find the value once it's released
+                    fetched[key] = await single_flight.do_async(
+                        key, self._cached_request(key, request, ttl_seconds, max_stale_seconds, lat, lon, date)
+                    )
+                    values[key] = fetched[key]
+                except CircuitOpenError:
+                    values[key] = fallback(lat, lon, date)
+                except Exception as e:
+                    log_event(logger, logging.WARNING, "upstream fetch failed", namespace=prefix, lat=lat, lon=lon, date=date, error=str(e))
+                    values[key] = fallback(lat, lon, date)
+                    failed.append(key)
+
+        await asyncio.gather(*(fetch(key) for key in misses))
+        await async_cache.set_many((self._negative_key(key), 1, self.negative_ttl) for key in failed)
+        if len(misses) > len(fetched):
+            stats["fallbacks"] = stats.get("fallbacks", 0) + len(misses) - len(fetched)
+
+        return [values[cache_key] for cache_key, _, _, _ in resolved]
+
+    def _cached_request(self, cache_key: str, request: Callable[[float, float, str], Awaitable],
+                        ttl_seconds: int, max_stale_seconds: int,
+                        lat: float, lon: float, date: str) -> Callable[[], Awaitable]:
+        """Wrap an upstream request so its result is written back to cache_key"""
+        async def fetch():
+            value = await request(lat, lon, date)
+            await async_cache.set(cache_key, value, ttl_seconds + max_stale_seconds, soft_ttl_seconds=ttl_seconds)
+            return value
+        return fetch
@@ -0,0 +1,198 @@
+"""
+Weather Providers
+Upstream weather APIs behind one interface: each knows how to ask for
+hourly forecasts (and astronomy, if it has it) and normalizes its
+answers into packed HourlyForecast records
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+from app.services.hourly import HOURS, HourlyForecast
+
+# Operations a provider can serve
+FORECAST = "forecast"            # one local day of hourly weather
+FORECAST_DAYS = "forecast_days"  # several days from today in one request
+ASTRONOMY = "astronomy"          # sun and moon times, moon illumination
+
+Request = Tuple[str, Dict]  # (absolute url, query params)
+
+
+class WeatherProvider:
+    """
+    One upstream weather API
+
+    Providers only build requests and parse responses; the service does
+    the HTTP itself, so every provider shares its pooled client, circuit
+    breakers and metrics. Breakers are per provider and operation (see
+    endpoint()), so one provider being down doesn't trip the other's.
+    """
+
+    name = ""
+    supports_astronomy = False
+
+    def supports(self, operation: str) -> bool:
+        return operation != ASTRONOMY or self.supports_astronomy
+
+    def endpoint(self, operation: str) -> str:
+        """Circuit breaker and metrics label for an operation, e.g. weatherapi_forecast"""
+        return f"{self.name}_{operation}"
+
+    def hourly_request(self, lat: float, lon: float, iso_date: str) -> Request:
+        """Request for one local day of hourly weather"""
+        raise NotImplementedError
+
+    def forecast_request(self, lat: float, lon: float, days: int) -> Request:
+        """Request for `days` days of hourly weather starting at the location's today"""
+        raise NotImplementedError
+
+    def parse_forecast(self, data: Dict) -> Dict[str, bytes]:
+        """{YYYY-MM-DD: packed HourlyForecast} for every day in a forecast response"""
+        raise NotImplementedError
+
+    def parse_hourly(self, data: Dict, iso_date: str) -> bytes:
+        """Packed HourlyForecast for iso_date from an hourly_request response"""
+        days = self.parse_forecast(data)
+        if iso_date not in days:
+            raise ValueError(f"{self.name} response has no hours for {iso_date}")
+        return days[iso_date]
+
+    def astronomy_request(self, lat: float, lon: float, iso_date: str) -> Request:
+        raise NotImplementedError(f"{self.name} has no astronomy data")
+
+    def parse_astronomy(self, data: Dict) -> Dict:
+        """Astronomy dict (moon_illumination 0-1, moon_phase, sun/moon times); raises if missing"""
+        raise NotImplementedError(f"{self.name} has no astronomy data")
+
+
+class WeatherApiProvider(WeatherProvider):
+    """weatherapi.com: forecast.json for hourly weather, astronomy.json for sun and moon"""
+
+    name = "weatherapi"
+    supports_astronomy = True
+
+    def __init__(self) -> None:
+        self.api_key = os.getenv("WEATHER_API_KEY", "")
+        # Overridable to point at a local stub (see benchmarks/stub_weather.py)
+        self.base_url = os.getenv("WEATHER_API_BASE_URL", "https://api.weatherapi.com/v1")
+
+    def hourly_request(self, lat: float, lon: float, iso_date: str) -> Request:
+        return f"{self.base_url}/forecast.json", {
+            "key": self.api_key,
+            "q": f"{lat},{lon}",
+            "dt": iso_date,
+            "aqi": "no"
+        }
+
+    def forecast_request(self, lat: float, lon: float, days: int) -> Request:
+        return f"{self.base_url}/forecast.json", {
+            "key": self.api_key,
+            "q": f"{lat},{lon}",
+            "days": days,
+            "aqi": "no",
+            "alerts": "no"
+        }
+
+    def parse_forecast(self, data: Dict) -> Dict[str, bytes]:
+        forecast_days = data.get("forecast", {}).get("forecastday", [])
+        if not forecast_days:
+            raise ValueError("forecast.json response has no forecastday")
+        return {
+            forecast_day["date"]: HourlyForecast.from_forecast_day(forecast_day).pack()
+            for forecast_day in forecast_days
+            if "date" in forecast_day
+        }
+
+    def astronomy_request(self, lat: float, lon: float, iso_date: str) -> Request:
+        return f"{self.base_url}/astronomy.json", {
+            "key": self.api_key,
+            "q": f"{lat},{lon}",
+            "dt": iso_date
+        }
+
+    def parse_astronomy(self, data: Dict) -> Dict:
+        astro = data.get("astronomy", {}).get("astro")
+        if astro is None:
+            raise ValueError("astronomy.json response has no astro data")
+
+        return {
+            "moon_illumination": int(astro.get("moon_illumination", 50)) / 100,
+            "moon_phase": astro.get("moon_phase", "Unknown"),
+            "sunrise": astro.get("sunrise", "06:00 AM"),
+            "sunset": astro.get("sunset", "06:00 PM"),
+            "moonrise": astro.get("moonrise", "08:00 PM"),
+            "moonset": astro.get("moonset", "08:00 AM")
+        }
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Open-Meteo style /forecast: parallel hourly arrays keyed by variable,
+    in the location's local time (timezone=auto). No astronomy data.
+    """
+
+    name = "openmeteo"
+
+    # (HourlyForecast field, Open-Meteo variable, factor to the field's unit)
+    _VARIABLES: Tuple[Tuple[str, str, float], ...] = (
+        ("cloud", "cloud_cover", 1.0),
+        ("humidity", "relative_humidity_2m", 1.0),
+        ("visibility_km", "visibility", 0.001),  # metres
+        ("precip_mm", "precipitation", 1.0)
+    )
+
+    def __init__(self) -> None:
+        self.base_url = os.getenv("OPEN_METEO_BASE_URL", "https://api.open-meteo.com/v1")
+        # Only needed for the commercial endpoint
+        self.api_key = os.getenv("OPEN_METEO_API_KEY", "")
+
+    def _params(self, lat: float, lon: float) -> Dict:
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": ",".join(variable for _, variable, _ in self._VARIABLES),
+            "timezone": "auto"
+        }
+        if self.api_key:
+            params["apikey"] = self.api_key
+        return params
+
+    def hourly_request(self, lat: float, lon: float, iso_date: str) -> Request:
+        return f"{self.base_url}/forecast", {**self._params(lat, lon), "start_date": iso_date, "end_date": iso_date}
+
+    def forecast_request(self, lat: float, lon: float, days: int) -> Request:
+        return f"{self.base_url}/forecast", {**self._params(lat, lon), "forecast_days": days}
+
+    def parse_forecast(self, data: Dict) -> Dict[str, bytes]:
+        hourly = data.get("hourly") or {}
+        times: List[str] = hourly.get("time") or []
+        if not times:
+            raise ValueError("Open-Meteo response has no hourly times")
+
+        # Split the flat arrays into local days; "YYYY-MM-DDTHH:MM"
+        days: Dict[str, Dict[str, List[Optional[float]]]] = {}
+        for i, stamp in enumerate(times):
+            day = days.get(stamp[:10])
+            if day is None:
+                day = days[stamp[:10]] = {field: [None] * HOURS for field, _, _ in self._VARIABLES}
+            hour = int(stamp[11:13])
+            for field, variable, factor in self._VARIABLES:
+                series = hourly.get(variable) or ()
+                if i < len(series) and series[i] is not None:
+                    day[field][hour] = series[i] * factor
+
+        return {iso_date: HourlyForecast.from_values(values).pack() for iso_date, values in days.items()}
+
+
+PROVIDERS = {
+    WeatherApiProvider.name: WeatherApiProvider,
+    OpenMeteoProvider.name: OpenMeteoProvider
+}
+
+
+def create_provider(name: str) -> WeatherProvider:
+    """Provider for a WEATHER_PROVIDER name ("weatherapi" or "openmeteo")"""
+    provider = PROVIDERS.get(name.lower().replace("-", ""))
+    if provider is None:
+        raise ValueError(f"Unknown weather provider {name!r}, expected one of: {', '.join(PROVIDERS)}")
+    return provider()
@@ -0,0 +1,93 @@
+"""
+Astronomy micro-benchmark: local ephemeris engine vs the astronomy.json API path
+
+Usage:
+    python -m benchmarks.bench_astronomy [--locations 1000] [--api-requests 20]
+
+The API path is only measured when WEATHER_API_KEY is set.
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import date, timedelta
+
+import httpx
+import numpy as np
+
+from app.services import ephemeris
+
+
+def _timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(name: str, samples_ms: list, per_call: int = 1) -> None:
+    median = statistics.median(samples_ms)
+    print(f"{name:<36} median {median:9.3f} ms   per item {median / per_call * 1000:9.1f} us")
+
+
+def bench_local(locations: int) -> None:
+    rng = np.random.default_rng(42)
+    today = date.today()
+
+    # Scalar path, bypassing the lru_cache so every call computes
+    scalar = ephemeris.astronomy_for.__wrapped__
+    _report("local, single location", _timed(lambda: scalar(-1.2944, 36.8362, today.isoformat()), 200))
+
+    lats = rng.uniform(-60, 60, locations)
+    lons = rng.uniform(-180, 180, locations)
+    dates = [today + timedelta(days=int(i)) for i in rng.integers(0, 30, locations)]
+    _report(
+        f"local, vectorized x{locations}",
+        _timed(lambda: ephemeris.astronomy_for_many(lats, lons, dates), 10),
+        per_call=locations
+    )
+
+    same_day = [today] * locations
+    _report(
+        f"local, vectorized x{locations} same date",
+        _timed(lambda: ephemeris.astronomy_for_many(lats, lons, same_day), 10),
+        per_call=locations
+    )
+
+
+def bench_api(requests: int) -> None:
+    api_key = os.getenv("WEATHER_API_KEY", "").strip()
+    if not api_key:
+        print("astronomy.json API path skipped (WEATHER_API_KEY not set)")
+        return
+
+    params = {"key": api_key, "q": "-1.2944,36.8362", "dt": date.today().isoformat()}
+    with httpx.Client(base_url="https://api.weatherapi.com/v1", timeout=10.0) as client:
+        client.get("/astronomy.json", params=params)  # warm the connection
+        _report(
+            "api, pooled connection",
+            _timed(lambda: client.get("/astronomy.json", params=params).raise_for_status(), requests)
+        )
+
+    def cold() -> None:
+        with httpx.Client(timeout=10.0) as client:
+            client.get("https://api.weatherapi.com/v1/astronomy.json", params=params).raise_for_status()
+
+    _report("api, new connection per call", _timed(cold, requests))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--locations", type=int, default=1000)
+    parser.add_argument("--api-requests", type=int, default=20)
+    args = parser.parse_args()
+
+    bench_local(args.locations)
+    bench_api(args.api_requests)
+
+
+if __name__ == "__main__":
+    main()
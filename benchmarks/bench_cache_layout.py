@@ -0,0 +1,188 @@
+"""
+Redis storage layouts for location keys: one string per (cell, date)
+(CACHE_LAYOUT=keys) against one hash per cell (CACHE_LAYOUT=hash),
+for single-date lookups and a 14-night lookup of one site
+
+Usage:
+    python -m benchmarks.bench_cache_layout [--cells 500] [--days 14] [--lookups 2000]
+
+Each layout is filled with packed hourly records, then read with L1
+disabled so every lookup goes to Redis. Reported per lookup: round trips,
+commands, bytes sent and received (RESP2 framing), and time. Redis memory
+(MEMORY USAGE over every key) is only reported against a real server
+(REDIS_BACKEND=redis); the in-memory stand-in can't measure it.
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("REDIS_BACKEND", "memory")
+
+from app.services.hourly import HourlyForecast  # noqa: E402
+from app.services.redis_cache import RedisCache  # noqa: E402
+from benchmarks.report import percentile  # noqa: E402
+from benchmarks.stub_weather import _forecast_day  # noqa: E402
+
+
+class _Wire:
+    """Counts round trips and bytes on a redis-py connection class"""
+
+    def __init__(self, connection_class: type) -> None:
+        self.connection_class = connection_class
+        self.round_trips = 0
+        self.commands = 0
+        self.sent = 0
+        self.received = 0
+        self._send = connection_class.send_packed_command
+        self._read = connection_class.read_response
+
+    def install(self) -> None:
+        wire, send, read = self, self._send, self._read
+
+        def send_packed_command(connection, command, check_health=True):
+            chunks = command if isinstance(command, (list, tuple)) else [command]
+            wire.round_trips += 1
+            wire.sent += sum(len(chunk) for chunk in chunks)
+            return send(connection, command, check_health)
+
+        def read_response(connection, *args, **kwargs):
+            reply = read(connection, *args, **kwargs)
+            wire.commands += 1
+            wire.received += _resp_size(reply)
+            return reply
+
+        self.connection_class.send_packed_command = send_packed_command
+        self.connection_class.read_response = read_response
+
+    def uninstall(self) -> None:
+        self.connection_class.send_packed_command = self._send
+        self.connection_class.read_response = self._read
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"round_trips": self.round_trips, "commands": self.commands, "sent": self.sent, "received": self.received}
+
+
+def _resp_size(reply: Any) -> int:
+    """Bytes a reply takes on the wire in RESP2"""
+    if reply is None:
+        return 5
+    if isinstance(reply, (bytes, str)):
+        data = reply.encode() if isinstance(reply, str) else reply
+        return len(str(len(data))) + len(data) + 5
+    if isinstance(reply, (bool, int)):
+        return len(str(int(reply))) + 3
+    if isinstance(reply, (list, tuple)):
+        return len(str(len(reply))) + 3 + sum(_resp_size(item) for item in reply)
+    return len(str(reply)) + 3
+
+
+def _per_lookup(wire: _Wire, before: Dict[str, int], lookups: int, seconds: List[float]) -> Dict:
+    after = wire.snapshot()
+    seconds = sorted(seconds)
+    return {
+        **{name: round((after[name] - before[name]) / lookups, 2) for name in after},
+        "p50_us": round(percentile(seconds, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(seconds, 0.99) * 1e6, 1)
+    }
+
+
+def _redis_memory(cache: RedisCache) -> Optional[int]:
+    """MEMORY USAGE summed over every key, None where unsupported"""
+    try:
+        keys = list(cache.redis_client.scan_iter(count=1000))
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        return sum(pipe.execute())
+    except Exception:
+        return None
+
+
+def run_layout(layout: str, cells: int, days: int, lookups: int, seed: int) -> Dict:
+    os.environ["CACHE_LAYOUT"] = layout
+    # L1 off, so every lookup is a Redis lookup
+    os.environ["L1_CACHE_MAX_ENTRIES"] = "0"
+    cache = RedisCache()
+    cache.connect()
+    cache.redis_client.flushdb()
+
+    first = date.today()
+    dates = [(first + timedelta(days=i)).isoformat() for i in range(days)]
+    rng = random.Random(seed)
+    sites = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(cells)]
+    record = HourlyForecast.from_forecast_day(_forecast_day("0,0", first)).pack()
+
+    wire = _Wire(cache.redis_client.connection_pool.connection_class)
+    wire.install()
+    try:
+        cache.redis_client.ping()  # Connect outside the measurements
+
+        before = wire.snapshot()
+        for lat, lon in sites:
+            cache.set_many([(cache.location_key("hourly", lat, lon, d), record, 86400) for d in dates], 3600)
+        writes = _per_lookup(wire, before, cells, [])
+
+        single: List[float] = []
+        before = wire.snapshot()
+        for _ in range(lookups):
+            lat, lon = rng.choice(sites)
+            key = cache.location_key("hourly", lat, lon, rng.choice(dates))
+            start = time.perf_counter()
+            entry = cache.get_entry(key)
+            single.append(time.perf_counter() - start)
+            assert entry is not None
+        single_date = _per_lookup(wire, before, lookups, single)
+
+        multi: List[float] = []
+        before = wire.snapshot()
+        for _ in range(lookups):
+            lat, lon = rng.choice(sites)
+            keys = [cache.location_key("hourly", lat, lon, d) for d in dates]
+            start = time.perf_counter()
+            entries = cache.get_many_entries(keys)
+            multi.append(time.perf_counter() - start)
+            assert all(entry is not None for entry in entries)
+        multi_date = _per_lookup(wire, before, lookups, multi)
+    finally:
+        wire.uninstall()
+
+    memory = _redis_memory(cache)
+    keys = int(cache.redis_client.dbsize())
+    return {
+        "redis_keys": keys,
+        "redis_memory_bytes": memory,
+        "memory_bytes_per_entry": round(memory / (cells * days), 1) if memory else None,
+        f"write_{days}_per_site": {name: value for name, value in writes.items() if not name.endswith("_us")},
+        "single_date": single_date,
+        f"multi_date_{days}": multi_date
+    }
+
+
+def run(cells: int = 500, days: int = 14, lookups: int = 2000, seed: int = 42) -> Dict:
+    saved = {name: os.environ.get(name) for name in ("CACHE_LAYOUT", "L1_CACHE_MAX_ENTRIES")}
+    try:
+        return {layout: run_layout(layout, cells, days, lookups, seed) for layout in ("keys", "hash")}
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=500)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.cells, args.days, args.lookups), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Light-pollution raster lookups: time to map the file, single-point
+lookups and bulk lookups, on a synthetic global raster
+
+Usage:
+    python -m benchmarks.bench_light_pollution [--cell-size 0.05] [--points 100000]
+
+Resident memory is reported before and after the lookups: the raster is
+paged in on demand rather than loaded, and the pages it touches are
+file-backed page cache shared with every other process mapping the file.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.light_pollution import LightPollutionRaster, write_raster
+from benchmarks.report import percentile
+
+
+def _rss_mb() -> Optional[float]:
+    """Current resident memory (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def run(cell_size: float = 0.05, points: int = 100000, seed: int = 42) -> Dict:
+    width, height = int(round(360 / cell_size)), int(round(180 / cell_size))
+    rng = np.random.default_rng(seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "light_pollution.lpr")
+        # Written row band by row band so building the file doesn't need it all in RAM
+        values = np.memmap(os.path.join(directory, "values.u8"), dtype=np.uint8, mode="w+", shape=(height, width))
+        for start in range(0, height, 512):
+            values[start:start + 512] = rng.integers(0, 255, (min(512, height - start), width), dtype=np.uint8)
+        write_raster(path, values, -180.0, 90.0, cell_size, 100 / 254, 255)
+        del values
+
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        raster = LightPollutionRaster(path)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        lats = rng.uniform(-90, 90, points)
+        lons = rng.uniform(-180, 180, points)
+        pairs = list(zip(lats.tolist(), lons.tolist()))[:20000]
+
+        samples = []
+        for lat, lon in pairs:
+            t = time.perf_counter()
+            raster.lookup(lat, lon)
+            samples.append(time.perf_counter() - t)
+
+        bulk = []
+        for _ in range(5):
+            t = time.perf_counter()
+            raster.lookup_many(lats, lons, 0.5)
+            bulk.append(time.perf_counter() - t)
+        bulk_seconds = min(bulk)
+
+        result = {
+            "raster": {"width": width, "height": height, "file_mb": round(os.path.getsize(path) / 2**20, 1)},
+            "open_ms": round(open_ms, 3),
+            "single_lookup": {
+                "count": len(samples),
+                "p50_us": round(percentile(sorted(samples), 0.50) * 1e6, 3),
+                "p99_us": round(percentile(sorted(samples), 0.99) * 1e6, 3)
+            },
+            "bulk_lookup": {
+                "points": points,
+                "total_ms": round(bulk_seconds * 1000, 3),
+                "ns_per_point": round(bulk_seconds / points * 1e9, 1)
+            },
+            "rss_mb_before_open": rss_before,
+            "rss_mb_after_lookups": _rss_mb()
+        }
+        raster.close()
+        return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cell-size", type=float, default=0.05)
+    parser.add_argument("--points", type=int, default=100000)
+    args = parser.parse_args()
+
+    result = run(args.cell_size, args.points)
+    single = result["single_lookup"]
+    print(f"raster {result['raster']['width']}x{result['raster']['height']} ({result['raster']['file_mb']} MB)")
+    print(f"open (mmap)            {result['open_ms']:10.3f} ms")
+    print(f"single lookup          p50 {single['p50_us']:8.3f} us   p99 {single['p99_us']:8.3f} us")
+    print(f"bulk lookup x{args.points:<9} {result['bulk_lookup']['total_ms']:10.3f} ms   {result['bulk_lookup']['ns_per_point']:8.1f} ns/point")
+    print(f"RSS                    {result['rss_mb_before_open']} MB before open, "
+          f"{result['rss_mb_after_lookups']} MB after lookups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmarks for the per-request hot path: scoring, cache key
+generation, date parsing and cache value (de)serialization
+
+Usage:
+    python -m benchmarks.bench_micro [--number 2000] [--repeat 7]
+
+Runs against the in-memory Redis backend unless REDIS_BACKEND is set.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date
+from typing import Callable, Dict
+
+os.environ.setdefault("REDIS_BACKEND", "memory")
+
+from app.api.visibility import build_visibility_response, weather_service  # noqa: E402
+from app.services.ephemeris import astronomy_for  # noqa: E402
+from app.services.hourly import HourlyForecast  # noqa: E402
+from app.services.redis_cache import cache  # noqa: E402
+from app.services.visibility_score import calculate_visibility_score  # noqa: E402
+from benchmarks.stub_weather import _forecast_day  # noqa: E402
+
+
+def measure(fn: Callable[[], object], number: int, repeat: int) -> Dict[str, float]:
+    """
+    Time repeat batches of number calls; per-call figures come from the
+    fastest and median batch
+    """
+    batches = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        batches.append((time.perf_counter() - start) / number)
+    batches.sort()
+    best, median = batches[0], batches[len(batches) // 2]
+    return {
+        "ops_per_sec": round(1 / median),
+        "best_us": round(best * 1e6, 3),
+        "median_us": round(median * 1e6, 3)
+    }
+
+
+def run(number: int = 2000, repeat: int = 7) -> Dict[str, Dict[str, float]]:
+    iso_date = "2026-10-17"
+    astronomy = astronomy_for(-1.2944, 36.8362, iso_date)
+    response = build_visibility_response(-1.2944, 36.8362, iso_date, astronomy, 35)
+    response_json = json.dumps(response)
+    record = HourlyForecast.from_forecast_day(_forecast_day("-1.2944,36.8362", date.fromisoformat(iso_date)))
+    packed = record.pack()
+    _, astronomy_raw = cache._encode(astronomy, 86400)
+    _, hourly_raw = cache._encode(packed, 3600)
+
+    cases = {
+        "score.calculate_visibility_score": lambda: calculate_visibility_score(35, 42, 9.5, 0.5),
+        "key.location_key": lambda: cache.location_key("hourly", -1.2944, 36.8362, iso_date),
+        "key.generate_key": lambda: cache._generate_key("astronomy", lat=-1.2944, lon=36.8362, date=iso_date),
+        "date.format_iso": lambda: weather_service._format_date(iso_date),
+        "date.format_us": lambda: weather_service._format_date("10/17/2026"),
+        "json.dumps_response": lambda: json.dumps(response),
+        "json.loads_response": lambda: json.loads(response_json),
+        "cache.encode_astronomy": lambda: cache._encode(astronomy, 86400),
+        "cache.decode_astronomy": lambda: cache._decode(astronomy_raw),
+        "cache.encode_hourly": lambda: cache._encode(packed, 3600),
+        "cache.decode_hourly": lambda: cache._decode(hourly_raw),
+        "hourly.unpack_and_average": lambda: HourlyForecast.unpack(packed).cloud_cover()
+    }
+    return {name: measure(fn, number, repeat) for name, fn in cases.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    for name, result in run(args.number, args.repeat).items():
+        print(f"{name:<36} {result['ops_per_sec']:12,} ops/s   median {result['median_us']:9.3f} us")
+
+
+if __name__ == "__main__":
+    main()
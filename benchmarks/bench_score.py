@@ -0,0 +1,55 @@
+"""
+Visibility-score benchmark: cells per second for the scalar loop vs the
+vectorized kernel
+
+Usage:
+    python -m benchmarks.bench_score [--cells 65536]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.visibility_score import calculate_visibility_score, calculate_visibility_scores
+
+
+def _cells_per_second(fn, cells: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return cells / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=65536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    cloud = rng.uniform(0, 100, args.cells)
+    moon = rng.uniform(0, 100, args.cells)
+    darkness = rng.uniform(0, 12, args.cells)
+    pollution = rng.uniform(0, 1, args.cells)
+
+    def scalar_loop() -> None:
+        for values in zip(cloud.tolist(), moon.tolist(), darkness.tolist(), pollution.tolist()):
+            calculate_visibility_score(*values)
+
+    results = {
+        "scalar loop": _cells_per_second(scalar_loop, args.cells),
+        "vectorized": _cells_per_second(lambda: calculate_visibility_scores(cloud, moon, darkness, pollution), args.cells),
+        "vectorized + explanations": _cells_per_second(
+            lambda: calculate_visibility_scores(cloud, moon, darkness, pollution, explain=True), args.cells
+        )
+    }
+
+    baseline = results["scalar loop"]
+    for name, rate in results.items():
+        print(f"{name:<28} {rate:14,.0f} cells/s   {rate / baseline:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cold start: time from spawning the server to its first answer on /livez,
+its first ready /readyz, every worker ready, and how long it takes to
+stop on SIGTERM (drain included)
+
+Scenarios:
+- import: importing app.main alone, in a fresh interpreter
+- uvicorn: one uvicorn worker
+- redis_down: one uvicorn worker with nothing listening at REDIS_HOST
+- gunicorn_preload / gunicorn_fork: --workers gunicorn workers with and
+  without preload_app (skipped if gunicorn isn't installed)
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 3] [--workers 4]
+
+Runs on the in-memory Redis backend with upstream pre-warming off, so no
+network is needed. Times are medians over --runs, in seconds.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.load_visibility import _free_port
+
+
+def _import_seconds(env: Dict[str, str]) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _measure(command: Callable[[int], List[str]], env: Dict[str, str], workers: int, timeout: float) -> Dict:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(command(port), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    live: Optional[float] = None
+    ready: Optional[float] = None
+    all_ready: Optional[float] = None
+    ready_pids = set()
+    try:
+        while all_ready is None and time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode} during startup")
+            try:
+                if live is None:
+                    if httpx.get(f"{url}/livez", timeout=0.5).status_code == 200:
+                        live = time.perf_counter() - start
+                else:
+                    # New connection per poll, so the probes spread over the workers
+                    response = httpx.get(f"{url}/readyz", timeout=0.5)
+                    if response.status_code == 200:
+                        ready = ready or time.perf_counter() - start
+                        ready_pids.add(response.json()["pid"])
+                        if len(ready_pids) >= workers:
+                            all_ready = time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.005)
+    finally:
+        stop_start = time.perf_counter()
+        process.terminate()
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stop = time.perf_counter() - stop_start
+
+    return {"live_s": live, "ready_s": ready, "all_ready_s": all_ready, "stop_s": stop}
+
+
+def _median(runs: List[Dict]) -> Dict:
+    summary = {}
+    for name in runs[0]:
+        values = [run[name] for run in runs if run[name] is not None]
+        summary[name] = round(statistics.median(values), 4) if values else None
+    return summary
+
+
+def run(runs: int = 3, workers: int = 4, timeout: float = 30.0) -> Dict:
+    env = {
+        **os.environ,
+        "REDIS_BACKEND": "memory",
+        "UPSTREAM_PREWARM": "false",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "warning")
+    }
+    uvicorn = lambda port: [  # noqa: E731
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"
+    ]
+    scenarios = {
+        "uvicorn": (uvicorn, env, 1),
+        "redis_down": (uvicorn, {**env, "REDIS_BACKEND": "redis", "REDIS_HOST": "127.0.0.1", "REDIS_PORT": str(_free_port())}, 1)
+    }
+
+    try:
+        import gunicorn  # noqa: F401
+        for name, preload in (("gunicorn_preload", "true"), ("gunicorn_fork", "false")):
+            gunicorn_command = lambda port: [  # noqa: E731
+                sys.executable, "-m", "gunicorn", "-c", "app/gunicorn_conf.py",
+                "--bind", f"127.0.0.1:{port}", "app.main:app"
+            ]
+            scenarios[name] = (
+                gunicorn_command,
+                {**env, "WEB_CONCURRENCY": str(workers), "GUNICORN_PRELOAD": preload, "SHUTDOWN_DRAIN_TIMEOUT": "5"},
+                workers
+            )
+    except ImportError:
+        pass
+
+    results = {"import_s": round(statistics.median(_import_seconds(env) for _ in range(runs)), 4)}
+    for name, (command, scenario_env, scenario_workers) in scenarios.items():
+        results[name] = _median([_measure(command, scenario_env, scenario_workers, timeout) for _ in range(runs)])
+        results[name]["workers"] = scenario_workers
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for every worker to be ready")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs, args.workers, args.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+End-to-end load generator for GET /visibility
+
+Without --url it starts its own stack: the stub weather API and the
+service (uvicorn) on the in-memory Redis backend, each in a subprocess.
+Two phases are measured against the same set of locations:
+- cold: cache cleared, each location requested once (every request misses)
+- warm: --requests requests over the same locations (all cache hits)
+
+Usage:
+    python -m benchmarks.load_visibility [--locations 200] [--requests 2000]
+        [--concurrency 32] [--latency-ms 80] [--jitter-ms 20] [--error-rate 0]
+        [--slow-rate 0] [--slow-ms 1000]
+    python -m benchmarks.load_visibility --url http://127.0.0.1:8000
+
+Both providers point at the stub, so hedging can be compared with e.g.
+    WEATHER_PROVIDER_SECONDARY=openmeteo python -m benchmarks.load_visibility --slow-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.report import summarize_ms
+
+Location = Tuple[float, float, str]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+@contextmanager
+def local_stack(latency_ms: float, jitter_ms: float, error_rate: float,
+                slow_rate: float = 0.0, slow_ms: float = 1000.0) -> Iterator[Tuple[str, str]]:
+    """Run the stub API and the service in subprocesses; yields (service_url, stub_url)"""
+    stub_port, app_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    env = {
+        **os.environ,
+        "STUB_LATENCY_MS": str(latency_ms),
+        "STUB_JITTER_MS": str(jitter_ms),
+        "STUB_ERROR_RATE": str(error_rate),
+        "STUB_SLOW_RATE": str(slow_rate),
+        "STUB_SLOW_MS": str(slow_ms),
+        "WEATHER_API_BASE_URL": f"{stub_url}/v1",
+        "OPEN_METEO_BASE_URL": f"{stub_url}/v1",
+        "WEATHER_API_KEY": os.getenv("WEATHER_API_KEY", "stub"),
+        "REDIS_BACKEND": os.getenv("REDIS_BACKEND", "memory"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "warning")
+    }
+    uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning", "--no-access-log"]
+    processes = [
+        subprocess.Popen(uvicorn + ["--port", str(stub_port), "benchmarks.stub_weather:app"], env=env),
+        subprocess.Popen(uvicorn + ["--port", str(app_port), "app.main:app"], env=env)
+    ]
+    try:
+        _wait_ready(f"{stub_url}/stats", processes[0])
+        _wait_ready(app_url, processes[1])
+        yield app_url, stub_url
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def make_locations(count: int, seed: int, date: str) -> List[Location]:
+    """Random land-or-sea points, far enough apart to land in different cache cells"""
+    rng = random.Random(seed)
+    return [(round(rng.uniform(-60, 60), 4), round(rng.uniform(-180, 180), 4), date) for _ in range(count)]
+
+
+async def run_phase(client: httpx.AsyncClient, queries: List[Location], concurrency: int) -> Dict:
+    """Closed-loop load: concurrency workers each send the next query as soon as the last returns"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for query in queries:
+        queue.put_nowait(query)
+
+    async def worker() -> None:
+        while True:
+            try:
+                lat, lon, date = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.get("/visibility", params={"lat": lat, "lon": lon, "date": date})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(queries),
+        "errors": len(queries) - statuses.get("200", 0),
+        "statuses": statuses,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(queries) / elapsed, 1) if elapsed else 0.0,
+        "latency": summarize_ms(latencies)
+    }
+
+
+async def _upstream_calls(stub_url: Optional[str]) -> Optional[int]:
+    if stub_url is None:
+        return None
+    async with httpx.AsyncClient(base_url=stub_url) as client:
+        stats = (await client.get("/stats")).json()
+    return stats["forecast"] + stats["astronomy"] + stats["open_meteo"]
+
+
+async def run_load(url: str, stub_url: Optional[str], locations: int, requests: int,
+                   concurrency: int, seed: int, date: str) -> Dict:
+    queries = make_locations(locations, seed, date)
+    rng = random.Random(seed + 1)
+    warm_queries = [rng.choice(queries) for _ in range(requests)]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=30.0, limits=limits) as client:
+        response = await client.post("/cache/clear", params={"pattern": "*"})
+        response.raise_for_status()
+
+        results = {}
+        for phase, phase_queries in (("cold", queries), ("warm", warm_queries)):
+            calls_before = await _upstream_calls(stub_url)
+            results[phase] = await run_phase(client, phase_queries, concurrency)
+            if calls_before is not None:
+                results[phase]["upstream_calls"] = await _upstream_calls(stub_url) - calls_before
+    return results
+
+
+def run(url: Optional[str] = None, locations: int = 200, requests: int = 2000, concurrency: int = 32,
+        latency_ms: float = 80.0, jitter_ms: float = 20.0, error_rate: float = 0.0,
+        seed: int = 42, date: str = "2026-10-17", slow_rate: float = 0.0, slow_ms: float = 1000.0) -> Dict:
+    """Cold and warm load results, against url or a freshly started local stack"""
+    args = (locations, requests, concurrency, seed, date)
+    if url:
+        return asyncio.run(run_load(url, None, *args))
+    with local_stack(latency_ms, jitter_ms, error_rate, slow_rate, slow_ms) as (app_url, stub_url):
+        return asyncio.run(run_load(app_url, stub_url, *args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Service to load (default: start a local stack)")
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of stub calls that take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--date", default="2026-10-17")
+    args = parser.parse_args()
+
+    results = run(
+        args.url, args.locations, args.requests, args.concurrency,
+        args.latency_ms, args.jitter_ms, args.error_rate, args.seed, args.date,
+        args.slow_rate, args.slow_ms
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark suite: micro-benchmarks, light-pollution raster lookups,
+Redis storage layouts, worker cold start and cold/warm load on /visibility,
+written to a JSON file that later runs can be compared against
+
+Usage:
+    python -m benchmarks.run [--output benchmarks/results/<timestamp>.json]
+        [--compare benchmarks/results/<earlier>.json] [--skip-load]
+        [--skip-startup] [--startup-runs 3] [--workers 4]
+        [--locations 200] [--requests 2000] [--concurrency 32]
+        [--latency-ms 80] [--jitter-ms 20] [--error-rate 0]
+
+Needs the packages in benchmarks/requirements.txt (fakeredis backs the
+in-memory Redis).
+"""
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("REDIS_BACKEND", "memory")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+from benchmarks import bench_cache_layout, bench_light_pollution, bench_micro, bench_startup, load_visibility  # noqa: E402
+from benchmarks.report import compare, metadata, write_results  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S") + ".json"))
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    parser.add_argument("--skip-load", action="store_true", help="Only run the micro-benchmarks")
+    parser.add_argument("--skip-startup", action="store_true", help="Skip the cold-start benchmark")
+    parser.add_argument("--startup-runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers in the cold-start benchmark")
+    parser.add_argument("--url", help="Load an already running service instead of a local stack")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--locations", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    config["redis_backend"] = os.environ["REDIS_BACKEND"]
+    results = {"meta": metadata(config)}
+
+    print("micro-benchmarks...")
+    results["micro"] = bench_micro.run(args.number, args.repeat)
+    results["light_pollution"] = bench_light_pollution.run(points=args.number * 10, seed=args.seed)
+    results["cache_layout"] = bench_cache_layout.run(lookups=args.number, seed=args.seed)
+    for layout, result in results["cache_layout"].items():
+        multi = result["multi_date_14"]
+        print(
+            f"{layout:<5} layout   {result['redis_keys']:6d} keys   14-night lookup: {multi['commands']:.0f} commands, "
+            f"{multi['sent'] + multi['received']:.0f} bytes, p50 {multi['p50_us']:.1f} us"
+        )
+
+    if not args.skip_startup:
+        print("cold start...")
+        results["startup"] = bench_startup.run(args.startup_runs, args.workers)
+        for scenario, result in results["startup"].items():
+            if isinstance(result, dict):
+                print(
+                    f"{scenario:<16} live {result['live_s']}s   ready {result['ready_s']}s   "
+                    f"all {result['workers']} ready {result['all_ready_s']}s   stop {result['stop_s']}s"
+                )
+
+    if not args.skip_load:
+        print("load test...")
+        results["load"] = load_visibility.run(
+            args.url, args.locations, args.requests, args.concurrency,
+            args.latency_ms, args.jitter_ms, args.error_rate, args.seed
+        )
+        for phase, result in results["load"].items():
+            latency = result["latency"]
+            print(
+                f"{phase:<5} {result['throughput_rps']:9.1f} req/s   p50 {latency['p50_ms']:8.2f} ms   "
+                f"p95 {latency['p95_ms']:8.2f} ms   p99 {latency['p99_ms']:8.2f} ms   errors {result['errors']}"
+            )
+
+    write_results(args.output, results)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nchanges since {args.compare} ({previous.get('meta', {}).get('git_commit')}):")
+        for line in compare(previous, results):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
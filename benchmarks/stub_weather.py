@@ -0,0 +1,173 @@
+"""
+Local stub for the upstream APIs the service calls: weatherapi.com
+(forecast.json and astronomy.json) and an Open-Meteo style /forecast,
+with configurable latency, jitter, slow tail and error rate. Responses
+are deterministic per location and date, and both providers report the
+same weather for a point.
+
+Usage:
+    python -m benchmarks.stub_weather [--port 8081] [--latency-ms 80]
+                                      [--jitter-ms 20] [--error-rate 0.0]
+                                      [--slow-rate 0.0] [--slow-ms 1000]
+
+Point the service at it with WEATHER_API_BASE_URL=http://127.0.0.1:8081/v1
+and/or OPEN_METEO_BASE_URL=http://127.0.0.1:8081/v1
+"""
+
+import argparse
+import asyncio
+import os
+import random
+from datetime import date, timedelta
+
+from fastapi import FastAPI, Query, Response
+
+app = FastAPI(title="Stub Weather API")
+
+# Defaults from the environment, overridden by the CLI flags
+settings = {
+    "latency_ms": float(os.getenv("STUB_LATENCY_MS", 80)),
+    "jitter_ms": float(os.getenv("STUB_JITTER_MS", 20)),
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", 0.0)),
+    # Fraction of calls that take slow_ms instead, the tail hedging is for
+    "slow_rate": float(os.getenv("STUB_SLOW_RATE", 0.0)),
+    "slow_ms": float(os.getenv("STUB_SLOW_MS", 1000))
+}
+
+_rng = random.Random(int(os.getenv("STUB_SEED", 42)))
+stats = {"forecast": 0, "astronomy": 0, "open_meteo": 0, "slow": 0, "errors": 0}
+
+
+async def _simulate() -> bool:
+    """Sleep for the configured latency +/- jitter; returns True if this call should fail"""
+    jitter = settings["jitter_ms"]
+    delay_ms = max(0.0, settings["latency_ms"] + _rng.uniform(-jitter, jitter))
+    if _rng.random() < settings["slow_rate"]:
+        stats["slow"] += 1
+        delay_ms = settings["slow_ms"]
+    await asyncio.sleep(delay_ms / 1000)
+    if _rng.random() < settings["error_rate"]:
+        stats["errors"] += 1
+        return True
+    return False
+
+
+def _forecast_day(q: str, day: date) -> dict:
+    rng = random.Random(f"{q}|{day.isoformat()}")
+    base = rng.uniform(0, 100)
+    hours = []
+    for hour in range(24):
+        cloud = min(100, max(0, round(base + rng.uniform(-25, 25))))
+        hours.append({
+            "time": f"{day.isoformat()} {hour:02d}:00",
+            "cloud": cloud,
+            "humidity": rng.randint(30, 95),
+            "vis_km": round(rng.uniform(2, 10), 1),
+            "precip_mm": round(rng.uniform(0, 2), 2) if cloud > 70 else 0.0
+        })
+    return {"date": day.isoformat(), "hour": hours}
+
+
+@app.get("/v1/forecast.json")
+async def forecast(q: str, dt: str = None, days: int = Query(1, ge=1, le=14)):
+    stats["forecast"] += 1
+    if await _simulate():
+        return Response(status_code=503, content='{"error": {"message": "stub error"}}', media_type="application/json")
+
+    start = date.fromisoformat(dt) if dt else date.today()
+    return {
+        "location": {"name": "Stub", "q": q},
+        "forecast": {"forecastday": [_forecast_day(q, start + timedelta(days=i)) for i in range(days)]}
+    }
+
+
+@app.get("/v1/astronomy.json")
+async def astronomy(q: str, dt: str = None):
+    stats["astronomy"] += 1
+    if await _simulate():
+        return Response(status_code=503, content='{"error": {"message": "stub error"}}', media_type="application/json")
+
+    day = date.fromisoformat(dt) if dt else date.today()
+    rng = random.Random(f"{q}|{day.isoformat()}|astro")
+    return {
+        "astronomy": {
+            "astro": {
+                "sunrise": f"0{rng.randint(5, 7)}:{rng.randint(10, 59)} AM",
+                "sunset": f"0{rng.randint(5, 7)}:{rng.randint(10, 59)} PM",
+                "moonrise": "09:12 PM",
+                "moonset": "10:03 AM",
+                "moon_phase": "Waxing Gibbous",
+                "moon_illumination": str(rng.randint(0, 100))
+            }
+        }
+    }
+
+
+@app.get("/v1/forecast")
+async def open_meteo_forecast(
+    latitude: float,
+    longitude: float,
+    hourly: str = "",
+    start_date: str = None,
+    end_date: str = None,
+    forecast_days: int = Query(7, ge=1, le=16),
+    timezone: str = "GMT"
+):
+    """Open-Meteo style hourly arrays, from the same data as forecast.json"""
+    stats["open_meteo"] += 1
+    if await _simulate():
+        return Response(status_code=503, content='{"error": true, "reason": "stub error"}', media_type="application/json")
+
+    if start_date:
+        start = date.fromisoformat(start_date)
+        days = (date.fromisoformat(end_date or start_date) - start).days + 1
+    else:
+        start, days = date.today(), forecast_days
+
+    # Same q string as the weatherapi endpoints see, so both agree
+    q = f"{latitude},{longitude}"
+    hours = [hour for i in range(days) for hour in _forecast_day(q, start + timedelta(days=i))["hour"]]
+    series = {
+        "time": [hour["time"].replace(" ", "T") for hour in hours],
+        "cloud_cover": [hour["cloud"] for hour in hours],
+        "relative_humidity_2m": [hour["humidity"] for hour in hours],
+        "visibility": [hour["vis_km"] * 1000 for hour in hours],
+        "precipitation": [hour["precip_mm"] for hour in hours]
+    }
+    requested = set(hourly.split(",")) if hourly else set(series)
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": timezone,
+        "hourly": {name: values for name, values in series.items() if name == "time" or name in requested}
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    """Calls served so far, to check how many requests reached the 'upstream'"""
+    return {**settings, **stats}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=settings["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"])
+    parser.add_argument("--slow-rate", type=float, default=settings["slow_rate"])
+    parser.add_argument("--slow-ms", type=float, default=settings["slow_ms"])
+    args = parser.parse_args()
+
+    settings.update(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms
+    )
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
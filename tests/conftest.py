@@ -0,0 +1,79 @@
+"""
+Test fixtures: the in-memory Redis backend and the benchmark stub
+weather API (benchmarks/stub_weather.py), served in-process over an ASGI
+transport, so the suite needs neither a Redis server nor the network
+"""
+
+import os
+
+# Before any app module reads its configuration
+os.environ["REDIS_BACKEND"] = "memory"
+os.environ["UPSTREAM_PREWARM"] = "false"
+os.environ["WEATHER_API_KEY"] = "stub"
+os.environ["WEATHER_API_BASE_URL"] = "http://stub/v1"
+os.environ["OPEN_METEO_BASE_URL"] = "http://stub/v1"
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.services.circuit_breaker import upstream_breakers  # noqa: E402
+from app.services.redis_async import async_cache  # noqa: E402
+from app.services.redis_cache import cache  # noqa: E402
+from app.services.single_flight import single_flight  # noqa: E402
+from app.services.weather_astronomy_service import WeatherAstronomyService  # noqa: E402
+from benchmarks import stub_weather  # noqa: E402
+
+_STUB_SETTINGS = dict(stub_weather.settings)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Empty Redis and L1, closed breakers and a fast, healthy stub for every test"""
+    cache.redis_client.flushall()
+    cache.l1.clear_pattern("*")
+    cache.enabled = async_cache.enabled = True
+    upstream_breakers._breakers.clear()
+    single_flight._tasks.clear()
+    single_flight._refreshes.clear()
+    stub_weather.settings.update(_STUB_SETTINGS, latency_ms=0, jitter_ms=0, error_rate=0.0, slow_rate=0.0)
+    for name in stub_weather.stats:
+        stub_weather.stats[name] = 0
+    yield
+
+
+@pytest.fixture
+def stub():
+    """The stub API's settings and call counters, e.g. stub.stats["forecast"]"""
+    return stub_weather
+
+
+def stub_client() -> httpx.AsyncClient:
+    """An upstream client whose requests are answered by the stub API"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_weather.app))
+
+
+@pytest.fixture
+async def service():
+    """A fresh weather service talking to the stub"""
+    weather = WeatherAstronomyService()
+    weather._client = stub_client()
+    yield weather
+    await weather.aclose()
+
+
+@pytest.fixture
+async def api():
+    """Client for the app, whose global weather service talks to the stub"""
+    from app.api.visibility import weather_service
+    from app.main import app
+
+    weather_service._client = stub_client()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await weather_service.aclose()
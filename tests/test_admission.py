@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import admission as admission_module
+from app.services.admission import AdmissionClass, Shed, admission
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = {"lat": 48.85, "lon": 2.35, "date": "2025-06-15"}
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Swap in a fresh admission class: limits("upstream", limit=0, max_queue=0)"""
+    def configure(name, limit, max_queue, max_wait=1.0):
+        admission_class = AdmissionClass(name, limit, max_queue, max_wait)
+        monkeypatch.setitem(admission.classes, name, admission_class)
+        return admission_class
+    return configure
+
+
+async def _hold(admission_class, release: asyncio.Event, deadline=None):
+    """Take a slot and keep it until release is set"""
+    token = admission_module._deadline.set(deadline)
+    try:
+        async with admission_class.admit():
+            await release.wait()
+    finally:
+        admission_module._deadline.reset(token)
+
+
+async def test_full_queue_is_shed_with_retry_after():
+    limited = AdmissionClass("test", limit=1, max_queue=1, max_wait=5.0)
+    limited.mean_hold = 2.0
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(_hold(limited, release))
+    waiter = asyncio.ensure_future(_hold(limited, release))
+    await asyncio.sleep(0.01)
+    assert (limited.active, len(limited._waiters)) == (1, 1)
+
+    with pytest.raises(Shed) as shed:
+        async with limited.admit():
+            pass
+    assert shed.value.reason == "queue_full"
+    # Two requests ahead at 2s each, one slot
+    assert shed.value.headers == {"Retry-After": "4"}
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert limited.active == 0
+    assert limited.stats == {"admitted": 2, "waited": 1, "shed": 1}
+
+
+async def test_arrival_that_cant_make_its_deadline_is_shed_at_once():
+    limited = AdmissionClass("test", limit=1, max_queue=10, max_wait=5.0)
+    limited.mean_hold = 1.0
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(_hold(limited, release))
+    await asyncio.sleep(0.01)
+
+    start = time.monotonic()
+    with pytest.raises(Shed) as shed:
+        await _hold(limited, release, deadline=time.monotonic() + 0.5)
+    assert shed.value.reason == "deadline"
+    assert time.monotonic() - start < 0.1
+    assert shed.value.headers == {"Retry-After": "1"}
+
+    release.set()
+    await holder
+
+
+async def test_queued_request_times_out_at_max_wait():
+    limited = AdmissionClass("test", limit=1, max_queue=10, max_wait=0.05)
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(_hold(limited, release))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(Shed) as shed:
+        await _hold(limited, release)
+    assert shed.value.reason == "timeout"
+    assert not limited._waiters
+
+    release.set()
+    await holder
+    assert limited.active == 0
+
+
+async def test_shed_upstream_request_gets_a_degraded_response(api, stub, limits):
+    limits("upstream", limit=0, max_queue=0)
+
+    response = await api.get("/visibility", params=PARAMS)
+
+    assert response.status_code == 200
+    assert response.headers["X-Load-Shed"] == "upstream:queue_full"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert response.json()["data_source"] == "degraded"
+    assert stub.stats["forecast"] == 0
+
+
+async def test_reject_mode_answers_503_with_retry_after(api, stub, limits, monkeypatch):
+    monkeypatch.setattr(admission, "shed_mode", "reject")
+    limits("upstream", limit=0, max_queue=0)
+
+    response = await api.get("/visibility", params=PARAMS)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert "upstream requests: queue_full" in response.json()["detail"]
+
+
+async def test_cached_inputs_need_no_upstream_slot(api, stub, limits):
+    # Caches the 15th's and 16th's hourly records, and the hourly response
+    await api.get("/visibility", params={**PARAMS, "resolution": "hourly"})
+    limits("upstream", limit=0, max_queue=0)
+
+    # The night response isn't cached, but its inputs are
+    response = await api.get("/visibility", params=PARAMS)
+    assert response.status_code == 200
+    assert "X-Load-Shed" not in response.headers
+    assert response.json()["data_source"] == "real_api"
+
+    response = await api.get("/visibility", params={**PARAMS, "date": "2025-06-17"})
+    assert response.headers["X-Load-Shed"] == "upstream:queue_full"
+
+
+async def test_request_deadline_header_bounds_the_queue_wait(api, limits):
+    limits("upstream", limit=0, max_queue=10, max_wait=5.0)
+
+    start = time.monotonic()
+    response = await api.get("/visibility", params=PARAMS, headers={"X-Request-Deadline-Ms": "50"})
+
+    assert response.headers["X-Load-Shed"] == "upstream:timeout"
+    assert time.monotonic() - start < 1.0
+
+
+async def test_upstream_fetch_holds_no_cache_slot(api, stub, limits):
+    cache_class = limits("cache", limit=1, max_queue=0)
+    await api.get("/visibility", params=PARAMS)
+    stub.settings["latency_ms"] = 200
+
+    # Upstream-bound: a new night
+    slow = asyncio.ensure_future(api.get("/visibility", params={**PARAMS, "date": "2025-06-20"}))
+    await asyncio.sleep(0.1)
+    assert cache_class.active == 0
+    assert admission.classes["upstream"].active == 1
+
+    # With no cache queue, this would be shed if the fetch held the one cache slot
+    cached = await api.get("/visibility", params=PARAMS)
+    assert cached.status_code == 200, cached.text
+    assert (await slow).status_code == 200
+    assert cache_class.stats["shed"] == 0
+
+
+async def test_quota_exhausted_is_429_with_retry_after(api, monkeypatch):
+    monkeypatch.setattr(admission, "quota_rate", 0.5)
+    monkeypatch.setattr(admission, "quota_burst", 2)
+    key = {"X-API-Key": "client-a"}
+
+    statuses = [(await api.get("/visibility", params=PARAMS, headers=key)).status_code for _ in range(2)]
+    rejected = await api.get("/visibility", params=PARAMS, headers=key)
+    other = await api.get("/visibility", params=PARAMS, headers={"X-API-Key": "client-b"})
+
+    assert statuses == [200, 200]
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "2"
+    assert other.status_code == 200
+    assert admission.stats["quota_rejections"] >= 1
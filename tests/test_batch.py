@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+
+pytestmark = pytest.mark.anyio
+
+DATE = "2025-06-15"
+
+
+async def test_batch_writes_each_value_before_releasing_its_lock(service, monkeypatch):
+    """Workers waiting on a key's lock must find the value once it is released"""
+    queries = [(48.85, 2.35, DATE), (40.71, -74.01, DATE)]
+    keys = [service._cache_location("hourly", lat, lon, date)[0] for lat, lon, date in queries]
+    cached_at_release = {}
+    release_lock = async_cache.release_lock
+
+    async def checked_release(name, token):
+        cached_at_release[name] = cache.redis_client.get(name) is not None
+        return await release_lock(name, token)
+
+    monkeypatch.setattr(async_cache, "release_lock", checked_release)
+    inputs, stats = await service.get_visibility_inputs_many(queries)
+
+    assert stats["upstream_fetches"] == 2
+    assert all(degraded == [] for _, _, degraded in inputs)
+    assert cached_at_release == {key: True for key in keys}
+
+
+async def test_batch_failure_only_fails_the_affected_item(api, service):
+    items = [{"lat": 48.85, "lon": 2.35, "date": DATE}, {"lat": 40.71, "lon": -74.01, "date": DATE}]
+    # A record that can't be unpacked fails the batched lookup as a whole
+    broken_key = service._cache_location("hourly", 40.71, -74.01, DATE)[0]
+    await async_cache.set(broken_key, b"\x09\x18not a record", 3600, soft_ttl_seconds=3600)
+
+    response = await api.post("/visibility/batch", json={"items": items})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["status"] == 200
+    assert results[0]["result"]["visibility_score"] >= 0
+    assert results[1]["status"] == 500
+    assert "Unsupported hourly record" in results[1]["error"]
+    assert response.json()["stats"]["single_lookups"] == 2
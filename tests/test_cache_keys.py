@@ -0,0 +1,32 @@
+import pytest
+
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def migrate_mode(monkeypatch):
+    monkeypatch.setattr(cache, "key_mode", "migrate")
+
+
+async def test_migrate_mode_has_no_legacy_key_for_hourly(service, migrate_mode):
+    cache_key, legacy_key, _, _ = service._cache_location("hourly", 48.8566, 2.3522, "2025-06-15")
+    assert cache_key.startswith("hourly:cell=")
+    assert legacy_key is None
+
+
+async def test_migrate_mode_reuses_legacy_astronomy_entries(service, stub, migrate_mode, monkeypatch):
+    monkeypatch.setattr(service, "astronomy_source", "api")
+    legacy = {
+        "moon_illumination": 0.5, "moon_phase": "First Quarter", "sunrise": "05:47 AM",
+        "sunset": "09:57 PM", "moonrise": "01:00 PM", "moonset": "01:00 AM"
+    }
+    cache.redis_client.set("astronomy:date=2025-06-15:lat=48.8566:lon=2.3522", cache._encode(legacy, None)[1], ex=3600)
+
+    assert await service.get_astronomy_data(48.8566, 2.3522, "2025-06-15") == legacy
+    assert stub.stats["astronomy"] == 0
+    cache_key = service._cache_location("astronomy", 48.8566, 2.3522, "2025-06-15")[0]
+    cache.l1.clear_pattern("*")
+    assert await async_cache.get(cache_key) == legacy
@@ -0,0 +1,36 @@
+from app.services import ephemeris
+from app.services.hourly import HourlyForecast, darkness_window
+from app.services.visibility_logic import calculate_darkness_window
+
+NAIROBI = (-1.2921, 36.8219)
+
+
+def test_utc_offset_uses_the_real_time_zone():
+    # Nominal zone round(36.8 / 15) would be UTC+2
+    assert ephemeris.utc_offset_hours(*NAIROBI, "2025-06-15") == 3.0
+    # DST
+    assert ephemeris.utc_offset_hours(40.71, -74.01, "2025-01-15") == -5.0
+    assert ephemeris.utc_offset_hours(40.71, -74.01, "2025-07-15") == -4.0
+
+
+def test_nairobi_local_times():
+    astronomy = ephemeris.astronomy_for(*NAIROBI, "2025-06-15")
+    assert astronomy["sunrise"] == "06:32 AM"
+    assert astronomy["sunset"] == "06:35 PM"
+    assert (astronomy["dark_start"], astronomy["dark_end"]) == ("19:50", "05:17")
+    assert astronomy["darkness_level"] == "astronomical"
+
+    window = calculate_darkness_window("2025-06-15", *NAIROBI)
+    assert (window["dark_start"], window["dark_end"]) == ("19:50", "05:17")
+
+
+def test_night_cloud_cover_averages_local_dark_hours():
+    # Clear from 19:00 to 06:00 local, overcast at 18:00, which a UTC+2
+    # window (18:50-04:17) would wrongly include
+    cloud = [0.0] * 24
+    for hour in range(6, 19):
+        cloud[hour] = 100.0
+    record = HourlyForecast.from_values({"cloud": cloud})
+
+    astronomy = ephemeris.astronomy_for(*NAIROBI, "2025-06-15")
+    assert record.cloud_cover(darkness_window(astronomy)) == 0
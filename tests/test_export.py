@@ -0,0 +1,29 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_export_against_failing_upstream(api, stub):
+    stub.settings["error_rate"] = 1.0
+
+    response = await api.post("/visibility/export?lat=48.85&lon=2.35&start=2025-06-15&end=2025-06-17")
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["index"] for row in rows[:-1]] == [0, 1, 2]
+    summary = rows[-1]
+    assert summary["done"] is True
+    assert summary["cursor"] == 3
+    assert summary["stats"]["rows"] == 3
+    assert summary["stats"]["fallbacks"] == 3
+
+
+async def test_export_defaults_to_today(api):
+    response = await api.post("/visibility/export?lat=48.85&lon=2.35")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows[0]["result"]["date"] == datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    assert rows[-1]["cursor"] == 1
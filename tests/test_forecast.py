@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.services import weather_astronomy_service
+from app.services.redis_async import async_cache
+from app.services.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+NAIROBI = (-1.2921, 36.8219)
+
+
+async def test_forecast_days_fetches_once_across_workers(service, stub, monkeypatch):
+    """A second worker waiting on the forecast lock re-reads the days instead of fetching"""
+    stub.settings["latency_ms"] = 100
+    monkeypatch.setattr(weather_astronomy_service, "single_flight", SingleFlight())
+    leader = asyncio.ensure_future(service.get_hourly_forecast_days(*NAIROBI, 5))
+    while not await async_cache.client.keys("lock:forecast:*"):
+        await asyncio.sleep(0.005)
+
+    # Another worker: its own single-flight, so only the Redis lock is shared
+    monkeypatch.setattr(weather_astronomy_service, "single_flight", SingleFlight())
+    follower_nights, follower_stats = await service.get_hourly_forecast_days(*NAIROBI, 5)
+    leader_nights, leader_stats = await leader
+
+    assert stub.stats["forecast"] == 1
+    assert leader_stats["upstream_fetches"] == 1
+    assert follower_stats["upstream_fetches"] == 0
+    assert all(record is not None for _, record in follower_nights)
+    assert [(d, r.pack()) for d, r in follower_nights] == [(d, r.pack()) for d, r in leader_nights]
+
+
+async def test_forecast_days_warms_single_day_lookups(service, stub):
+    nights, _ = await service.get_hourly_forecast_days(*NAIROBI, 3)
+    for day, record in nights:
+        assert (await service.get_hourly_forecast(*NAIROBI, day)).pack() == record.pack()
+    assert stub.stats["forecast"] == 1
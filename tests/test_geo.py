@@ -0,0 +1,29 @@
+import pytest
+
+from app.services.geo import Quantizer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("spec", ["grid:0.05", "grid:0.5", "grid:0.7", "geohash:5"])
+@pytest.mark.parametrize("lat, lon", [(90, 180), (-90, -180), (90, -180), (-90, 180), (10, 179.99)])
+def test_cell_centers_stay_in_range(spec, lat, lon):
+    _, center_lat, center_lon = Quantizer(spec).cell(lat, lon)
+    assert -90 <= center_lat <= 90
+    assert -180 <= center_lon <= 180
+
+
+def test_edge_shares_the_cell_below_it():
+    quantizer = Quantizer("grid:0.05")
+    assert quantizer.cell(90, 180) == quantizer.cell(89.99, 179.99) == ("g0.05_1799_3599", 89.975, 179.975)
+    assert quantizer.cell(-90, -180) == ("g0.05_-1800_-3600", -89.975, -179.975)
+    assert quantizer.cell(48.85, 2.35) == ("g0.05_977_47", 48.875, 2.375)
+
+
+@pytest.mark.parametrize("lat, lon", [(10, 180), (90, 10), (-90, -180)])
+async def test_visibility_at_the_poles_and_antimeridian(api, stub, lat, lon):
+    response = await api.get("/visibility", params={"lat": lat, "lon": lon, "date": "2025-06-15"})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["location"] == {"latitude": lat, "longitude": lon}
+    assert stub.stats["forecast"] == 1
@@ -0,0 +1,37 @@
+import base64
+
+import numpy as np
+import pytest
+
+from app.api import visibility
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cells_past_the_fetch_budget_are_nodata(api, stub, monkeypatch):
+    monkeypatch.setattr(visibility, "GRID_MAX_UPSTREAM_FETCHES", 5)
+
+    response = await api.get("/visibility/grid", params={"bbox": "0,40,10,50", "resolution": 1, "date": "2025-06-15"})
+
+    assert response.status_code == 200
+    body = response.json()
+    grid = np.frombuffer(base64.b64decode(body["data"]), dtype=np.uint8)
+    assert body["nodata"] == visibility.GRID_NODATA
+    assert body["stats"]["skipped_fetches"] == 95
+    assert body["stats"]["missing_cells"] == 95
+    assert (grid == visibility.GRID_NODATA).sum() == 95
+    assert (grid <= 100).sum() == 5
+    assert stub.stats["forecast"] == 5
+
+
+async def test_failing_upstream_cells_are_nodata_in_png(api, stub):
+    stub.settings["error_rate"] = 1.0
+
+    response = await api.get(
+        "/visibility/grid", params={"bbox": "0,40,2,42", "resolution": 1, "date": "2025-06-15", "format": "png"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Grid-Missing"] == "4"
+    assert response.headers["X-Grid-Nodata"] == str(visibility.GRID_NODATA)
+    assert b"tRNS" in response.content
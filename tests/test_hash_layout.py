@@ -0,0 +1,140 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.redis_async import async_cache
+from app.services.redis_cache import _FIELD_HEADER, cache
+
+pytestmark = pytest.mark.anyio
+
+HASH_KEY = "hourly:cell=g0.05_977_47"
+
+
+def _day(offset: int) -> str:
+    return (datetime.now(timezone.utc) + timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+def _key(date: str) -> str:
+    return f"{HASH_KEY}:date={date}"
+
+
+@pytest.fixture(params=["window", "field"])
+def hash_layout(request, monkeypatch):
+    monkeypatch.setattr(cache, "layout", "hash")
+    monkeypatch.setattr(cache, "hash_expiry", request.param)
+    return request.param
+
+
+class RecordingPipeline:
+    """A pipeline that records the names of the commands queued on it"""
+
+    def __init__(self, pipe, commands):
+        self._pipe = pipe
+        self._commands = commands
+
+    def __getattr__(self, name):
+        attr = getattr(self._pipe, name)
+        if name in ("execute", "reset") or not callable(attr):
+            return attr
+
+        def queue(*args, **kwargs):
+            self._commands.append(name)
+            return attr(*args, **kwargs)
+        return queue
+
+
+def _clear_l1():
+    cache.l1.clear_pattern("*")
+
+
+def test_dates_of_a_cell_are_fields_of_one_hash(hash_layout):
+    dates = [_day(0), _day(1), _day(2)]
+    assert cache.set_many([(_key(date), {"date": date}, 3600) for date in dates])
+
+    assert cache.redis_client.keys("hourly:*") == [HASH_KEY.encode()]
+    assert sorted(field.decode() for field in cache.redis_client.hkeys(HASH_KEY)) == dates
+    # Window mode expires the hash, field mode each field
+    assert (cache.redis_client.ttl(HASH_KEY) > 0) == (hash_layout == "window")
+
+
+def test_multi_date_read_is_one_hmget(hash_layout, monkeypatch):
+    dates = [_day(0), _day(1), _day(2)]
+    cache.set_many([(_key(date), {"date": date}, 3600) for date in dates])
+    cache.set("astronomy:other", {"plain": True}, 3600)
+    _clear_l1()
+
+    commands = []
+    pipeline = cache.redis_client.pipeline
+    monkeypatch.setattr(cache.redis_client, "pipeline", lambda **kw: RecordingPipeline(pipeline(**kw), commands))
+    values = cache.get_many([_key(date) for date in dates] + [_key(_day(3)), "astronomy:other"])
+
+    assert values == [{"date": date} for date in dates] + [None, {"plain": True}]
+    assert commands == ["get", "pttl", "hmget"]
+
+
+async def test_async_reads_share_the_hash(hash_layout):
+    await async_cache.set_many([(_key(_day(0)), b"\x01record", 3600)], soft_ttl_seconds=1800)
+    _clear_l1()
+
+    entries = await async_cache.get_many_entries([_key(_day(0)), _key(_day(1))])
+    assert entries == [(b"\x01record", False), None]
+
+
+def test_expiry_comes_from_the_field_header(hash_layout):
+    _, raw = cache._encode({"expiring": True}, None)
+    cache.redis_client.hset(HASH_KEY, _day(0), _FIELD_HEADER.pack(time.time() + 10) + raw)
+    cache.redis_client.hset(HASH_KEY, _day(1), _FIELD_HEADER.pack(time.time() - 1) + raw)
+
+    # Past its header's expiry, a field not yet dropped from the hash is a miss
+    assert cache.get_many([_key(_day(0)), _key(_day(1))]) == [{"expiring": True}, None]
+    # and L1 keeps a live one no longer than its header allows
+    expires_at = cache.l1._entries[_key(_day(0))][0]
+    assert expires_at <= time.monotonic() + 10
+
+
+def test_window_mode_prunes_dates_before_the_window(monkeypatch):
+    monkeypatch.setattr(cache, "layout", "hash")
+    monkeypatch.setattr(cache, "hash_expiry", "window")
+    old = _day(-cache.hash_window_days - 1)
+    cache.redis_client.hset(HASH_KEY, old, b"stale")
+    cache.redis_client.hset(HASH_KEY, _day(-1), b"kept")
+    cache.redis_client.expire(HASH_KEY, 60)
+
+    cache.set_many([(_key(_day(0)), 1, 7200), (_key(old), 2, 7200)])
+
+    fields = {field.decode() for field in cache.redis_client.hkeys(HASH_KEY)}
+    # The old date written now stays; only unwritten ones before the window go
+    assert fields == {old, _day(-1), _day(0)}
+    cache.set(_key(_day(1)), 3, 60)
+    fields = {field.decode() for field in cache.redis_client.hkeys(HASH_KEY)}
+    assert fields == {_day(-1), _day(0), _day(1)}
+    # The hash lives as long as its longest-lived field, never shortened
+    assert 7000 < cache.redis_client.ttl(HASH_KEY) <= 7200
+
+
+def test_field_mode_expires_each_field(monkeypatch):
+    monkeypatch.setattr(cache, "layout", "hash")
+    monkeypatch.setattr(cache, "hash_expiry", "field")
+
+    cache.set_many([(_key(_day(0)), 1, 600), (_key(_day(1)), 2, 3600)])
+
+    short, long = cache.redis_client.httl(HASH_KEY, _day(0), _day(1))
+    assert 590 < short <= 600 and 3590 < long <= 3600
+    assert cache.redis_client.ttl(HASH_KEY) == -1
+
+
+def test_delete_removes_only_its_field(hash_layout):
+    cache.set_many([(_key(_day(0)), 1, 3600), (_key(_day(1)), 2, 3600)])
+
+    assert cache.delete(_key(_day(0)))
+
+    assert [field.decode() for field in cache.redis_client.hkeys(HASH_KEY)] == [_day(1)]
+    assert cache.get_many([_key(_day(0)), _key(_day(1))]) == [None, 2]
+
+
+def test_other_prefixes_stay_plain_keys(hash_layout):
+    cache.set("response:cell=g0.05_977_47:date=2025-06-15:variant=night", {"cached": True}, 60)
+
+    assert cache.redis_client.type("response:cell=g0.05_977_47:date=2025-06-15:variant=night") == b"string"
+    assert 0 < cache.redis_client.ttl("response:cell=g0.05_977_47:date=2025-06-15:variant=night") <= 60
@@ -0,0 +1,116 @@
+import math
+import os
+import time
+from datetime import date
+
+import pytest
+
+from app.precompute import precompute
+from app.services.precomputed import PrecomputedResults, ResultsFile, write_results
+from app.services.redis_cache import cache
+from app.services.response_cache import response_cache
+
+pytestmark = pytest.mark.anyio
+
+FIRST = date(2025, 6, 15)
+CELLS = ["g0.05_1000_1", "g0.05_977_47"]
+
+
+def _write(path, bodies=None, degraded=(0, 0, 0, 0), scores=(50, 60, 70, 80), valid_for=3600.0):
+    bodies = bodies or [b'{"row":%d}' % i for i in range(4)]
+    columns = {
+        "score": scores, "cloud_cover": [10, 20, 30, 40], "moon_illumination": [0.1, 0.2, 0.3, 0.4],
+        "light_pollution": [5, 5, 5, 5], "degraded": degraded
+    }
+    write_results(str(path), CELLS, [50.025, 48.875], [0.075, 2.375], FIRST, 2, columns, bodies, time.time() + valid_for)
+
+
+@pytest.fixture
+def results(tmp_path):
+    store = PrecomputedResults()
+    store.path = str(tmp_path / "results.bin")
+    store.check_seconds = 0
+    return store
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "results.bin"
+    _write(path)
+
+    results = ResultsFile(str(path))
+    assert (results.sites, results.nights) == (2, 2)
+    assert results.row("g0.05_977_47", "2025-06-16") == 3
+    assert results.body(3) == b'{"row":3}'
+    assert results.body(0) == b'{"row":0}'
+    assert results.columns["cloud_cover"].tolist() == [10, 20, 30, 40]
+    assert results.lons.tolist() == [0.075, 2.375]
+    # Not registered, outside the nights covered, or not a date
+    assert results.row("g0.05_977_48", "2025-06-15") is None
+    assert results.row("g0.05_977_47", "2025-06-17") is None
+    assert results.row("g0.05_977_47", "2025-06-14") is None
+    assert results.row("g0.05_977_47", "tomorrow") is None
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_unsorted_cells_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_results(str(tmp_path / "results.bin"), CELLS[::-1], [0, 0], [0, 0], FIRST, 1,
+                      {"score": [0, 0], "cloud_cover": [0, 0], "moon_illumination": [0, 0],
+                       "light_pollution": [0, 0], "degraded": [0, 0]}, [b"{}", b"{}"], time.time())
+
+
+def test_lookup_serves_valid_rows_only(results):
+    _write(results.path, degraded=(0, 1, 0, 0), scores=(50, 60, math.nan, 80))
+
+    body, valid_until = results.lookup("g0.05_1000_1", "2025-06-15")
+    assert body == b'{"row":0}'
+    assert valid_until > time.time()
+    # Degraded and uncomputed rows are left to the live path
+    assert results.lookup("g0.05_1000_1", "2025-06-16") is None
+    assert results.lookup("g0.05_977_47", "2025-06-15") is None
+    assert results.stats["hits"] == 1 and results.stats["misses"] == 2
+
+
+def test_expired_file_is_not_served(results):
+    _write(results.path, valid_for=-1)
+    assert results.lookup("g0.05_1000_1", "2025-06-15") is None
+
+
+def test_replaced_file_is_reloaded(results):
+    _write(results.path)
+    assert results.lookup("g0.05_1000_1", "2025-06-15")[0] == b'{"row":0}'
+    old = results.current
+
+    _write(results.path, bodies=[b'{"new":%d}' % i for i in range(4)])
+    assert results.lookup("g0.05_1000_1", "2025-06-15")[0] == b'{"new":0}'
+    assert results.current is not old
+    assert results.stats["reloads"] == 2
+    # The old mapping still reads as before for anyone holding it
+    assert old.body(0) == b'{"row":0}'
+
+
+async def test_precomputed_rows_answer_visibility(api, stub, tmp_path, monkeypatch):
+    from app.api.visibility import precomputed_results, weather_service
+
+    # precompute sets the service's batch concurrency
+    monkeypatch.setattr(weather_service, "batch_concurrency", weather_service.batch_concurrency)
+    sites = [(48.851, 2.351), (48.852, 2.352), (40.71, -74.01)]
+    result = await precompute(sites, FIRST, 2, concurrency=4, max_rps=0, chunk_size=3)
+    assert result["stats"]["cells"] == 2
+    path = str(tmp_path / "results.bin")
+    write_results(path, result["cells"], result["lats"], result["lons"], FIRST, 2,
+                  result["columns"], result["bodies"], time.time() + 3600)
+    monkeypatch.setattr(precomputed_results, "path", path)
+    monkeypatch.setattr(precomputed_results, "current", None)
+    monkeypatch.setattr(precomputed_results, "_checked_at", float("-inf"))
+    cache.redis_client.flushall()
+    cache.l1.clear_pattern("*")
+    fetches = stub.stats["forecast"]
+
+    response = await api.get("/visibility", params={"lat": 48.851, "lon": 2.351, "date": "2025-06-16"})
+
+    assert response.status_code == 200
+    assert stub.stats["forecast"] == fetches
+    cell_id = cache.location_cell("hourly", 48.851, 2.351)[0]
+    body, _ = precomputed_results.lookup(cell_id, "2025-06-16")
+    assert response.content == response_cache.assemble({"latitude": 48.851, "longitude": 2.351}, "2025-06-16", body)
@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.circuit_breaker import upstream_breakers
+from app.services.weather_providers import FORECAST, create_provider
+from benchmarks import stub_weather
+
+pytestmark = pytest.mark.anyio
+
+PARIS = (48.85, 2.35)
+
+
+class PrimaryTransport(httpx.AsyncBaseTransport):
+    """
+    The stub, with weatherapi's forecast.json slowed down or failing;
+    the stub's own settings apply to both providers alike
+    """
+
+    def __init__(self, delay: float = 0.0, status: int = 0) -> None:
+        self.stub = httpx.ASGITransport(app=stub_weather.app)
+        self.delay = delay
+        self.status = status
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/forecast.json"):
+            await asyncio.sleep(self.delay)
+            if self.status:
+                return httpx.Response(self.status, json={"error": "primary down"})
+        return await self.stub.handle_async_request(request)
+
+
+@pytest.fixture
+def with_secondary(service):
+    service.secondary_provider = create_provider("openmeteo")
+    return service
+
+
+async def use_transport(service, transport: httpx.AsyncBaseTransport) -> None:
+    await service._client.aclose()
+    service._client = httpx.AsyncClient(transport=transport)
+
+
+async def test_failover_to_secondary(with_secondary, stub):
+    await use_transport(with_secondary, PrimaryTransport(status=503))
+
+    record = await with_secondary.get_hourly_forecast(*PARIS, "2025-06-15")
+
+    assert record is not None
+    assert stub.stats["open_meteo"] == 1
+    stats = with_secondary.provider_stats()["operations"][FORECAST]
+    assert stats["failovers"] == 1
+    assert stats["wins"] == {"openmeteo": 1}
+
+
+async def test_slow_primary_is_hedged(with_secondary, stub):
+    with_secondary.hedge_default_delay = 0.05
+    await use_transport(with_secondary, PrimaryTransport(delay=1.0))
+
+    record = await asyncio.wait_for(with_secondary.get_hourly_forecast(*PARIS, "2025-06-15"), 0.5)
+
+    assert record is not None
+    stats = with_secondary.provider_stats()["operations"][FORECAST]
+    assert stats["hedged"] == 1
+    assert stats["failovers"] == 0
+    assert stats["wins"] == {"openmeteo": 1}
+
+
+async def test_fast_primary_is_not_hedged(with_secondary, stub):
+    record = await with_secondary.get_hourly_forecast(*PARIS, "2025-06-15")
+
+    assert record is not None
+    assert stub.stats["forecast"] == 1
+    assert stub.stats["open_meteo"] == 0
+    stats = with_secondary.provider_stats()["operations"][FORECAST]
+    assert stats["hedged"] == stats["failovers"] == 0
+
+
+async def test_circuit_opens_and_stops_upstream_calls(service, stub, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_BREAKER_MIN_CALLS", "3")
+    stub.settings["error_rate"] = 1.0
+    dates = ["2025-06-15", "2025-06-16", "2025-06-17"]
+
+    for date in dates:
+        assert await service.get_hourly_forecast(*PARIS, date) is None
+    assert stub.stats["forecast"] == 3
+    assert upstream_breakers.is_open(service.provider.endpoint(FORECAST))
+    assert service.upstream_down(FORECAST)
+
+    # A new key, not negatively cached, still doesn't reach upstream
+    assert await service.get_hourly_forecast(*PARIS, "2025-06-18") is None
+    assert stub.stats["forecast"] == 3
+
+
+async def test_open_primary_circuit_fails_over(with_secondary, stub, monkeypatch):
+    monkeypatch.setenv("UPSTREAM_BREAKER_MIN_CALLS", "2")
+    await use_transport(with_secondary, PrimaryTransport(status=503))
+    for date in ["2025-06-15", "2025-06-16"]:
+        assert await with_secondary.get_hourly_forecast(*PARIS, date) is not None
+    assert upstream_breakers.is_open(with_secondary.provider.endpoint(FORECAST))
+    assert not with_secondary.upstream_down(FORECAST)
+
+    assert await with_secondary.get_hourly_forecast(*PARIS, "2025-06-17") is not None
+    stats = with_secondary.provider_stats()["operations"][FORECAST]
+    assert stats["wins"] == {"openmeteo": 3}
+    assert stub.stats["open_meteo"] == 3
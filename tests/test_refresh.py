@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.services.hourly import HourlyForecast
+from app.services.redis_async import async_cache
+from app.services.redis_cache import cache
+from app.services.single_flight import single_flight
+
+pytestmark = pytest.mark.anyio
+
+SITE = (48.85, 2.35, "2025-06-15")
+
+
+def _record(cloud: float) -> bytes:
+    return HourlyForecast.from_values({"cloud": [cloud] * 24}).pack()
+
+
+async def _cache_stale(service, record: bytes) -> str:
+    key = service._cache_location("hourly", *SITE)[0]
+    await async_cache.set(key, record, 7200, soft_ttl_seconds=-60)
+    return key
+
+
+async def _settle(service) -> None:
+    while service._background:
+        await asyncio.sleep(0.01)
+
+
+async def test_stale_entry_is_refreshed_from_upstream(service, stub):
+    await _cache_stale(service, _record(80))
+
+    assert (await service.get_hourly_forecast(*SITE)).cloud_cover() == 80
+    await _settle(service)
+
+    assert stub.stats["forecast"] == 1
+    assert (await service.get_hourly_forecast(*SITE)).cloud_cover() != 80
+
+
+async def test_refresh_skipped_when_another_worker_already_refreshed(service, stub):
+    key = await _cache_stale(service, _record(80))
+    # Another worker refreshed the key in Redis; this worker's L1 copy is still stale
+    _, raw = cache._encode(_record(10), 3600)
+    cache.redis_client.set(key, raw, ex=7200)
+
+    assert (await service.get_hourly_forecast(*SITE)).cloud_cover() == 80
+    await _settle(service)
+
+    assert stub.stats["forecast"] == 0
+    assert single_flight.stats["refreshes_already_fresh"] >= 1
+    assert (await service.get_hourly_forecast(*SITE)).cloud_cover() == 10
+
+
+async def test_cache_miss_does_not_take_a_skipped_refresh_result(monkeypatch):
+    key = "astronomy:cell=test:date=2025-06-15"
+    # Another worker is fetching the key
+    cache.redis_client.set(f"lock:{key}", "other-worker", px=5000)
+    gate = asyncio.Event()
+    acquire_lock = async_cache.acquire_lock
+
+    async def gated_acquire_lock(name, ttl_ms):
+        await gate.wait()
+        return await acquire_lock(name, ttl_ms)
+
+    monkeypatch.setattr(async_cache, "acquire_lock", gated_acquire_lock)
+
+    async def fetch():
+        return {"fetched": "here"}
+
+    refresh = asyncio.ensure_future(single_flight.refresh_async(key, fetch))
+    await asyncio.sleep(0)
+    lookup = asyncio.ensure_future(single_flight.do_async(key, fetch))
+    await asyncio.sleep(0)
+    gate.set()
+    assert await refresh is None
+
+    # The other worker finishes: the lookup gets its value, not the refresh's None
+    await async_cache.set(key, {"fetched": "there"}, 60)
+    cache.redis_client.delete(f"lock:{key}")
+    assert await lookup == {"fetched": "there"}
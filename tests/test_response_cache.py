@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from app.services.redis_cache import cache
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = {"lat": 48.851, "lon": 2.351, "date": "2025-06-15"}
+
+
+async def test_etag_and_max_age(api, stub):
+    response = await api.get("/visibility", params=PARAMS)
+
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    directive, max_age = response.headers["Cache-Control"].split(", max-age=")
+    assert directive == "public"
+    assert 0 < int(max_age) <= 3600
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+async def test_matching_if_none_match_is_not_modified(api, stub, if_none_match):
+    etag = (await api.get("/visibility", params=PARAMS)).headers["ETag"]
+
+    response = await api.get("/visibility", params=PARAMS, headers={"If-None-Match": if_none_match.format(etag=etag)})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    assert stub.stats["forecast"] == 1
+
+
+async def test_stale_etag_gets_the_full_response(api):
+    response = await api.get("/visibility", params=PARAMS, headers={"If-None-Match": '"not-the-etag"'})
+
+    assert response.status_code == 200
+    assert response.json()["visibility_score"] >= 0
+
+
+async def test_nearby_point_shares_the_entry_with_its_own_location_and_date(api, stub):
+    first = await api.get("/visibility", params=PARAMS)
+    # Same cache cell and night, the date written another way
+    second = await api.get("/visibility", params={"lat": 48.852, "lon": 2.352, "date": "06/15/2025"})
+
+    assert stub.stats["forecast"] == 1
+    first_body, second_body = first.json(), second.json()
+    assert second_body["location"] == {"latitude": 48.852, "longitude": 2.352}
+    assert second_body["date"] == "06/15/2025"
+    assert list(second_body) == list(first_body)
+    assert {k: v for k, v in second_body.items() if k not in ("location", "date")} == \
+        {k: v for k, v in first_body.items() if k not in ("location", "date")}
+    assert second.headers["ETag"] != first.headers["ETag"]
+    # Byte for byte what FastAPI would have serialized
+    assert second.content == json.dumps(second_body, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+async def test_degraded_response_is_not_cached(api, stub):
+    stub.settings["error_rate"] = 1.0
+
+    response = await api.get("/visibility", params=PARAMS)
+
+    assert response.status_code == 200
+    assert response.json()["data_source"] == "degraded"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert cache.redis_client.keys("response:*") == []
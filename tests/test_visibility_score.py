@@ -0,0 +1,32 @@
+import numpy as np
+
+from app.api.visibility import build_visibility_response
+from app.services import ephemeris
+from app.services.visibility_score import calculate_slot_scores, calculate_visibility_scores
+
+NAIROBI = (-1.2921, 36.8219)
+DATE = "2025-06-15"
+
+
+def _nightly(moon_illumination: float) -> dict:
+    astronomy = {**ephemeris.astronomy_for(*NAIROBI, DATE), "moon_illumination": moon_illumination}
+    return build_visibility_response(*NAIROBI, DATE, astronomy, cloud_cover=0, pollution=0.0)
+
+
+def test_full_moon_lowers_nightly_and_slot_scores_alike():
+    new_moon, full_moon = _nightly(0.0), _nightly(1.0)
+    assert new_moon["visibility_score"] - full_moon["visibility_score"] == 30
+    assert "Bright moonlight" in full_moon["explanation"]
+    assert "Moonlight impact is minimal" in new_moon["explanation"]
+    assert full_moon["details"]["moon_illumination_percent"] == 100
+
+    # A fully dark slot with the moon well up loses the same 30 points
+    slots = calculate_slot_scores([0, 0], [0.0, 1.0], [60, 60], [-30, -30], light_pollution=0.0)
+    assert slots[0] - slots[1] == 30
+
+
+def test_vectorized_scores_match_the_nightly_score():
+    moon = np.array([0.0, 50.0, 100.0])
+    scores = calculate_visibility_scores(0, moon, 8, 0, explain=True)
+    assert scores["visibility_score"].tolist() == [100, 85, 70]
+    assert "Bright moonlight" in scores["explanation"][2]
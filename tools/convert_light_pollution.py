@@ -0,0 +1,137 @@
+"""
+Convert a light-pollution / sky-brightness source into the compact
+memory-mappable raster read by app.services.light_pollution
+
+Sources:
+- GeoTIFF (single band, north-up), read with the optional 'rasterio' package
+- CSV of cell centers on a regular grid: lat,lon,value (a header row is skipped)
+
+Source values are mapped linearly onto 0-100 pollution between
+--min-value and --max-value (default: the data's range), optionally
+after a log10 (for radiance) or inverted (for sky brightness in
+mag/arcsec^2, where higher means darker).
+
+Usage:
+    python -m tools.convert_light_pollution SOURCE OUTPUT [--dtype uint8]
+        [--log | --invert] [--min-value V] [--max-value V] [--cell-size DEG]
+
+Then set LIGHT_POLLUTION_RASTER=OUTPUT.
+"""
+
+import argparse
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.services.light_pollution import write_raster
+
+# Largest stored value per dtype; the next one up marks no-data
+_MAX_STORED = {"uint8": 254, "uint16": 65534}
+
+
+def read_geotiff(path: str) -> Tuple[np.ndarray, float, float, float]:
+    """Returns (values with NaN for no-data, west, north, cell_size)"""
+    try:
+        import rasterio
+    except ImportError as e:
+        raise SystemExit("Reading GeoTIFF needs the 'rasterio' package (pip install rasterio)") from e
+
+    with rasterio.open(path) as dataset:
+        transform = dataset.transform
+        if transform.b or transform.d or not np.isclose(transform.a, -transform.e):
+            raise SystemExit("Only north-up rasters with square cells are supported")
+        values = dataset.read(1).astype(float)
+        if dataset.nodata is not None:
+            values[values == dataset.nodata] = np.nan
+        return values, transform.c, transform.f, transform.a
+
+
+def read_csv(path: str, cell_size: Optional[float]) -> Tuple[np.ndarray, float, float, float]:
+    """Returns (values with NaN for missing cells, west, north, cell_size)"""
+    with open(path) as f:
+        first = f.readline().split(",")[0]
+    try:
+        float(first)
+        skip = 0
+    except ValueError:
+        skip = 1
+    data = np.loadtxt(path, delimiter=",", skiprows=skip, usecols=(0, 1, 2), ndmin=2)
+    lats, lons, source = data[:, 0], data[:, 1], data[:, 2]
+
+    if cell_size is None:
+        steps = np.concatenate([np.diff(np.unique(lats)), np.diff(np.unique(lons))])
+        if not len(steps):
+            raise SystemExit("Cannot infer the cell size from a single point; pass --cell-size")
+        cell_size = float(steps.min())
+
+    west = lons.min() - cell_size / 2
+    north = lats.max() + cell_size / 2
+    width = int(round((lons.max() - lons.min()) / cell_size)) + 1
+    height = int(round((lats.max() - lats.min()) / cell_size)) + 1
+
+    values = np.full((height, width), np.nan)
+    rows = np.round((north - cell_size / 2 - lats) / cell_size).astype(np.int64)
+    cols = np.round((lons - west - cell_size / 2) / cell_size).astype(np.int64)
+    values[rows, cols] = source
+    return values, west, north, cell_size
+
+
+def to_pollution(values: np.ndarray, log: bool, invert: bool,
+                 min_value: Optional[float], max_value: Optional[float]) -> np.ndarray:
+    """Map source values onto 0-100 pollution, keeping NaN for no-data"""
+    def scaled(value):
+        return np.log10(np.maximum(value, 1e-6)) if log else value
+
+    values = scaled(values)
+    valid = values[~np.isnan(values)]
+    if not len(valid):
+        raise SystemExit("Source has no valid cells")
+
+    low = scaled(min_value) if min_value is not None else valid.min()
+    high = scaled(max_value) if max_value is not None else valid.max()
+    if high <= low:
+        raise SystemExit("max value must be above min value")
+
+    pollution = np.clip((values - low) / (high - low), 0.0, 1.0) * 100
+    return 100 - pollution if invert else pollution
+
+
+def convert(source: str, output: str, dtype: str = "uint8", log: bool = False, invert: bool = False,
+            min_value: Optional[float] = None, max_value: Optional[float] = None,
+            cell_size: Optional[float] = None) -> Tuple[int, int]:
+    """Convert source into output; returns (width, height)"""
+    if source.lower().endswith((".tif", ".tiff")):
+        values, west, north, size = read_geotiff(source)
+    else:
+        values, west, north, size = read_csv(source, cell_size)
+
+    pollution = to_pollution(values, log, invert, min_value, max_value)
+    top = _MAX_STORED[dtype]
+    stored = np.where(np.isnan(pollution), top + 1, np.round(np.nan_to_num(pollution) / 100 * top)).astype(dtype)
+
+    write_raster(output, stored, west, north, size, scale=100 / top, nodata=top + 1)
+    return stored.shape[1], stored.shape[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source")
+    parser.add_argument("output")
+    parser.add_argument("--dtype", choices=sorted(_MAX_STORED), default="uint8")
+    scaling = parser.add_mutually_exclusive_group()
+    scaling.add_argument("--log", action="store_true", help="log10 source values first (radiance)")
+    scaling.add_argument("--invert", action="store_true", help="higher source values mean darker skies (mag/arcsec^2)")
+    parser.add_argument("--min-value", type=float)
+    parser.add_argument("--max-value", type=float)
+    parser.add_argument("--cell-size", type=float, help="CSV grid spacing in degrees (default: inferred)")
+    args = parser.parse_args()
+
+    width, height = convert(
+        args.source, args.output, args.dtype, args.log, args.invert,
+        args.min_value, args.max_value, args.cell_size
+    )
+    print(f"wrote {args.output}: {width}x{height} {args.dtype} cells")
+
+
+if __name__ == "__main__":
+    main()